@@ -5,23 +5,38 @@ Node.js implementation in ``src/api/server.js``.
 """
 
 import os
+import copy
+import base64
 import json
 import re
 import hmac
+import hashlib
+import heapq
+import bisect
+import functools
+import random
 import time
 import string
+import struct
+import threading
+import atexit
 import secrets
 import socket
 import ipaddress
 import requests
+import numpy as np
 from pathlib import Path
 from urllib.parse import urlparse, urlencode
 from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request
+from filelock import FileLock
+from fastapi import FastAPI, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
-from pymongo import MongoClient
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, PlainTextResponse, Response
+from pymongo import MongoClient, ReplaceOne, DeleteOne, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 
 load_dotenv()
 
@@ -32,8 +47,11 @@ DB_NAME = os.environ.get("DB_NAME")
 
 STATIONS_FILE = Path(__file__).parent.parent / "stations.json"
 PREMIUM_FILE = Path(__file__).parent.parent / "premium.json"
+PREMIUM_JOURNAL_FILE = Path(__file__).parent.parent / "premium.journal"
 COUPONS_FILE = Path(__file__).parent.parent / "coupons.json"
 DASHBOARD_FILE = Path(__file__).parent.parent / "dashboard.json"
+DASHBOARD_DIR = Path(__file__).parent.parent / "dashboard"
+TELEMETRY_SERIES_DIR = Path(__file__).parent.parent / "telemetry-series"
 
 BOT_IMAGES = ["/img/bot-1.png", "/img/bot-2.png", "/img/bot-3.png", "/img/bot-4.png"]
 BOT_COLORS = ["cyan", "green", "pink", "amber", "purple", "red"]
@@ -101,7 +119,8 @@ app.add_middleware(
     allow_origins=["*"] if CORS_HAS_WILDCARD else ALLOWED_ORIGINS,
     allow_credentials=not CORS_HAS_WILDCARD,
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "X-Admin-Token"],
+    allow_headers=["Content-Type", "Authorization", "X-Admin-Token", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 
 client = None
@@ -139,6 +158,41 @@ PRO_TRIAL_MONTHS = 1
 PRO_TRIAL_SEATS = 1
 ADMIN_API_TOKEN = (os.environ.get("API_ADMIN_TOKEN") or os.environ.get("ADMIN_API_TOKEN") or "").strip()
 TRUST_PROXY_HEADERS = (os.environ.get("TRUST_PROXY_HEADERS") or "0").strip() == "1"
+try:
+    PROCESSED_SESSION_RETENTION_DAYS = max(1, int((os.environ.get("PROCESSED_SESSION_RETENTION_DAYS") or "90").strip() or "90"))
+except Exception:
+    PROCESSED_SESSION_RETENTION_DAYS = 90
+try:
+    PROCESSED_SESSION_MAX_ENTRIES = max(100, int((os.environ.get("PROCESSED_SESSION_MAX_ENTRIES") or "5000").strip() or "5000"))
+except Exception:
+    PROCESSED_SESSION_MAX_ENTRIES = 5000
+try:
+    PREMIUM_JOURNAL_FSYNC_MS = max(0, int((os.environ.get("PREMIUM_JOURNAL_FSYNC_MS") or "200").strip() or "200"))
+except Exception:
+    PREMIUM_JOURNAL_FSYNC_MS = 200
+try:
+    PREMIUM_JOURNAL_COMPACT_RECORDS = max(1, int((os.environ.get("PREMIUM_JOURNAL_COMPACT_RECORDS") or "1000").strip() or "1000"))
+except Exception:
+    PREMIUM_JOURNAL_COMPACT_RECORDS = 1000
+try:
+    PREMIUM_JOURNAL_COMPACT_IDLE_MS = max(0, int((os.environ.get("PREMIUM_JOURNAL_COMPACT_IDLE_MS") or "1000").strip() or "1000"))
+except Exception:
+    PREMIUM_JOURNAL_COMPACT_IDLE_MS = 1000
+try:
+    PREMIUM_JOURNAL_COMPACT_MAX_DELAY_MS = max(0, int((os.environ.get("PREMIUM_JOURNAL_COMPACT_MAX_DELAY_MS") or "10000").strip() or "10000"))
+except Exception:
+    PREMIUM_JOURNAL_COMPACT_MAX_DELAY_MS = 10000
+try:
+    STATS_RESET_CHUNK_SIZE = max(100, int((os.environ.get("STATS_RESET_CHUNK_SIZE") or "1000").strip() or "1000"))
+except Exception:
+    STATS_RESET_CHUNK_SIZE = 1000
+try:
+    STATS_RESET_CHUNK_PAUSE_MS = max(0, int((os.environ.get("STATS_RESET_CHUNK_PAUSE_MS") or "50").strip() or "50"))
+except Exception:
+    STATS_RESET_CHUNK_PAUSE_MS = 50
+METRICS_ENABLED = (os.environ.get("METRICS_ENABLED") or "0").strip() == "1"
+DASHBOARD_SHARDED_FILES = (os.environ.get("DASHBOARD_SHARDED_FILES") or "0").strip() == "1"
+METRICS_TOKEN = (os.environ.get("METRICS_TOKEN") or "").strip()
 API_RATE_LIMIT_STATE = {}
 try:
     MAX_API_RATE_STATE_ENTRIES = max(1000, int((os.environ.get("API_RATE_STATE_MAX_ENTRIES") or "50000").strip() or "50000"))
@@ -207,6 +261,7 @@ def empty_premium_state():
         "processedSessions": {},
         "trialClaims": {},
         "offers": {},
+        "offerRedemptions": {},
         "discordBotListState": {},
         "recentRedemptions": [],
     }
@@ -307,35 +362,6 @@ def validate_custom_station_url(raw_url):
     return {"ok": True, "url": value}
 
 
-def list_recent_redemptions(limit=100):
-    safe_limit = max(1, min(500, int(limit)))
-
-    try:
-        if COUPONS_FILE.exists():
-            payload = json.loads(COUPONS_FILE.read_text(encoding="utf-8"))
-            if isinstance(payload, dict):
-                rows = payload.get("redemptions", {})
-                if isinstance(rows, dict):
-                    parsed_rows = []
-                    for session_id, redemption in rows.items():
-                        if not isinstance(redemption, dict):
-                            continue
-                        parsed_rows.append({
-                            "sessionId": str(redemption.get("sessionId") or session_id).strip(),
-                            **redemption,
-                        })
-                    parsed_rows.sort(key=lambda item: str(item.get("processedAt") or ""), reverse=True)
-                    return parsed_rows[:safe_limit]
-    except Exception:
-        pass
-
-    data = load_premium()
-    rows = data.get("recentRedemptions", [])
-    if not isinstance(rows, list):
-        return []
-    return rows[:safe_limit]
-
-
 def is_discord_oauth_configured():
     return bool(DISCORD_CLIENT_ID and DISCORD_CLIENT_SECRET and DISCORD_REDIRECT_URI)
 
@@ -382,24 +408,13 @@ def clean_expired_dashboard_sessions(now_ts=None):
 
 
 def load_dashboard_data():
+    """dashboard.json mit allen Guilds (nur die Bereiche, die dieses Backend nutzt)."""
     default_data = {
         "events": {},
         "perms": {},
         "telemetry": {},
     }
 
-    if db is not None:
-        try:
-            doc = db.dashboard_state.find_one({"_id": "dashboard_state"}, {"_id": 0})
-            if isinstance(doc, dict):
-                return {
-                    "events": doc.get("events", {}),
-                    "perms": doc.get("perms", {}),
-                    "telemetry": doc.get("telemetry", {}),
-                }
-        except Exception:
-            pass
-
     if DASHBOARD_FILE.exists():
         try:
             payload = json.loads(DASHBOARD_FILE.read_text(encoding="utf-8"))
@@ -414,211 +429,1448 @@ def load_dashboard_data():
     return default_data
 
 
-def save_dashboard_data(payload):
-    safe_payload = {
-        "events": payload.get("events", {}) if isinstance(payload, dict) else {},
-        "perms": payload.get("perms", {}) if isinstance(payload, dict) else {},
-        "telemetry": payload.get("telemetry", {}) if isinstance(payload, dict) else {},
+# === Dashboard-Dateispeicher ===
+# Ohne MongoDB teilt sich dieses Backend standardmaessig dashboard.json mit dem
+# Node-Backend (src/dashboard-store.js). Writes lesen die ganze Datei unter einem
+# FileLock und behalten alle fremden Bereiche (authSessions, oauthStates, ...).
+# Mit DASHBOARD_SHARDED_FILES=1 liegt jede Guild in dashboard/<shard>/<guildId>.json;
+# Writes laufen ueber Temp-Datei + os.replace unter einem FileLock pro Shard.
+# dashboard.json bleibt dann unveraendert und wird nur einmalig in die Shards kopiert.
+
+DASHBOARD_FILE_SECTIONS = ("events", "perms", "telemetry", "versions")
+DASHBOARD_SHARD_MIGRATION = {"done": False}
+DASHBOARD_SHARD_MIGRATION_LOCK = threading.Lock()
+
+
+def dashboard_guild_path(guild_id):
+    safe_id = re.sub(r"[^0-9A-Za-z_-]", "_", str(guild_id or "")) or "_"
+    return DASHBOARD_DIR / safe_id[-2:].rjust(2, "_") / f"{safe_id}.json"
+
+
+def dashboard_shard_lock(shard_dir):
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    return FileLock(str(shard_dir / ".lock"))
+
+
+def dashboard_file_lock():
+    return FileLock(str(DASHBOARD_FILE.with_name(DASHBOARD_FILE.name + ".lock")))
+
+
+def read_dashboard_guild_file(path):
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def write_dashboard_guild_file(path, payload, indent=None):
+    """Atomar: erst Temp-Datei schreiben und syncen, dann per os.replace austauschen."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False, indent=indent, separators=None if indent else (",", ":"))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def dashboard_file_guild_payload(data, guild_id):
+    """Bereiche einer Guild aus dem gemeinsamen dashboard.json, im Format einer Shard-Datei."""
+    payload = {}
+    for section in DASHBOARD_FILE_SECTIONS:
+        rows = data.get(section)
+        if isinstance(rows, dict) and guild_id in rows:
+            payload[section] = rows[guild_id]
+    return payload
+
+
+def ensure_dashboard_shards():
+    """Kopiert ein vorhandenes dashboard.json einmalig in die Shard-Dateien; das Original bleibt liegen."""
+    if DASHBOARD_SHARD_MIGRATION["done"]:
+        return
+    with DASHBOARD_SHARD_MIGRATION_LOCK:
+        if DASHBOARD_SHARD_MIGRATION["done"]:
+            return
+        DASHBOARD_DIR.mkdir(parents=True, exist_ok=True)
+        marker = DASHBOARD_DIR / ".migrated"
+        with FileLock(str(DASHBOARD_DIR / ".migrate.lock")):
+            if DASHBOARD_FILE.exists() and not marker.exists():
+                legacy = load_dashboard_data()
+                guilds = {}
+                for section in DASHBOARD_SECTION_COLLECTIONS:
+                    rows = legacy.get(section) if isinstance(legacy.get(section), dict) else {}
+                    for guild_id, value in rows.items():
+                        if section == "telemetry":
+                            value = normalize_stored_dashboard_telemetry(value)
+                        guilds.setdefault(str(guild_id), {})[section] = value
+                for guild_id, payload in guilds.items():
+                    path = dashboard_guild_path(guild_id)
+                    with dashboard_shard_lock(path.parent):
+                        # Bereits in Shards geschriebene Bereiche sind neuer als der Altbestand.
+                        write_dashboard_guild_file(path, {**payload, **read_dashboard_guild_file(path)})
+                marker.write_text(datetime.now(timezone.utc).isoformat(), encoding="utf-8")
+        DASHBOARD_SHARD_MIGRATION["done"] = True
+
+
+def load_dashboard_guild(guild_id):
+    if not DASHBOARD_SHARDED_FILES:
+        return dashboard_file_guild_payload(read_dashboard_guild_file(DASHBOARD_FILE), guild_id)
+    ensure_dashboard_shards()
+    return read_dashboard_guild_file(dashboard_guild_path(guild_id))
+
+
+def update_dashboard_guilds(guild_ids, apply):
+    """apply(guild_id, payload) aendert payload in place; gibt es None zurueck, wird nicht geschrieben."""
+    results = {}
+    if not DASHBOARD_SHARDED_FILES:
+        with dashboard_file_lock():
+            data = read_dashboard_guild_file(DASHBOARD_FILE)
+            changed = False
+            for guild_id in guild_ids:
+                payload = dashboard_file_guild_payload(data, guild_id)
+                result = apply(guild_id, payload)
+                if result is not None:
+                    for section, value in payload.items():
+                        if not isinstance(data.get(section), dict):
+                            data[section] = {}
+                        data[section][guild_id] = value
+                    changed = True
+                results[guild_id] = result
+            if changed:
+                write_dashboard_guild_file(DASHBOARD_FILE, data, indent=2)
+        return results
+
+    ensure_dashboard_shards()
+    by_shard = {}
+    for guild_id in guild_ids:
+        by_shard.setdefault(dashboard_guild_path(guild_id).parent, []).append(guild_id)
+    for shard_dir, shard_guild_ids in by_shard.items():
+        with dashboard_shard_lock(shard_dir):
+            for guild_id in shard_guild_ids:
+                path = dashboard_guild_path(guild_id)
+                payload = read_dashboard_guild_file(path)
+                result = apply(guild_id, payload)
+                if result is not None:
+                    write_dashboard_guild_file(path, payload)
+                results[guild_id] = result
+    return results
+
+
+# === Dashboard Repository (pro Guild) ===
+# MongoDB: ein Dokument pro Guild und Bereich (_id = guildId), Writes als gezielte
+# $set/$push/$pull auf genau dieses Dokument. Ohne MongoDB: dashboard.json bzw. Shard-Datei der Guild.
+
+DASHBOARD_SECTION_COLLECTIONS = {
+    "events": "dashboard_events",
+    "perms": "dashboard_perms",
+    "telemetry": "dashboard_telemetry",
+}
+DASHBOARD_EVENTS_MAX = 200
+DASHBOARD_TELEMETRY_BASIC_FIELDS = ("listenersNow", "activeStreams", "peakListeners", "peakTime", "topStation", "updatedAt")
+DASHBOARD_STATS_SOURCE_PIPELINE = {"supported": True}
+
+
+def dashboard_event_rows(payload):
+    rows = payload.get("events")
+    return rows if isinstance(rows, list) else []
+
+
+def dashboard_repo_get(section, guild_id):
+    """events -> Liste, perms/telemetry -> Dict der Guild."""
+    default_value = [] if section == "events" else {}
+    if db is not None:
+        try:
+            doc = db[DASHBOARD_SECTION_COLLECTIONS[section]].find_one({"_id": guild_id}, {"_id": 0}) or {}
+            value = doc.get("events") if section == "events" else doc
+            return value if isinstance(value, type(default_value)) and value else default_value
+        except Exception:
+            pass
+    value = load_dashboard_guild(guild_id).get(section)
+    return value if isinstance(value, type(default_value)) else default_value
+
+
+def dashboard_stats_source_projection(advanced):
+    if advanced:
+        return {"_id": 0}
+    return {"_id": 0, **{field: 1 for field in DASHBOARD_TELEMETRY_BASIC_FIELDS}}
+
+
+def build_dashboard_stats_source_pipeline(guild_id, advanced=False):
+    """events, perms und telemetry der Guild als bis zu drei Dokumente aus einer Pipeline, markiert per _section."""
+    return [
+        {"$match": {"_id": guild_id}},
+        {"$project": {"_id": 0, "events.enabled": 1}},
+        {"$addFields": {"_section": "events"}},
+        {"$unionWith": {"coll": "dashboard_perms", "pipeline": [
+            {"$match": {"_id": guild_id}},
+            {"$project": {"_id": 0, "commandRoleMap": 1}},
+            {"$addFields": {"_section": "perms"}},
+        ]}},
+        {"$unionWith": {"coll": "dashboard_telemetry", "pipeline": [
+            {"$match": {"_id": guild_id}},
+            {"$project": dashboard_stats_source_projection(advanced)},
+            {"$addFields": {"_section": "telemetry"}},
+        ]}},
+    ]
+
+
+def load_dashboard_stats_source_docs(guild_id, advanced=False):
+    """{events, perms, telemetry} in einem Roundtrip; ohne $unionWith (MongoDB < 4.4) drei find_one."""
+    if DASHBOARD_STATS_SOURCE_PIPELINE["supported"]:
+        try:
+            docs = {}
+            for doc in db.dashboard_events.aggregate(build_dashboard_stats_source_pipeline(guild_id, advanced)):
+                docs[doc.pop("_section", "")] = doc
+            return docs
+        except OperationFailure as exc:
+            # 40324: unbekannte Pipeline-Stage ($unionWith) -> nicht erneut versuchen.
+            if exc.code == 40324:
+                DASHBOARD_STATS_SOURCE_PIPELINE["supported"] = False
+        except Exception:
+            pass
+    return {
+        "events": db.dashboard_events.find_one({"_id": guild_id}, {"_id": 0, "events.enabled": 1}) or {},
+        "perms": db.dashboard_perms.find_one({"_id": guild_id}, {"_id": 0, "commandRoleMap": 1}) or {},
+        "telemetry": db.dashboard_telemetry.find_one({"_id": guild_id}, dashboard_stats_source_projection(advanced)) or {},
     }
+
+
+def dashboard_repo_stats_source(guild_id, advanced=False):
+    """Nur die Felder fuer /api/dashboard/stats: enabled-Flags der Events, commandRoleMap, Telemetrie."""
     if db is not None:
         try:
-            db.dashboard_state.update_one(
-                {"_id": "dashboard_state"},
-                {"$set": safe_payload},
-                upsert=True,
+            docs = load_dashboard_stats_source_docs(guild_id, advanced)
+            return (
+                (docs.get("events") or {}).get("events") or [],
+                (docs.get("perms") or {}).get("commandRoleMap"),
+                docs.get("telemetry") or {},
             )
-            return
         except Exception:
             pass
-    try:
-        DASHBOARD_FILE.write_text(json.dumps(safe_payload, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception:
-        pass
+    payload = load_dashboard_guild(guild_id)
+    perms = payload.get("perms") if isinstance(payload.get("perms"), dict) else {}
+    telemetry = payload.get("telemetry") if isinstance(payload.get("telemetry"), dict) else {}
+    return dashboard_event_rows(payload), perms.get("commandRoleMap"), telemetry
 
 
-def normalize_dashboard_event(event_payload):
-    payload = event_payload if isinstance(event_payload, dict) else {}
-    event_id = str(payload.get("id") or secrets.token_hex(8)).strip()[:64]
-    title = clip_text(payload.get("title") or payload.get("name") or "OmniFM Event", 120)
-    station_key = clip_text(payload.get("stationKey") or payload.get("station") or "", 120)
-    fallback_key = clip_text(payload.get("fallbackStationKey") or payload.get("fallback") or "", 120)
-    starts_at = clip_text(payload.get("startsAt") or payload.get("startAt") or "", 80)
-    timezone_name = clip_text(payload.get("timezone") or "Europe/Vienna", 60)
-    channel_id = clip_text(payload.get("channelId") or "", 60)
-    enabled = payload.get("enabled") is not False
-    now_iso = datetime.now(timezone.utc).isoformat()
-    return {
-        "id": event_id,
-        "title": title,
-        "stationKey": station_key,
-        "fallbackStationKey": fallback_key,
-        "startsAt": starts_at,
-        "timezone": timezone_name,
-        "channelId": channel_id,
-        "enabled": enabled,
-        "updatedAt": now_iso,
-        "createdAt": clip_text(payload.get("createdAt") or now_iso, 80),
-    }
+def dashboard_repo_set(section, guild_id, payload):
+    """Ersetzt perms/telemetry einer Guild."""
+    dashboard_repo_set_many(section, {guild_id: payload})
+    return payload
 
 
-def normalize_dashboard_perms(payload):
-    body = payload if isinstance(payload, dict) else {}
-    incoming = body.get("commandRoleMap") if isinstance(body.get("commandRoleMap"), dict) else {}
-    normalized = {}
-    for raw_command, raw_roles in incoming.items():
-        command = clip_text(raw_command, 64).lstrip("/").lower()
-        if not command:
-            continue
-        roles = []
-        if isinstance(raw_roles, list):
-            for role in raw_roles:
-                role_name = clip_text(role, 80)
-                if role_name and role_name not in roles:
-                    roles.append(role_name)
-        normalized[command] = roles
-    return {
-        "commandRoleMap": normalized,
-        "updatedAt": datetime.now(timezone.utc).isoformat(),
-    }
+def dashboard_repo_set_many(section, payloads):
+    """Ersetzt perms/telemetry mehrerer Guilds in einem Bulk-Write bzw. einem Write pro Guild-Datei."""
+    if not payloads:
+        return 0
+    if db is not None:
+        try:
+            collection = db[DASHBOARD_SECTION_COLLECTIONS[section]]
+            if len(payloads) == 1:
+                guild_id, payload = next(iter(payloads.items()))
+                collection.update_one({"_id": guild_id}, {"$set": payload}, upsert=True)
+            else:
+                collection.bulk_write(
+                    [UpdateOne({"_id": guild_id}, {"$set": payload}, upsert=True) for guild_id, payload in payloads.items()],
+                    ordered=False,
+                )
+            bump_dashboard_versions(list(payloads), DASHBOARD_SECTION_VERSION_CONCERNS[section])
+            return len(payloads)
+        except Exception:
+            pass
 
+    def apply(guild_id, guild_payload):
+        guild_payload[section] = payloads[guild_id]
+        bump_dashboard_file_versions(guild_payload, DASHBOARD_SECTION_VERSION_CONCERNS[section])
+        return True
 
-def normalize_dashboard_telemetry(payload):
-    body = payload if isinstance(payload, dict) else {}
-    listeners_now = max(0, parse_int(body.get("listenersNow"), 0))
-    active_streams = max(0, parse_int(body.get("activeStreams"), 0))
-    peak_listeners = max(0, parse_int(body.get("peakListeners"), listeners_now))
-    peak_time = clip_text(body.get("peakTime") or datetime.now(timezone.utc).isoformat(), 80)
-    top_station_name = clip_text((body.get("topStation") or {}).get("name") if isinstance(body.get("topStation"), dict) else body.get("topStationName"), 120)
-    top_station_listeners = max(0, parse_int((body.get("topStation") or {}).get("listeners") if isinstance(body.get("topStation"), dict) else body.get("topStationListeners"), 0))
+    update_dashboard_guilds(list(payloads), apply)
+    return len(payloads)
 
-    listeners_by_channel = []
-    raw_channels = body.get("listenersByChannel") if isinstance(body.get("listenersByChannel"), list) else []
-    for item in raw_channels[:20]:
-        if not isinstance(item, dict):
-            continue
-        listeners_by_channel.append({
-            "name": clip_text(item.get("name") or item.get("channel") or "Voice", 80),
-            "listeners": max(0, parse_int(item.get("listeners"), 0)),
-        })
 
-    daily_report = []
-    raw_daily = body.get("dailyReport") if isinstance(body.get("dailyReport"), list) else body.get("daily") if isinstance(body.get("daily"), list) else []
-    for item in raw_daily[:31]:
-        if not isinstance(item, dict):
-            continue
-        day_key = clip_text(item.get("day"), 20)
-        if not day_key:
-            continue
-        daily_report.append({
-            "day": day_key,
-            "starts": max(0, parse_int(item.get("starts"), 0)),
-            "peakListeners": max(0, parse_int(item.get("peakListeners"), 0)),
-        })
+def dashboard_repo_add_event(guild_id, event):
+    if db is not None:
+        try:
+            db.dashboard_events.update_one(
+                {"_id": guild_id},
+                {"$push": {"events": {"$each": [event], "$position": 0, "$slice": DASHBOARD_EVENTS_MAX}}},
+                upsert=True,
+            )
+            bump_dashboard_versions([guild_id], DASHBOARD_SECTION_VERSION_CONCERNS["events"])
+            due_events_index_add(guild_id, event)
+            return event
+        except Exception:
+            pass
 
-    station_breakdown = []
-    raw_station_breakdown = body.get("stationBreakdown") if isinstance(body.get("stationBreakdown"), list) else []
-    for item in raw_station_breakdown[:20]:
-        if not isinstance(item, dict):
-            continue
-        station_breakdown.append({
-            "name": clip_text(item.get("name") or item.get("station") or "Station", 80),
-            "starts": max(0, parse_int(item.get("starts"), 0)),
-            "peakListeners": max(0, parse_int(item.get("peakListeners"), 0)),
-        })
+    def apply(_, guild_payload):
+        guild_payload["events"] = [event, *dashboard_event_rows(guild_payload)][:DASHBOARD_EVENTS_MAX]
+        bump_dashboard_file_versions(guild_payload, DASHBOARD_SECTION_VERSION_CONCERNS["events"])
+        return event
 
-    return {
-        "listenersNow": listeners_now,
-        "activeStreams": active_streams,
-        "peakListeners": peak_listeners,
-        "peakTime": peak_time,
-        "topStation": {
-            "name": top_station_name or "-",
-            "listeners": top_station_listeners,
-        },
-        "listenersByChannel": listeners_by_channel,
-        "dailyReport": daily_report,
-        "stationBreakdown": station_breakdown,
-        "updatedAt": datetime.now(timezone.utc).isoformat(),
-    }
+    update_dashboard_guilds([guild_id], apply)
+    due_events_index_add(guild_id, event)
+    return event
 
 
-def has_manage_guild_permission(raw_permissions):
-    try:
-        bitfield = int(str(raw_permissions or "0"))
-    except Exception:
-        bitfield = 0
-    manage_guild = (bitfield & 0x20) == 0x20
-    administrator = (bitfield & 0x8) == 0x8
-    return manage_guild or administrator
+def dashboard_repo_update_event(guild_id, event_id, build_updated):
+    """build_updated(row) liefert das neue Event; None wenn das Event nicht existiert."""
+    event_id = str(event_id)
+    if db is not None:
+        try:
+            doc = db.dashboard_events.find_one(
+                {"_id": guild_id},
+                {"_id": 0, "events": {"$elemMatch": {"id": event_id}}},
+            )
+            rows = (doc or {}).get("events") or []
+            if not rows:
+                return None
+            updated = build_updated(rows[0])
+            result = db.dashboard_events.update_one(
+                {"_id": guild_id, "events.id": event_id},
+                {"$set": {"events.$": updated}},
+            )
+            if not result.matched_count:
+                return None
+            bump_dashboard_versions([guild_id], DASHBOARD_SECTION_VERSION_CONCERNS["events"])
+            due_events_index_update(guild_id, updated)
+            return updated
+        except Exception:
+            pass
 
+    def apply(_, guild_payload):
+        rows = dashboard_event_rows(guild_payload)
+        for index, row in enumerate(rows):
+            if isinstance(row, dict) and str(row.get("id")) == event_id:
+                rows[index] = build_updated(row)
+                guild_payload["events"] = rows
+                bump_dashboard_file_versions(guild_payload, DASHBOARD_SECTION_VERSION_CONCERNS["events"])
+                return rows[index]
+        return None
 
-def resolve_session_token_from_request(request: Request):
-    auth = (request.headers.get("authorization") or "").strip()
-    if auth.lower().startswith("bearer "):
-        bearer = auth[7:].strip()
-        if bearer:
-            return bearer
-    cookie_token = (request.cookies.get(SESSION_COOKIE_NAME) or "").strip()
-    if cookie_token:
-        return cookie_token
-    header_token = (request.headers.get("x-session-token") or "").strip()
-    if header_token:
-        return header_token
-    return ""
+    updated = update_dashboard_guilds([guild_id], apply)[guild_id]
+    if updated:
+        due_events_index_update(guild_id, updated)
+    return updated
 
 
-def get_dashboard_session(request: Request):
-    clean_expired_dashboard_sessions()
-    token = resolve_session_token_from_request(request)
-    if not token:
-        return None, ""
-    session = DASHBOARD_SESSION_STORE.get(token)
-    if not isinstance(session, dict):
-        return None, token
-    return session, token
+def dashboard_repo_delete_event(guild_id, event_id):
+    event_id = str(event_id)
+    if db is not None:
+        try:
+            result = db.dashboard_events.update_one({"_id": guild_id}, {"$pull": {"events": {"id": event_id}}})
+            if result.modified_count > 0:
+                bump_dashboard_versions([guild_id], DASHBOARD_SECTION_VERSION_CONCERNS["events"])
+                due_events_index_remove(guild_id, event_id)
+                return True
+            return False
+        except Exception:
+            pass
 
+    def apply(_, guild_payload):
+        rows = dashboard_event_rows(guild_payload)
+        next_rows = [row for row in rows if not (isinstance(row, dict) and str(row.get("id")) == event_id)]
+        if len(next_rows) == len(rows):
+            return None
+        guild_payload["events"] = next_rows
+        bump_dashboard_file_versions(guild_payload, DASHBOARD_SECTION_VERSION_CONCERNS["events"])
+        return True
 
-def resolve_dashboard_guilds_for_session(session_payload):
-    guilds = session_payload.get("guilds") if isinstance(session_payload.get("guilds"), list) else []
-    output = []
-    for item in guilds:
-        if not isinstance(item, dict):
-            continue
-        guild_id = str(item.get("id") or "").strip()
-        if not is_valid_server_id(guild_id):
-            continue
-        if not has_manage_guild_permission(item.get("permissions", "0")):
-            continue
-        tier = get_tier(guild_id)
-        output.append({
-            "id": guild_id,
-            "name": clip_text(item.get("name") or guild_id, 120),
-            "icon": clip_text(item.get("icon") or "", 120),
-            "owner": bool(item.get("owner", False)),
-            "permissions": str(item.get("permissions") or "0"),
-            "tier": tier,
-            "dashboardEnabled": (TIER_RANK.get(tier, 0) >= TIER_RANK.get("pro", 1)),
-            "ultimateEnabled": tier == "ultimate",
-        })
-    output.sort(key=lambda row: row.get("name", "").lower())
-    return output
+    deleted = bool(update_dashboard_guilds([guild_id], apply)[guild_id])
+    if deleted:
+        due_events_index_remove(guild_id, event_id)
+    return deleted
 
 
-def resolve_session_guild_for_server(session_payload, server_id):
-    normalized = str(server_id or "").strip()
-    if not is_valid_server_id(normalized):
-        return None
-    for guild in resolve_dashboard_guilds_for_session(session_payload):
-        if guild.get("id") == normalized:
-            return guild
-    return None
+# === Dashboard-Versionen (ETags) ===
+# Pro Guild ein Zaehler je Lese-Endpunkt, bei jedem Write per $inc (dashboard_versions)
+# bzw. in der Datei-Ablage der Guild erhoeht. GETs bauen daraus ein starkes ETag und
+# beantworten If-None-Match mit 304, bevor Daten geladen werden.
 
+DASHBOARD_SECTION_VERSION_CONCERNS = {
+    "events": ("events", "stats"),
+    "perms": ("perms", "stats"),
+    "telemetry": ("stats",),
+}
+DASHBOARD_FILE_VERSIONS_CACHE = {"entry": (None, {})}
 
-def build_discord_authorize_url(state, prompt="consent"):
-    params = {
-        "client_id": DISCORD_CLIENT_ID,
-        "response_type": "code",
-        "redirect_uri": DISCORD_REDIRECT_URI,
+
+def bump_dashboard_file_versions(guild_payload, concerns):
+    versions = guild_payload.get("versions") if isinstance(guild_payload.get("versions"), dict) else {}
+    for concern in concerns:
+        versions[concern] = parse_int(versions.get(concern), 0) + 1
+    guild_payload["versions"] = versions
+
+
+def bump_dashboard_versions(guild_ids, concerns):
+    """Erst nach dem eigentlichen Write aufrufen, sonst koennte ein altes Payload das neue ETag bekommen."""
+    if not guild_ids:
+        return
+    if db is not None:
+        try:
+            increments = {concern: 1 for concern in concerns}
+            db.dashboard_versions.bulk_write(
+                [UpdateOne({"_id": guild_id}, {"$inc": increments}, upsert=True) for guild_id in guild_ids],
+                ordered=False,
+            )
+            return
+        except Exception:
+            pass
+
+    def apply(_, guild_payload):
+        bump_dashboard_file_versions(guild_payload, concerns)
+        return True
+
+    update_dashboard_guilds(list(guild_ids), apply)
+
+
+def load_dashboard_file_versions():
+    """(mtime_ns, versions aller Guilds) aus dashboard.json; geparst wird nur, wenn stat() eine Aenderung zeigt."""
+    try:
+        stat = DASHBOARD_FILE.stat()
+    except OSError:
+        return None, {}
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    cached_signature, versions = DASHBOARD_FILE_VERSIONS_CACHE["entry"]
+    if cached_signature != signature:
+        versions = read_dashboard_guild_file(DASHBOARD_FILE).get("versions")
+        versions = versions if isinstance(versions, dict) else {}
+        DASHBOARD_FILE_VERSIONS_CACHE["entry"] = (signature, versions)
+    return stat.st_mtime_ns, versions
+
+
+def get_dashboard_version(guild_id, concern):
+    if db is not None:
+        try:
+            doc = db.dashboard_versions.find_one({"_id": guild_id}, {"_id": 0, concern: 1}) or {}
+            return parse_int(doc.get(concern), 0)
+        except Exception:
+            pass
+    if DASHBOARD_SHARDED_FILES:
+        versions = load_dashboard_guild(guild_id).get("versions")
+        return parse_int(versions.get(concern), 0) if isinstance(versions, dict) else 0
+    mtime_ns, all_versions = load_dashboard_file_versions()
+    versions = all_versions.get(guild_id)
+    version = parse_int(versions.get(concern), 0) if isinstance(versions, dict) else 0
+    # Das Node-Backend schreibt dashboard.json ohne Versionszaehler; die mtime deckt diese Writes ab.
+    return version if mtime_ns is None else f"{version}-{mtime_ns}"
+
+
+def dashboard_content_version(value):
+    """Fuer Daten, die auch das Node-Backend ohne Versionszaehler schreibt: Hash des Inhalts."""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def dashboard_etag(*parts):
+    return '"' + ".".join(str(part) for part in parts) + '"'
+
+
+def dashboard_conditional_response(request: Request, etag, build_payload):
+    """304 bei passendem If-None-Match, sonst build_payload() als JSON mit ETag."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match") or ""
+    candidates = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(build_payload()), headers=headers)
+
+
+# === Faellige Events (Scheduler-Index) ===
+# Prozessweiter Min-Heap ueber die UTC-Startzeit aller aktiven Events aller Guilds.
+# Aenderungen ersetzen Eintraege per Token (lazy deletion); /events/due laeuft nur den
+# Teil des Heaps ab, der vor "until" liegt. Periodischer Neuaufbau faengt Writes
+# anderer Prozesse ein.
+
+DUE_EVENTS_GRACE_SECONDS = 3600
+DUE_EVENTS_REBUILD_SECONDS = 600
+DUE_EVENTS_MAX_LIMIT = 1000
+DUE_EVENTS_INDEX = {"heap": [], "entries": {}, "guilds": {}, "builtAt": 0.0, "seq": 0, "stale": 0}
+DUE_EVENTS_LOCK = threading.RLock()
+
+
+@functools.lru_cache(maxsize=256)
+def resolve_event_zone(name):
+    try:
+        return ZoneInfo(str(name or "UTC"))
+    except Exception:
+        return timezone.utc
+
+
+def event_start_epoch(event):
+    """startsAt als UTC-Epoch; Zeitangaben ohne Offset gelten in der Zeitzone des Events."""
+    parsed = parse_iso_datetime(event.get("startsAt"))
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=resolve_event_zone(event.get("timezone")))
+    return int(parsed.timestamp())
+
+
+def load_all_dashboard_events():
+    if db is not None:
+        try:
+            return [(str(doc.get("_id")), doc.get("events") or []) for doc in db.dashboard_events.find({}, {"events": 1})]
+        except Exception:
+            pass
+    if not DASHBOARD_SHARDED_FILES:
+        events_map = read_dashboard_guild_file(DASHBOARD_FILE).get("events")
+        rows = events_map.items() if isinstance(events_map, dict) else []
+        return [(str(guild_id), events if isinstance(events, list) else []) for guild_id, events in rows]
+    ensure_dashboard_shards()
+    return [(path.stem, dashboard_event_rows(read_dashboard_guild_file(path))) for path in DASHBOARD_DIR.glob("*/*.json")]
+
+
+def due_events_index_put_locked(guild_id, event, push=True):
+    index = DUE_EVENTS_INDEX
+    event_id = str(event.get("id"))
+    key = (guild_id, event_id)
+    if index["entries"].pop(key, None) is not None:
+        index["stale"] += 1
+    epoch = event_start_epoch(event) if event.get("enabled") is not False else None
+    if epoch is None:
+        return
+    index["seq"] += 1
+    index["entries"][key] = (epoch, index["seq"], event)
+    if push:
+        heapq.heappush(index["heap"], (epoch, index["seq"], guild_id, event_id))
+
+
+def due_events_index_remove_locked(guild_id, event_id):
+    index = DUE_EVENTS_INDEX
+    if index["entries"].pop((guild_id, event_id), None) is not None:
+        index["stale"] += 1
+    index["guilds"].get(guild_id, {}).pop(event_id, None)
+
+
+def rebuild_due_events_index():
+    guild_events = load_all_dashboard_events()
+    with DUE_EVENTS_LOCK:
+        index = DUE_EVENTS_INDEX
+        index.update({"entries": {}, "guilds": {}, "stale": 0})
+        for guild_id, events in guild_events:
+            # Gespeichert wird neueste zuerst; "guilds" haelt die Einfuegereihenfolge fuer das Limit.
+            order = index["guilds"].setdefault(guild_id, {})
+            for event in reversed(events):
+                if isinstance(event, dict):
+                    order[str(event.get("id"))] = True
+                    due_events_index_put_locked(guild_id, event, push=False)
+        index["heap"] = [(epoch, seq, gid, eid) for (gid, eid), (epoch, seq, _) in index["entries"].items()]
+        heapq.heapify(index["heap"])
+        index["builtAt"] = time.time()
+
+
+def due_events_index_add(guild_id, event):
+    with DUE_EVENTS_LOCK:
+        if not DUE_EVENTS_INDEX["builtAt"]:
+            return
+        order = DUE_EVENTS_INDEX["guilds"].setdefault(guild_id, {})
+        order[str(event.get("id"))] = True
+        due_events_index_put_locked(guild_id, event)
+        # Wie $slice beim Speichern: ueber dem Limit fallen die aeltesten Events heraus.
+        while len(order) > DASHBOARD_EVENTS_MAX:
+            due_events_index_remove_locked(guild_id, next(iter(order)))
+
+
+def due_events_index_update(guild_id, event):
+    with DUE_EVENTS_LOCK:
+        if DUE_EVENTS_INDEX["builtAt"]:
+            DUE_EVENTS_INDEX["guilds"].setdefault(guild_id, {}).setdefault(str(event.get("id")), True)
+            due_events_index_put_locked(guild_id, event)
+
+
+def due_events_index_remove(guild_id, event_id):
+    with DUE_EVENTS_LOCK:
+        if DUE_EVENTS_INDEX["builtAt"]:
+            due_events_index_remove_locked(guild_id, str(event_id))
+
+
+def find_due_events(until_epoch, since_epoch, limit):
+    """Aktive Events mit since <= Start <= until, aufsteigend nach Startzeit."""
+    if time.time() - DUE_EVENTS_INDEX["builtAt"] > DUE_EVENTS_REBUILD_SECONDS:
+        rebuild_due_events_index()
+    with DUE_EVENTS_LOCK:
+        index = DUE_EVENTS_INDEX
+        heap = index["heap"]
+        entries = index["entries"]
+        if index["stale"] > len(entries) + 1000:
+            heap[:] = [(epoch, seq, gid, eid) for (gid, eid), (epoch, seq, _) in entries.items()]
+            heapq.heapify(heap)
+            index["stale"] = 0
+        # Verwaiste Eintraege und Events, die laenger als die Kulanzzeit vorbei sind, endgueltig entfernen.
+        expired_before = time.time() - DUE_EVENTS_GRACE_SECONDS
+        while heap:
+            epoch, seq, guild_id, event_id = heap[0]
+            entry = entries.get((guild_id, event_id))
+            if entry and entry[1] == seq and epoch >= expired_before:
+                break
+            heapq.heappop(heap)
+            if entry and entry[1] == seq:
+                del entries[(guild_id, event_id)]
+            else:
+                index["stale"] = max(0, index["stale"] - 1)
+
+        due = []
+        candidates = [(heap[0], 0)] if heap and heap[0][0] <= until_epoch else []
+        while candidates and len(due) < limit:
+            (epoch, seq, guild_id, event_id), position = heapq.heappop(candidates)
+            entry = entries.get((guild_id, event_id))
+            if entry and entry[1] == seq and epoch >= since_epoch:
+                due.append({
+                    "serverId": guild_id,
+                    "startsAtEpoch": epoch,
+                    "startsAtUtc": datetime.fromtimestamp(epoch, timezone.utc).isoformat(),
+                    "event": entry[2],
+                })
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap) and heap[child][0] <= until_epoch:
+                    heapq.heappush(candidates, (heap[child], child))
+        return due
+
+
+def migrate_dashboard_state():
+    """Verteilt das alte globale dashboard_state-Dokument auf Dokumente pro Guild."""
+    if db is None:
+        return 0
+    doc = db.dashboard_state.find_one({"_id": "dashboard_state"})
+    if not isinstance(doc, dict):
+        return 0
+    migrated = 0
+    for section, collection_name in DASHBOARD_SECTION_COLLECTIONS.items():
+        rows = doc.get(section) if isinstance(doc.get(section), dict) else {}
+        operations = []
+        for guild_id, value in rows.items():
+            if section == "events":
+                if not isinstance(value, list):
+                    continue
+                payload = {"events": [row for row in value if isinstance(row, dict)][:DASHBOARD_EVENTS_MAX]}
+            elif isinstance(value, dict):
+                payload = normalize_stored_dashboard_telemetry(value) if section == "telemetry" else value
+            else:
+                continue
+            # $setOnInsert: bereits pro Guild geschriebene Daten sind neuer als der Altbestand.
+            operations.append(UpdateOne({"_id": guild_id}, {"$setOnInsert": payload}, upsert=True))
+        if operations:
+            db[collection_name].bulk_write(operations, ordered=False)
+            migrated += len(operations)
+    db.dashboard_state.delete_one({"_id": "dashboard_state"})
+    return migrated
+
+
+# === Telemetrie-Zeitreihen ===
+# Jede Telemetrie-Meldung wird als Rohpunkt gespeichert und schon beim Schreiben in
+# 5-Minuten- und Stunden-Buckets verdichtet. MongoDB: Rohpunkte in einer Time-Series-
+# Collection, Rollups als Bucket-Dokumente ($inc/$max) mit TTL auf expiresAt.
+# Der TTL der Rohpunkte ist die laengste Aufbewahrung aller Tiers; kuerzere Tiers
+# (und herabgestufte Guilds) kuerzt trim_telemetry_series() im Retention-Sweep, und
+# gelesen wird ohnehin nur das Zeitfenster des Tiers (resolve_telemetry_timeline_window).
+# Ohne MongoDB: Binaerdateien mit festen Records pro Guild und Aufloesung.
+
+TELEMETRY_SERIES_STEPS = {"raw": 0, "5m": 300, "1h": 3600}
+TELEMETRY_SERIES_COLLECTIONS = {
+    "raw": "telemetry_series_raw",
+    "5m": "telemetry_series_5m",
+    "1h": "telemetry_series_1h",
+}
+# Aufbewahrung in Tagen pro Tier; fehlt eine Aufloesung, wird sie fuer das Tier nicht gespeichert.
+TELEMETRY_SERIES_RETENTION_DAYS = {
+    "free": {},
+    "pro": {"raw": 1, "5m": 7, "1h": 30},
+    "ultimate": {"raw": 2, "5m": 14, "1h": 90},
+}
+TELEMETRY_SERIES_RAW_TTL_SECONDS = max(days.get("raw", 0) for days in TELEMETRY_SERIES_RETENTION_DAYS.values()) * 86400
+# bucket (epoch), samples, listenersSum, listenersMax, streamsSum, streamsMax
+TELEMETRY_SERIES_RECORD = struct.Struct("<IIIIII")
+TELEMETRY_SERIES_LOCK = threading.Lock()
+
+
+def telemetry_series_bucket(epoch, resolution):
+    step = TELEMETRY_SERIES_STEPS[resolution]
+    return epoch - epoch % step if step else epoch
+
+
+def telemetry_series_path(guild_id, resolution):
+    return TELEMETRY_SERIES_DIR / f"{guild_id}.{resolution}.bin"
+
+
+def mongo_datetime_epoch(value):
+    if not isinstance(value, datetime):
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def ensure_telemetry_series_collection():
+    """Legt die Rohpunkt-Collection als Time-Series-Collection an (MongoDB >= 5.0).
+
+    Aeltere Server lehnen die Option timeseries ab; dann wird eine normale Collection
+    mit TTL-Index auf ts und einem guildId/ts-Index angelegt.
+    """
+    if db is None:
+        return False
+    name = TELEMETRY_SERIES_COLLECTIONS["raw"]
+    if name in db.list_collection_names():
+        return False
+    try:
+        db.create_collection(
+            name,
+            timeseries={"timeField": "ts", "metaField": "guildId", "granularity": "minutes"},
+            expireAfterSeconds=TELEMETRY_SERIES_RAW_TTL_SECONDS,
+        )
+    except CollectionInvalid:
+        # Parallel von einem anderen Worker angelegt.
+        return False
+    except OperationFailure:
+        collection = db[name]
+        collection.create_index([("ts", 1)], name="ts_ttl", expireAfterSeconds=TELEMETRY_SERIES_RAW_TTL_SECONDS)
+        collection.create_index([("guildId", 1), ("ts", 1)], name="guildId_ts")
+    return True
+
+
+def write_telemetry_series_mongo(samples, now_epoch):
+    """Rohpunkte und Rollups schreiben; liefert die Zahl der geschriebenen Dokumente.
+
+    Ein Fehler wird nur weitergegeben, solange noch nichts geschrieben wurde. Danach
+    bleibt es beim Teilstand, denn der Datei-Fallback wuerde Punkte doppelt zaehlen.
+    """
+    timestamp = datetime.fromtimestamp(now_epoch, timezone.utc)
+    raw_docs = [
+        {"ts": timestamp, "guildId": guild_id, "listeners": listeners, "activeStreams": streams}
+        for guild_id, retention, listeners, streams in samples
+        if "raw" in retention
+    ]
+    written = 0
+    try:
+        if raw_docs:
+            try:
+                db[TELEMETRY_SERIES_COLLECTIONS["raw"]].insert_many(raw_docs, ordered=False)
+            except BulkWriteError as e:
+                written += parse_int(e.details.get("nInserted"), 0)
+                raise
+            written += len(raw_docs)
+        for resolution in ("5m", "1h"):
+            bucket = telemetry_series_bucket(now_epoch, resolution)
+            operations = []
+            for guild_id, retention, listeners, streams in samples:
+                if resolution not in retention:
+                    continue
+                operations.append(UpdateOne(
+                    {"_id": f"{guild_id}:{bucket}"},
+                    {
+                        "$setOnInsert": {"guildId": guild_id, "bucket": datetime.fromtimestamp(bucket, timezone.utc)},
+                        "$inc": {"samples": 1, "listenersSum": listeners, "streamsSum": streams},
+                        "$max": {
+                            "listenersMax": listeners,
+                            "streamsMax": streams,
+                            "expiresAt": datetime.fromtimestamp(bucket + retention[resolution] * 86400, timezone.utc),
+                        },
+                    },
+                    upsert=True,
+                ))
+            if operations:
+                try:
+                    db[TELEMETRY_SERIES_COLLECTIONS[resolution]].bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    written += parse_int(e.details.get("nMatched"), 0) + parse_int(e.details.get("nUpserted"), 0)
+                    raise
+                written += len(operations)
+    except Exception:
+        if not written:
+            raise
+    for guild_id, _, _, _ in samples:
+        invalidate_stats_analytics(guild_id)
+    return written
+
+
+def prune_telemetry_series_file(path, cutoff_epoch):
+    record_size = TELEMETRY_SERIES_RECORD.size
+    raw = path.read_bytes()
+    raw = raw[:len(raw) - len(raw) % record_size]
+    kept = [record for record in TELEMETRY_SERIES_RECORD.iter_unpack(raw) if record[0] >= cutoff_epoch]
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(b"".join(TELEMETRY_SERIES_RECORD.pack(*record) for record in kept))
+    os.replace(tmp_path, path)
+
+
+def append_telemetry_series_file(guild_id, retention, listeners, streams, now_epoch):
+    record_size = TELEMETRY_SERIES_RECORD.size
+    TELEMETRY_SERIES_DIR.mkdir(parents=True, exist_ok=True)
+    for resolution, days in retention.items():
+        path = telemetry_series_path(guild_id, resolution)
+        bucket = telemetry_series_bucket(now_epoch, resolution)
+        record = (bucket, 1, listeners, listeners, streams, streams)
+        with open(path, "r+b" if path.exists() else "w+b") as handle:
+            end = handle.seek(0, os.SEEK_END)
+            end -= end % record_size  # abgeschnittenen Record verwerfen
+            if resolution != "raw" and end >= record_size:
+                handle.seek(end - record_size)
+                last = TELEMETRY_SERIES_RECORD.unpack(handle.read(record_size))
+                if last[0] == bucket:
+                    end -= record_size
+                    record = (
+                        bucket,
+                        last[1] + 1,
+                        last[2] + listeners,
+                        max(last[3], listeners),
+                        last[4] + streams,
+                        max(last[5], streams),
+                    )
+            handle.seek(end)
+            handle.write(TELEMETRY_SERIES_RECORD.pack(*record))
+            handle.truncate()
+            handle.seek(0)
+            first = handle.read(record_size)
+        # Erst umschreiben, wenn ein Viertel der Aufbewahrung ueberfaellig ist.
+        cutoff = now_epoch - days * 86400
+        if len(first) == record_size and TELEMETRY_SERIES_RECORD.unpack(first)[0] < cutoff - days * 21600:
+            prune_telemetry_series_file(path, cutoff)
+
+
+def record_telemetry_points(telemetry_by_guild, tiers=None, now_epoch=None):
+    """Schreibt listenersNow/activeStreams der Guilds in alle Aufloesungen ihres Tiers."""
+    now_epoch = int(now_epoch if now_epoch is not None else time.time())
+    if tiers is None:
+        tiers = get_tiers_for_servers(list(telemetry_by_guild))
+    samples = []
+    for guild_id, telemetry in telemetry_by_guild.items():
+        retention = TELEMETRY_SERIES_RETENTION_DAYS.get(tiers.get(guild_id, "free"), {})
+        if not retention:
+            continue
+        listeners = max(0, parse_int(telemetry.get("listenersNow"), 0))
+        streams = max(0, parse_int(telemetry.get("activeStreams"), 0))
+        samples.append((guild_id, retention, listeners, streams))
+    if not samples:
+        return 0
+    if db is not None:
+        try:
+            write_telemetry_series_mongo(samples, now_epoch)
+            return len(samples)
+        except Exception:
+            # Nur hier ist noch nichts in MongoDB gelandet (siehe write_telemetry_series_mongo).
+            pass
+    with TELEMETRY_SERIES_LOCK:
+        for sample in samples:
+            try:
+                append_telemetry_series_file(*sample, now_epoch)
+            except Exception:
+                pass
+    for guild_id, _, _, _ in samples:
+        invalidate_stats_analytics(guild_id)
+    return len(samples)
+
+
+def trim_telemetry_series(now_epoch=None):
+    """Loescht Punkte jenseits der Aufbewahrung, die das aktuelle Tier der Guild erlaubt.
+
+    TTL und expiresAt decken nur die laengste bzw. die beim Schreiben gueltige
+    Aufbewahrung ab. Time-Series-Collections vor MongoDB 7.0 lehnen das Loeschen
+    nach Zeit ab; dann bleibt es dort bei der Begrenzung beim Lesen.
+    """
+    if db is None:
+        return {}
+    now = datetime.fromtimestamp(int(now_epoch if now_epoch is not None else time.time()), timezone.utc)
+    trimmed = {}
+    for resolution, collection_name in TELEMETRY_SERIES_COLLECTIONS.items():
+        field = "ts" if resolution == "raw" else "bucket"
+        kept_days = [days.get(resolution, 0) for days in TELEMETRY_SERIES_RETENTION_DAYS.values()]
+        collection = db[collection_name]
+        try:
+            guild_ids = collection.distinct("guildId", {field: {"$lt": now - timedelta(days=min(kept_days))}})
+            by_days = {}
+            for guild_id, tier in get_tiers_for_servers(guild_ids).items():
+                days = TELEMETRY_SERIES_RETENTION_DAYS.get(tier, {}).get(resolution, 0)
+                if days < max(kept_days):
+                    by_days.setdefault(days, []).append(guild_id)
+            trimmed[collection_name] = sum(
+                collection.delete_many({"guildId": {"$in": ids}, field: {"$lt": now - timedelta(days=days)}}).deleted_count
+                for days, ids in by_days.items()
+            )
+        except OperationFailure:
+            continue
+    return trimmed
+
+
+def read_telemetry_series(guild_id, resolution, since_epoch):
+    """Records (bucket, samples, listenersSum, listenersMax, streamsSum, streamsMax) ab since_epoch, aufsteigend."""
+    if db is not None:
+        try:
+            since = datetime.fromtimestamp(since_epoch, timezone.utc)
+            collection = db[TELEMETRY_SERIES_COLLECTIONS[resolution]]
+            if resolution == "raw":
+                cursor = collection.find({"guildId": guild_id, "ts": {"$gte": since}}, {"_id": 0}).sort("ts", 1)
+                return [
+                    (
+                        mongo_datetime_epoch(doc.get("ts")),
+                        1,
+                        doc.get("listeners", 0),
+                        doc.get("listeners", 0),
+                        doc.get("activeStreams", 0),
+                        doc.get("activeStreams", 0),
+                    )
+                    for doc in cursor
+                ]
+            cursor = collection.find({"guildId": guild_id, "bucket": {"$gte": since}}, {"_id": 0}).sort("bucket", 1)
+            return [
+                (
+                    mongo_datetime_epoch(doc.get("bucket")),
+                    doc.get("samples", 0),
+                    doc.get("listenersSum", 0),
+                    doc.get("listenersMax", 0),
+                    doc.get("streamsSum", 0),
+                    doc.get("streamsMax", 0),
+                )
+                for doc in cursor
+            ]
+        except Exception:
+            pass
+    path = telemetry_series_path(guild_id, resolution)
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return []
+    raw = raw[:len(raw) - len(raw) % TELEMETRY_SERIES_RECORD.size]
+    return [record for record in TELEMETRY_SERIES_RECORD.iter_unpack(raw) if record[0] >= since_epoch]
+
+
+def resolve_telemetry_timeline_window(tier, days, resolution="auto"):
+    """(resolution, days) der feinsten Aufloesung, deren Aufbewahrung das Zeitfenster abdeckt; None ohne Zeitreihe."""
+    retention = TELEMETRY_SERIES_RETENTION_DAYS.get(tier, {})
+    if not retention:
+        return None
+    days = max(1, min(int(days), max(retention.values())))
+    if resolution not in retention:
+        covering = [name for name in TELEMETRY_SERIES_STEPS if name in retention and retention[name] >= days]
+        resolution = covering[0] if covering else max(retention, key=retention.get)
+    return resolution, min(days, retention[resolution])
+
+
+def build_telemetry_timeline(resolution, days, records):
+    points = []
+    for bucket, samples, listeners_sum, listeners_max, streams_sum, streams_max in records:
+        samples = max(1, samples)
+        points.append({
+            "timestamp": datetime.fromtimestamp(bucket, timezone.utc).isoformat(),
+            "listeners": round(listeners_sum / samples, 2),
+            "listenersMax": listeners_max,
+            "activeStreams": round(streams_sum / samples, 2),
+            "samples": samples,
+        })
+    return {"resolution": resolution, "days": days, "points": points}
+
+
+def load_telemetry_timeline(guild_id, tier, days, resolution="auto"):
+    window = resolve_telemetry_timeline_window(tier, days, resolution)
+    if window is None:
+        return {"resolution": None, "days": 0, "points": []}
+    resolution, days = window
+    return build_telemetry_timeline(resolution, days, read_telemetry_series(guild_id, resolution, int(time.time()) - days * 86400))
+
+
+def delete_telemetry_series(guild_id):
+    deleted = {}
+    if db is not None:
+        try:
+            for resolution, collection_name in TELEMETRY_SERIES_COLLECTIONS.items():
+                deleted[collection_name] = db[collection_name].delete_many({"guildId": guild_id}).deleted_count
+            return deleted
+        except Exception:
+            pass
+    with TELEMETRY_SERIES_LOCK:
+        for resolution in TELEMETRY_SERIES_STEPS:
+            path = telemetry_series_path(guild_id, resolution)
+            if path.exists():
+                path.unlink()
+                deleted[path.name] = 1
+    return deleted
+
+
+# === Statistik-Analysen (NumPy) ===
+# Perzentile, Stunde x Wochentag-Heatmap, gleitende Tagesmittel und Stations-Anteile
+# fuer /api/dashboard/stats/detail. Quelle: listener_snapshots + listening_sessions,
+# ohne Snapshots die 5-Minuten-Telemetrie. Ergebnis pro Guild/Zeitfenster gecacht.
+
+STATS_ANALYTICS_PERCENTILES = (50, 90, 95, 99)
+STATS_ANALYTICS_MOVING_AVERAGE_DAYS = 7
+STATS_ANALYTICS_CACHE_TTL_SECONDS = 300
+STATS_ANALYTICS_CACHE_MAX = 512
+STATS_ANALYTICS_CACHE = {}
+STATS_ANALYTICS_GENERATIONS = {}
+STATS_ANALYTICS_LOCK = threading.Lock()
+
+
+def stats_value_epoch(value):
+    if isinstance(value, datetime):
+        return mongo_datetime_epoch(value)
+    parsed = parse_iso_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def invalidate_stats_analytics(guild_id):
+    with STATS_ANALYTICS_LOCK:
+        STATS_ANALYTICS_GENERATIONS[guild_id] = STATS_ANALYTICS_GENERATIONS.get(guild_id, 0) + 1
+
+
+def stats_analytics_signature(guild_id):
+    """Aendert sich, sobald fuer die Guild neue Snapshots, Sessions oder Telemetrie vorliegen."""
+    generation = STATS_ANALYTICS_GENERATIONS.get(guild_id, 0)
+    if db is not None:
+        try:
+            last_snapshot = db.listener_snapshots.find_one(
+                {"guildId": guild_id}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", -1)]
+            ) or {}
+            last_session = db.listening_sessions.find_one(
+                {"guildId": guild_id}, {"_id": 0, "startedAt": 1}, sort=[("startedAt", -1)]
+            ) or {}
+            return (str(last_snapshot.get("timestamp")), str(last_session.get("startedAt")), generation)
+        except Exception:
+            pass
+    try:
+        series_mtime = telemetry_series_path(guild_id, "5m").stat().st_mtime_ns
+    except OSError:
+        series_mtime = 0
+    return (series_mtime, generation)
+
+
+def load_stats_analytics_source(guild_id, since_epoch):
+    """(ts, listeners) der Snapshots und (stationKey, stationName, listeningMs, durationMs) der Sessions als Arrays."""
+    snapshot_rows = []
+    session_rows = []
+    if db is not None:
+        try:
+            since = datetime.fromtimestamp(since_epoch, timezone.utc)
+            snapshot_rows = [
+                (stats_value_epoch(doc.get("timestamp")), doc.get("listeners") or 0)
+                for doc in db.listener_snapshots.find(
+                    {"guildId": guild_id, "timestamp": {"$gte": since}},
+                    {"_id": 0, "timestamp": 1, "listeners": 1},
+                )
+            ]
+            # startedAt ist je nach Schreibpfad Date oder ISO-String.
+            started_filter = [
+                {"startedAt": {"$gte": since}},
+                {"startedAt": {"$gte": since.strftime("%Y-%m-%dT%H:%M:%S.000Z")}},
+            ]
+            session_rows = [
+                (
+                    str(doc.get("stationKey") or "unknown"),
+                    str(doc.get("stationName") or doc.get("stationKey") or "unknown"),
+                    doc.get("humanListeningMs", doc.get("durationMs")) or 0,
+                    doc.get("durationMs") or 0,
+                )
+                for doc in db.listening_sessions.find(
+                    {"guildId": guild_id, "$or": started_filter},
+                    {"_id": 0, "stationKey": 1, "stationName": 1, "humanListeningMs": 1, "durationMs": 1},
+                )
+            ]
+        except Exception:
+            snapshot_rows, session_rows = [], []
+    if not snapshot_rows:
+        snapshot_rows = [
+            (bucket, listeners_sum / max(1, samples))
+            for bucket, samples, listeners_sum, _, _, _ in read_telemetry_series(guild_id, "5m", since_epoch)
+        ]
+
+    snapshots = np.array(snapshot_rows, dtype=np.float64).reshape(-1, 2)
+    timestamps = snapshots[:, 0].astype(np.int64)
+    keep = timestamps > 0
+    sessions = {
+        "stationKeys": np.array([row[0] for row in session_rows], dtype=object),
+        "stationNames": np.array([row[1] for row in session_rows], dtype=object),
+        "listeningMs": np.array([row[2] for row in session_rows], dtype=np.float64),
+        "durationMs": np.array([row[3] for row in session_rows], dtype=np.float64),
+    }
+    return timestamps[keep], snapshots[keep, 1], sessions
+
+
+def stats_local_epochs(timestamps):
+    """Verschiebt Epoch-Sekunden um den lokalen UTC-Offset (stats_local_time), damit //86400 Kalendertage wie beim Ingest liefert.
+
+    Der Offset wird je UTC-Stunde einmal bestimmt; Zeitumstellungen liegen auf vollen Stunden.
+    """
+    hours, inverse = np.unique(timestamps // 3600, return_inverse=True)
+    offsets = np.array(
+        [
+            int(stats_local_time(datetime.fromtimestamp(int(hour) * 3600, timezone.utc)).utcoffset().total_seconds())
+            for hour in hours
+        ],
+        dtype=np.int64,
+    )
+    return timestamps + offsets[inverse.reshape(-1)]
+
+
+def compute_listener_analytics(timestamps, listeners, moving_average_days=STATS_ANALYTICS_MOVING_AVERAGE_DAYS):
+    if not timestamps.size:
+        return {"samples": 0, "summary": {}, "heatmap": [], "daily": []}
+    summary = {"mean": round(float(listeners.mean()), 2), "max": round(float(listeners.max()), 2)}
+    for percentile, value in zip(STATS_ANALYTICS_PERCENTILES, np.percentile(listeners, STATS_ANALYTICS_PERCENTILES)):
+        summary[f"p{percentile}"] = round(float(value), 2)
+
+    # Heatmap [Wochentag][Stunde] in lokaler Serverzeit wie guild_stats.hours/daysOfWeek,
+    # Montag = 0 (1970-01-01 war ein Donnerstag).
+    local_epochs = stats_local_epochs(timestamps)
+    day_index = local_epochs // 86400
+    slot = ((day_index + 3) % 7) * 24 + (local_epochs // 3600) % 24
+    slot_sums = np.bincount(slot, weights=listeners, minlength=168)
+    slot_counts = np.bincount(slot, minlength=168)
+    heatmap = np.divide(slot_sums, slot_counts, out=np.zeros(168), where=slot_counts > 0).reshape(7, 24)
+
+    # Tagesmittel und gleitendes Mittel ueber die Samples der letzten N lokalen Kalendertage
+    # (gleiche Tagesgrenze wie guild_daily_stats.date).
+    first_day = int(day_index.min())
+    offset = day_index - first_day
+    day_sums = np.bincount(offset, weights=listeners)
+    day_counts = np.bincount(offset)
+    day_max = np.zeros(day_sums.size)
+    np.maximum.at(day_max, offset, listeners)
+    window_start = np.maximum(np.arange(day_sums.size) - moving_average_days + 1, 0)
+    sum_prefix = np.concatenate(([0.0], np.cumsum(day_sums)))
+    count_prefix = np.concatenate(([0], np.cumsum(day_counts)))
+    window_sums = sum_prefix[1:] - sum_prefix[window_start]
+    window_counts = count_prefix[1:] - count_prefix[window_start]
+    moving_average = np.divide(window_sums, window_counts, out=np.zeros(day_sums.size), where=window_counts > 0)
+    day_average = np.divide(day_sums, day_counts, out=np.zeros(day_sums.size), where=day_counts > 0)
+    daily = [
+        {
+            "date": datetime.fromtimestamp((first_day + int(index)) * 86400, timezone.utc).strftime("%Y-%m-%d"),
+            "avgListeners": round(float(day_average[index]), 2),
+            "maxListeners": round(float(day_max[index]), 2),
+            "movingAvg": round(float(moving_average[index]), 2),
+            "samples": int(day_counts[index]),
+        }
+        for index in np.flatnonzero(day_counts)
+    ]
+    return {"samples": int(timestamps.size), "summary": summary, "heatmap": np.round(heatmap, 2).tolist(), "daily": daily}
+
+
+def compute_session_analytics(sessions):
+    station_keys = sessions["stationKeys"]
+    if not station_keys.size:
+        return {"sessions": 0, "durationPercentilesMs": {}, "stationShares": []}
+    durations = np.percentile(sessions["durationMs"], STATS_ANALYTICS_PERCENTILES)
+    keys, first_index, inverse = np.unique(station_keys, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, weights=sessions["listeningMs"], minlength=keys.size)
+    counts = np.bincount(inverse, minlength=keys.size)
+    grand_total = float(totals.sum())
+    shares = totals / grand_total if grand_total > 0 else np.zeros(keys.size)
+    order = np.lexsort((keys, -totals))
+    return {
+        "sessions": int(station_keys.size),
+        "durationPercentilesMs": {f"p{p}": int(value) for p, value in zip(STATS_ANALYTICS_PERCENTILES, durations)},
+        "stationShares": [
+            {
+                "stationKey": str(keys[index]),
+                "stationName": str(sessions["stationNames"][first_index[index]]),
+                "listeningMs": int(totals[index]),
+                "sessions": int(counts[index]),
+                "share": round(float(shares[index]), 4),
+            }
+            for index in order
+        ],
+    }
+
+
+def stats_analytics_signature_from_sections(sections, generation):
+    """Signatur aus den bereits geladenen Stats-Detail-Sektionen, ohne eigene Query.
+
+    sessions ist absteigend, snapshots aufsteigend sortiert; beide enthalten jeweils den neuesten Eintrag.
+    """
+    sessions = sections.get("sessions") or []
+    snapshots = sections.get("snapshots") or []
+    return (
+        "sections",
+        snapshots[-1].get("timestamp") if snapshots else None,
+        sessions[0].get("startedAt") if sessions else None,
+        generation,
+    )
+
+
+def get_stats_analytics(guild_id, days, signature=None):
+    if signature is None:
+        signature = stats_analytics_signature(guild_id)
+    cache_key = (guild_id, int(days))
+    now = time.time()
+    with STATS_ANALYTICS_LOCK:
+        cached = STATS_ANALYTICS_CACHE.get(cache_key)
+    if cached and cached["signature"] == signature and now - cached["computedAt"] < STATS_ANALYTICS_CACHE_TTL_SECONDS:
+        return cached["result"]
+
+    timestamps, listeners, sessions = load_stats_analytics_source(guild_id, int(now) - int(days) * 86400)
+    result = {
+        "days": int(days),
+        "listeners": compute_listener_analytics(timestamps, listeners),
+        "stations": compute_session_analytics(sessions),
+        "computedAt": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+    }
+    with STATS_ANALYTICS_LOCK:
+        STATS_ANALYTICS_CACHE.pop(cache_key, None)
+        STATS_ANALYTICS_CACHE[cache_key] = {"signature": signature, "computedAt": now, "result": result}
+        while len(STATS_ANALYTICS_CACHE) > STATS_ANALYTICS_CACHE_MAX:
+            STATS_ANALYTICS_CACHE.pop(next(iter(STATS_ANALYTICS_CACHE)))
+    return result
+
+
+def normalize_dashboard_event(event_payload):
+    payload = event_payload if isinstance(event_payload, dict) else {}
+    event_id = str(payload.get("id") or secrets.token_hex(8)).strip()[:64]
+    title = clip_text(payload.get("title") or payload.get("name") or "OmniFM Event", 120)
+    station_key = clip_text(payload.get("stationKey") or payload.get("station") or "", 120)
+    fallback_key = clip_text(payload.get("fallbackStationKey") or payload.get("fallback") or "", 120)
+    starts_at = clip_text(payload.get("startsAt") or payload.get("startAt") or "", 80)
+    timezone_name = clip_text(payload.get("timezone") or "Europe/Vienna", 60)
+    channel_id = clip_text(payload.get("channelId") or "", 60)
+    enabled = payload.get("enabled") is not False
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": event_id,
+        "title": title,
+        "stationKey": station_key,
+        "fallbackStationKey": fallback_key,
+        "startsAt": starts_at,
+        "timezone": timezone_name,
+        "channelId": channel_id,
+        "enabled": enabled,
+        "updatedAt": now_iso,
+        "createdAt": clip_text(payload.get("createdAt") or now_iso, 80),
+    }
+
+
+def normalize_dashboard_perms(payload):
+    body = payload if isinstance(payload, dict) else {}
+    incoming = body.get("commandRoleMap") if isinstance(body.get("commandRoleMap"), dict) else {}
+    normalized = {}
+    for raw_command, raw_roles in incoming.items():
+        command = clip_text(raw_command, 64).lstrip("/").lower()
+        if not command:
+            continue
+        roles = []
+        if isinstance(raw_roles, list):
+            for role in raw_roles:
+                role_name = clip_text(role, 80)
+                if role_name and role_name not in roles:
+                    roles.append(role_name)
+        normalized[command] = roles
+    return {
+        "commandRoleMap": normalized,
+        "updatedAt": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+# === Kompilierte Befehlsrechte ===
+# commandRoleMap wird pro Guild in Bitsets uebersetzt: jede erwaehnte Rolle (ID oder
+# Name) bekommt ein Bit, jeder Befehl die Maske seiner erlaubten Rollen. Ein Befehl
+# ohne Eintrag oder mit leerer Liste ist fuer alle erlaubt.
+
+DASHBOARD_PERMS_CACHE_TTL_SECONDS = 60
+DASHBOARD_PERMS_CHECK_MAX = 500
+DASHBOARD_PERMS_CACHE = {}
+DASHBOARD_PERMS_CACHE_LOCK = threading.Lock()
+
+
+def compile_dashboard_perms(command_role_map):
+    role_bits = {}
+    command_masks = {}
+    for command, roles in (command_role_map if isinstance(command_role_map, dict) else {}).items():
+        mask = 0
+        for role in roles if isinstance(roles, list) else []:
+            mask |= 1 << role_bits.setdefault(str(role), len(role_bits))
+        command_masks[str(command)] = mask
+    return {"roleBits": role_bits, "commandMasks": command_masks}
+
+
+def get_compiled_dashboard_perms(guild_id):
+    now = time.time()
+    with DASHBOARD_PERMS_CACHE_LOCK:
+        cached = DASHBOARD_PERMS_CACHE.get(guild_id)
+    if cached and now - cached[0] < DASHBOARD_PERMS_CACHE_TTL_SECONDS:
+        return cached[1]
+    perms = dashboard_repo_get("perms", guild_id)
+    compiled = compile_dashboard_perms(perms.get("commandRoleMap"))
+    compiled["updatedAt"] = perms.get("updatedAt")
+    with DASHBOARD_PERMS_CACHE_LOCK:
+        DASHBOARD_PERMS_CACHE[guild_id] = (now, compiled)
+    return compiled
+
+
+def invalidate_compiled_dashboard_perms(guild_id):
+    with DASHBOARD_PERMS_CACHE_LOCK:
+        DASHBOARD_PERMS_CACHE.pop(guild_id, None)
+
+
+def check_dashboard_permission(compiled, roles, command):
+    """(allowed, restricted) fuer einen Befehl und die Rollen eines Users."""
+    required = compiled["commandMasks"].get(command, 0)
+    if not required:
+        return True, False
+    role_bits = compiled["roleBits"]
+    held = 0
+    for role in roles:
+        bit = role_bits.get(role)
+        if bit is not None:
+            held |= 1 << bit
+    return bool(held & required), True
+
+
+def normalize_dashboard_telemetry(payload):
+    body = payload if isinstance(payload, dict) else {}
+    listeners_now = max(0, parse_int(body.get("listenersNow"), 0))
+    active_streams = max(0, parse_int(body.get("activeStreams"), 0))
+    peak_listeners = max(0, parse_int(body.get("peakListeners"), listeners_now))
+    peak_time = clip_text(body.get("peakTime") or datetime.now(timezone.utc).isoformat(), 80)
+    top_station_name = clip_text((body.get("topStation") or {}).get("name") if isinstance(body.get("topStation"), dict) else body.get("topStationName"), 120)
+    top_station_listeners = max(0, parse_int((body.get("topStation") or {}).get("listeners") if isinstance(body.get("topStation"), dict) else body.get("topStationListeners"), 0))
+
+    listeners_by_channel = []
+    raw_channels = body.get("listenersByChannel") if isinstance(body.get("listenersByChannel"), list) else []
+    for item in raw_channels[:20]:
+        if not isinstance(item, dict):
+            continue
+        listeners_by_channel.append({
+            "name": clip_text(item.get("name") or item.get("channel") or "Voice", 80),
+            "listeners": max(0, parse_int(item.get("listeners"), 0)),
+        })
+
+    daily_report = []
+    raw_daily = body.get("dailyReport") if isinstance(body.get("dailyReport"), list) else body.get("daily") if isinstance(body.get("daily"), list) else []
+    for item in raw_daily[:31]:
+        if not isinstance(item, dict):
+            continue
+        day_key = clip_text(item.get("day"), 20)
+        if not day_key:
+            continue
+        daily_report.append({
+            "day": day_key,
+            "starts": max(0, parse_int(item.get("starts"), 0)),
+            "peakListeners": max(0, parse_int(item.get("peakListeners"), 0)),
+        })
+
+    station_breakdown = []
+    raw_station_breakdown = body.get("stationBreakdown") if isinstance(body.get("stationBreakdown"), list) else []
+    for item in raw_station_breakdown[:20]:
+        if not isinstance(item, dict):
+            continue
+        station_breakdown.append({
+            "name": clip_text(item.get("name") or item.get("station") or "Station", 80),
+            "starts": max(0, parse_int(item.get("starts"), 0)),
+            "peakListeners": max(0, parse_int(item.get("peakListeners"), 0)),
+        })
+
+    return {
+        "listenersNow": listeners_now,
+        "activeStreams": active_streams,
+        "peakListeners": peak_listeners,
+        "peakTime": peak_time,
+        "topStation": {
+            "name": top_station_name or "-",
+            "listeners": top_station_listeners,
+        },
+        "listenersByChannel": listeners_by_channel,
+        "dailyReport": daily_report,
+        "stationBreakdown": station_breakdown,
+        "updatedAt": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def normalize_stored_dashboard_telemetry(payload):
+    """Fuer Migrationen: normalisieren, aber den urspruenglichen updatedAt-Zeitpunkt behalten."""
+    normalized = normalize_dashboard_telemetry(payload)
+    if isinstance(payload, dict) and payload.get("updatedAt"):
+        normalized["updatedAt"] = clip_text(payload.get("updatedAt"), 80)
+    return normalized
+
+
+def has_manage_guild_permission(raw_permissions):
+    try:
+        bitfield = int(str(raw_permissions or "0"))
+    except Exception:
+        bitfield = 0
+    manage_guild = (bitfield & 0x20) == 0x20
+    administrator = (bitfield & 0x8) == 0x8
+    return manage_guild or administrator
+
+
+def resolve_session_token_from_request(request: Request):
+    auth = (request.headers.get("authorization") or "").strip()
+    if auth.lower().startswith("bearer "):
+        bearer = auth[7:].strip()
+        if bearer:
+            return bearer
+    cookie_token = (request.cookies.get(SESSION_COOKIE_NAME) or "").strip()
+    if cookie_token:
+        return cookie_token
+    header_token = (request.headers.get("x-session-token") or "").strip()
+    if header_token:
+        return header_token
+    return ""
+
+
+def get_dashboard_session(request: Request):
+    clean_expired_dashboard_sessions()
+    token = resolve_session_token_from_request(request)
+    if not token:
+        return None, ""
+    session = DASHBOARD_SESSION_STORE.get(token)
+    if not isinstance(session, dict):
+        return None, token
+    return session, token
+
+
+def list_manageable_session_guilds(session_payload):
+    guilds = session_payload.get("guilds") if isinstance(session_payload.get("guilds"), list) else []
+    output = []
+    for item in guilds:
+        if not isinstance(item, dict):
+            continue
+        guild_id = str(item.get("id") or "").strip()
+        if not is_valid_server_id(guild_id):
+            continue
+        if not has_manage_guild_permission(item.get("permissions", "0")):
+            continue
+        output.append(item)
+    return output
+
+
+def build_dashboard_guild_entries(guild_items):
+    tiers = get_tiers_for_servers([str(item.get("id") or "").strip() for item in guild_items])
+    output = []
+    for item in guild_items:
+        guild_id = str(item.get("id") or "").strip()
+        tier = tiers.get(guild_id, "free")
+        output.append({
+            "id": guild_id,
+            "name": clip_text(item.get("name") or guild_id, 120),
+            "icon": clip_text(item.get("icon") or "", 120),
+            "owner": bool(item.get("owner", False)),
+            "permissions": str(item.get("permissions") or "0"),
+            "tier": tier,
+            "dashboardEnabled": (TIER_RANK.get(tier, 0) >= TIER_RANK.get("pro", 1)),
+            "ultimateEnabled": tier == "ultimate",
+        })
+    output.sort(key=lambda row: row.get("name", "").lower())
+    return output
+
+
+def resolve_dashboard_guilds_for_session(session_payload):
+    return build_dashboard_guild_entries(list_manageable_session_guilds(session_payload))
+
+
+def resolve_session_guild_for_server(session_payload, server_id):
+    normalized = str(server_id or "").strip()
+    if not is_valid_server_id(normalized):
+        return None
+    for item in list_manageable_session_guilds(session_payload):
+        if str(item.get("id") or "").strip() == normalized:
+            return build_dashboard_guild_entries([item])[0]
+    return None
+
+
+def build_discord_authorize_url(state, prompt="consent"):
+    params = {
+        "client_id": DISCORD_CLIENT_ID,
+        "response_type": "code",
+        "redirect_uri": DISCORD_REDIRECT_URI,
         "scope": DISCORD_OAUTH_SCOPES,
         "state": state,
         "prompt": prompt,
@@ -989,6 +2241,17 @@ def enforce_api_rate_limit(request: Request, scope):
     return None
 
 
+def is_metrics_request_authorized(request: Request):
+    if not METRICS_TOKEN:
+        return True
+    auth = (request.headers.get("authorization") or "").strip()
+    if auth.lower().startswith("bearer "):
+        bearer = auth[7:].strip()
+        if bearer and hmac.compare_digest(bearer, METRICS_TOKEN):
+            return True
+    return False
+
+
 def is_admin_request(request: Request):
     if not ADMIN_API_TOKEN:
         return False
@@ -1159,160 +2422,1212 @@ def seed_stations_if_empty():
         return
 
 
-seed_stations_if_empty()
+seed_stations_if_empty()
+
+# Seed premium data to MongoDB
+def seed_premium_if_needed():
+    if db is None:
+        return
+    try:
+        if db.licenses.count_documents({}) == 0 and (PREMIUM_FILE.exists() or PREMIUM_JOURNAL_FILE.exists()):
+            with PREMIUM_FILE_LOCK:
+                data = copy.deepcopy(load_premium_file_cached())
+            if isinstance(data, dict):
+                licenses = data.get("licenses", {})
+                for lic_id, lic in licenses.items():
+                    if isinstance(lic, dict):
+                        lic["_licenseId"] = lic_id
+                        db.licenses.replace_one({"_licenseId": lic_id}, lic, upsert=True)
+                entitlements = data.get("serverEntitlements", {})
+                for srv_id, ent in entitlements.items():
+                    if isinstance(ent, dict):
+                        ent["_serverId"] = srv_id
+                        db.server_entitlements.replace_one({"_serverId": srv_id}, ent, upsert=True)
+                sessions = data.get("processedSessions", {})
+                for sess_id, sess in sessions.items():
+                    if isinstance(sess, dict):
+                        sess["_sessionId"] = sess_id
+                        db.processed_sessions.replace_one({"_sessionId": sess_id}, sess, upsert=True)
+                extra_state = {
+                    "trialClaims": data.get("trialClaims", {}),
+                    "offers": data.get("offers", {}),
+                    "discordBotListState": data.get("discordBotListState", {}),
+                    "recentRedemptions": data.get("recentRedemptions", []),
+                }
+                db.premium_state.replace_one({"_id": "meta"}, {"_id": "meta", **extra_state}, upsert=True)
+    except Exception:
+        pass
+
+
+# === MongoDB Indexes ===
+# (collection, keys, options) - idempotent, create_index ist ein No-op wenn der Index existiert.
+MONGO_INDEX_SPECS = [
+    ("licenses", [("_licenseId", 1)], {"name": "licenseId_unique", "unique": True}),
+    (
+        "licenses",
+        [("_licenseKeyNorm", 1)],
+        {"name": "licenseKeyNorm_unique", "unique": True, "partialFilterExpression": {"_licenseKeyNorm": {"$exists": True}}},
+    ),
+    ("licenses", [("_contactEmail", 1)], {"name": "contactEmail"}),
+    ("licenses", [("_expiresAtEpoch", 1)], {"name": "expiresAtEpoch"}),
+    ("server_entitlements", [("_serverId", 1)], {"name": "serverId_unique", "unique": True}),
+    ("processed_sessions", [("_sessionId", 1)], {"name": "sessionId_unique", "unique": True}),
+    (
+        "processed_sessions",
+        [("_processedAt", 1)],
+        {"name": "processedAt_ttl", "expireAfterSeconds": PROCESSED_SESSION_RETENTION_DAYS * 86400},
+    ),
+    ("trial_claims", [("_email", 1)], {"name": "email_unique", "unique": True}),
+    ("offers", [("_code", 1)], {"name": "code_unique", "unique": True}),
+    ("offers", [("updatedAt", -1), ("_code", -1)], {"name": "updatedAt_code"}),
+    ("offer_redemptions", [("_sessionId", 1)], {"name": "sessionId_unique", "unique": True}),
+    ("offer_redemptions", [("processedAt", -1), ("_sessionId", -1)], {"name": "processedAt_sessionId"}),
+    ("offer_redemptions", [("code", 1), ("processedAt", -1), ("_sessionId", -1)], {"name": "code_processedAt"}),
+    ("custom_stations", [("guildId", 1), ("key", 1)], {"name": "guildId_key"}),
+    ("daily_stats", [("guildId", 1), ("date", -1)], {"name": "guildId_date"}),
+    ("listening_sessions", [("guildId", 1), ("startedAt", -1)], {"name": "guildId_startedAt"}),
+    ("listener_snapshots", [("guildId", 1), ("timestamp", -1)], {"name": "guildId_timestamp"}),
+    ("telemetry_series_raw", [("guildId", 1), ("ts", 1)], {"name": "guildId_ts"}),
+    ("telemetry_series_5m", [("guildId", 1), ("bucket", 1)], {"name": "guildId_bucket"}),
+    ("telemetry_series_5m", [("expiresAt", 1)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ("telemetry_series_1h", [("guildId", 1), ("bucket", 1)], {"name": "guildId_bucket"}),
+    ("telemetry_series_1h", [("expiresAt", 1)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ("listening_sessions", [("expiresAt", 1)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ("listener_snapshots", [("expiresAt", 1)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ("guild_stats", [("guildId", 1)], {"name": "guildId"}),
+    ("guild_settings", [("guildId", 1)], {"name": "guildId"}),
+    ("stats_reset_jobs", [("serverId", 1), ("updatedAt", -1)], {"name": "serverId_updatedAt"}),
+    ("stats_reset_jobs", [("expiresAt", 1)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ("stats_ingest_batches", [("expiresAt", 1)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ("stations", [("tier", 1), ("key", 1)], {"name": "tier_key"}),
+    ("stations", [("is_default", 1)], {"name": "is_default"}),
+]
+
+# (collection, filter, sort) - die heissen Queries dieses Backends, geprueft per explain().
+MONGO_HOT_QUERIES = [
+    ("licenses", {"_licenseId": "OMNI-XXXX-XXXX-XXXX"}, None),
+    ("licenses", {"_licenseKeyNorm": "OMNI-XXXX-XXXX-XXXX"}, None),
+    ("licenses", {"_contactEmail": "explain@example.com"}, None),
+    ("licenses", {"_expiresAtEpoch": {"$gt": 0, "$lte": 86400}}, [("_expiresAtEpoch", 1)]),
+    ("trial_claims", {"_email": "explain@example.com"}, None),
+    ("offers", {"_code": "EXPLAIN"}, None),
+    ("offers", {}, [("updatedAt", -1), ("_code", -1)]),
+    ("offer_redemptions", {"_sessionId": "cs_explain"}, None),
+    ("offer_redemptions", {}, [("processedAt", -1), ("_sessionId", -1)]),
+    ("offer_redemptions", {"code": "EXPLAIN"}, [("processedAt", -1), ("_sessionId", -1)]),
+    ("server_entitlements", {"_serverId": "000000000000000000"}, None),
+    ("server_entitlements", {"_serverId": {"$in": ["000000000000000000", "000000000000000001"]}}, None),
+    ("processed_sessions", {"_sessionId": "cs_explain"}, None),
+    ("custom_stations", {"guildId": "000000000000000000"}, None),
+    ("custom_stations", {"guildId": "000000000000000000", "key": "explain"}, None),
+    ("daily_stats", {"guildId": "000000000000000000", "date": {"$gte": "2000-01-01"}}, [("date", -1)]),
+    ("listening_sessions", {"guildId": "000000000000000000"}, [("startedAt", -1)]),
+    ("listener_snapshots", {"guildId": "000000000000000000"}, [("timestamp", -1)]),
+    ("listening_sessions", {"guildId": "000000000000000000", "startedAt": {"$lt": "2000-01-01T00:00:00.000Z"}}, None),
+    ("listener_snapshots", {"guildId": "000000000000000000", "timestamp": {"$lt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, None),
+    ("telemetry_series_5m", {"guildId": "000000000000000000", "bucket": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("bucket", 1)]),
+    ("telemetry_series_1h", {"guildId": "000000000000000000", "bucket": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("bucket", 1)]),
+    ("guild_stats", {"guildId": "000000000000000000"}, None),
+    ("guild_settings", {"guildId": "000000000000000000"}, None),
+    ("stats_reset_jobs", {"serverId": "000000000000000000"}, [("updatedAt", -1)]),
+    ("stations", {"key": {"$not": {"$regex": "^custom:"}}, "tier": {"$in": ["free", "pro"]}}, None),
+    ("stations", {"is_default": True}, None),
+]
+
+
+MONGO_INDEX_COLLISION_SAMPLE = 20
+
+
+def find_unique_index_collisions(collection_name, keys, options):
+    """Werte, die einen Unique-Index verletzen wuerden (hoechstens MONGO_INDEX_COLLISION_SAMPLE)."""
+    pipeline = []
+    if options.get("partialFilterExpression"):
+        pipeline.append({"$match": options["partialFilterExpression"]})
+    pipeline.extend([
+        {"$group": {"_id": {key: f"${key}" for key, _ in keys}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": MONGO_INDEX_COLLISION_SAMPLE},
+    ])
+    return [doc["_id"] for doc in db[collection_name].aggregate(pipeline)]
+
+
+def ensure_mongo_indexes():
+    results = []
+    if db is None:
+        return results
+    for collection_name, keys, options in MONGO_INDEX_SPECS:
+        entry = {"collection": collection_name, "index": options.get("name") or "_".join(key for key, _ in keys), "ok": True}
+        try:
+            if options.get("unique") and entry["index"] not in db[collection_name].index_information():
+                collisions = find_unique_index_collisions(collection_name, keys, options)
+                if collisions:
+                    # Alt-Daten mit Dubletten (z. B. Lizenzschluessel, die sich nur in der Schreibweise
+                    # unterscheiden): nicht-eindeutig indexieren, damit Writes weiterlaufen, und melden.
+                    fallback = {key: value for key, value in options.items() if key != "unique"}
+                    fallback["name"] = f"{entry['index'].removesuffix('_unique')}_nonunique"
+                    db[collection_name].create_index(keys, **fallback)
+                    entry["ok"] = False
+                    entry["error"] = clip_text(
+                        f"{len(collisions)} doppelte Werte, Unique-Index nicht angelegt: {json.dumps(collisions, default=str)}"
+                    )
+                    results.append(entry)
+                    continue
+            db[collection_name].create_index(keys, **options)
+        except Exception as exc:
+            if "expireAfterSeconds" in options and options.get("name"):
+                # Geaenderte TTL: bestehenden Index per collMod anpassen statt neu anlegen.
+                try:
+                    db.command(
+                        "collMod",
+                        collection_name,
+                        index={"name": options["name"], "expireAfterSeconds": options["expireAfterSeconds"]},
+                    )
+                    results.append(entry)
+                    continue
+                except Exception:
+                    pass
+            entry["ok"] = False
+            entry["error"] = clip_text(exc)
+        results.append(entry)
+    return results
+
+
+def collect_plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if plan.get("stage"):
+            stages.append(str(plan.get("stage")))
+        for value in plan.values():
+            stages.extend(collect_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(collect_plan_stages(item))
+    return stages
+
+
+def verify_mongo_query_plans():
+    results = []
+    if db is None:
+        return results
+    for collection_name, query, sort in MONGO_HOT_QUERIES:
+        entry = {"collection": collection_name, "query": json.dumps(query, default=str), "ok": True}
+        try:
+            cursor = db[collection_name].find(query, {"_id": 0}).limit(1)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain()
+            winning_plan = (plan.get("queryPlanner") or {}).get("winningPlan") or {}
+            stages = collect_plan_stages(winning_plan)
+            entry["stages"] = stages
+            entry["ok"] = "COLLSCAN" not in stages
+        except Exception as exc:
+            entry["ok"] = False
+            entry["error"] = clip_text(exc)
+        results.append(entry)
+    return results
+
+
+# === Premium Helper Functions (MongoDB) ===
+
+# state key -> (Mongo collection, ID-Feld)
+PREMIUM_DOCUMENT_COLLECTIONS = [
+    ("licenses", "licenses", "_licenseId"),
+    ("serverEntitlements", "server_entitlements", "_serverId"),
+    ("processedSessions", "processed_sessions", "_sessionId"),
+    ("trialClaims", "trial_claims", "_email"),
+    ("offers", "offers", "_code"),
+    ("offerRedemptions", "offer_redemptions", "_sessionId"),
+]
+PREMIUM_META_FIELDS = ["discordBotListState", "recentRedemptions"]
+# Frueher im Meta-Dokument gespeicherte Sections, die in eigene Collections umziehen.
+PREMIUM_MIGRATED_META_SECTIONS = ["trialClaims", "offers"]
+# In Mongo eigenstaendig verwaltete Sections: nicht Teil von load_premium()/save_premium().
+PREMIUM_MONGO_STANDALONE_SECTIONS = {"processedSessions", "offerRedemptions"}
+# state key -> abgeleitete Felder, die build_premium_document() setzt
+PREMIUM_DERIVED_FIELDS = {
+    "licenses": ["_licenseKeyNorm", "_contactEmail", "_expiresAtEpoch"],
+    "processedSessions": ["_processedAt"],
+}
+PREMIUM_PERSISTENCE_METRICS = {
+    "saves": 0,
+    "skippedSaves": 0,
+    "documentsWritten": 0,
+    "lastDocumentsWritten": 0,
+    "conflicts": 0,
+    "backend": "mongo" if db is not None else "file",
+}
+PREMIUM_MUTATION_ATTEMPTS = 5
+
+
+class PremiumState(dict):
+    """Premium-State, der sich die Fingerprints der geladenen Dokumente merkt.
+
+    save_premium() schreibt damit nur geaenderte, neue und geloeschte Dokumente.
+    versions haelt die _version-Felder aus MongoDB fuer bedingte Updates, scope
+    die Auswahl, falls nur ein Teil geladen wurde (siehe load_premium).
+    """
+
+    baseline = None
+    versions = None
+    scope = None
+
+
+def premium_fingerprint(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def build_premium_baseline(safe_data):
+    baseline = {"meta": {field: premium_fingerprint(safe_data.get(field)) for field in PREMIUM_META_FIELDS}}
+    for state_key, _, _ in PREMIUM_DOCUMENT_COLLECTIONS:
+        baseline[state_key] = {
+            doc_id: premium_fingerprint(doc)
+            for doc_id, doc in safe_data.get(state_key, {}).items()
+            if isinstance(doc, dict)
+        }
+    return baseline
+
+
+def track_premium_state(data, versions=None, scope=None):
+    state = PremiumState(ensure_premium_state(data))
+    state.baseline = build_premium_baseline(state)
+    state.versions = versions
+    state.scope = scope
+    return state
+
+
+def premium_version_filter(version):
+    # Alt-Dokumente ohne _version gelten als Version 0.
+    return {"_version": version} if version else {"_version": {"$exists": False}}
+
+
+def diff_premium_state(data, safe_data):
+    """Ermittelt geaenderte Dokumente gegenueber dem Lade-Zeitpunkt.
+
+    Ohne Baseline (State nicht ueber load_premium() geladen) gelten alle
+    Dokumente als geaendert und die Loeschmenge ist unbekannt (None). Meta-Felder
+    zaehlen nur, wenn sie mitgeladen wurden.
+    """
+    baseline = getattr(data, "baseline", None)
+    scope = getattr(data, "scope", None)
+    changes = {}
+    for state_key, _, _ in PREMIUM_DOCUMENT_COLLECTIONS:
+        previous = baseline.get(state_key, {}) if baseline else None
+        current = {doc_id: doc for doc_id, doc in safe_data.get(state_key, {}).items() if isinstance(doc, dict)}
+        upserts = {
+            doc_id: doc
+            for doc_id, doc in current.items()
+            if previous is None or previous.get(doc_id) != premium_fingerprint(doc)
+        }
+        deletes = [doc_id for doc_id in previous if doc_id not in current] if previous is not None else None
+        changes[state_key] = {"upserts": upserts, "deletes": deletes, "currentIds": set(current)}
+    meta = {
+        field: safe_data.get(field)
+        for field in PREMIUM_META_FIELDS
+        if not baseline or baseline.get("meta", {}).get(field) != premium_fingerprint(safe_data.get(field))
+    } if scope is None or scope.get("meta") else {}
+    return changes, meta
+
+
+def normalize_license_key(license_key):
+    return str(license_key or "").strip().upper()
+
+
+def license_contact_email(lic):
+    return str(lic.get("email") or lic.get("contactEmail") or "").strip().lower()
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_expiry_epoch(expires_at):
+    parsed = parse_iso_datetime(expires_at)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def license_expiry_epoch(license_info):
+    """expiresAt als Unix-Sekunden; geparst wird jeder ISO-String nur einmal."""
+    if not license_info or not license_info.get("expiresAt"):
+        return None
+    return parse_expiry_epoch(str(license_info["expiresAt"]))
+
+
+def build_premium_document(state_key, id_field, doc_id, payload):
+    doc = {**payload, id_field: doc_id}
+    if state_key == "licenses":
+        doc["_licenseKeyNorm"] = normalize_license_key(doc_id)
+        doc["_contactEmail"] = license_contact_email(payload)
+        # Ohne gueltiges expiresAt gilt eine Lizenz als abgelaufen (siehe is_expired).
+        doc["_expiresAtEpoch"] = license_expiry_epoch(payload) or 0
+    elif state_key == "processedSessions":
+        doc["_processedAt"] = parse_iso_datetime(payload.get("processedAt")) or datetime.now(timezone.utc)
+    return doc
+
+
+def backfill_premium_derived_fields():
+    """Ergaenzt abgeleitete Felder (z. B. _licenseKeyNorm) bei Alt-Dokumenten."""
+    if db is None:
+        return 0
+    updated = 0
+    for state_key, collection_name, id_field in PREMIUM_DOCUMENT_COLLECTIONS:
+        derived_names = PREMIUM_DERIVED_FIELDS.get(state_key)
+        if not derived_names:
+            continue
+        operations = []
+        missing_filter = {"$or": [{name: {"$exists": False}} for name in derived_names]}
+        for doc in db[collection_name].find(missing_filter, {"_id": 0}):
+            doc_id = doc.get(id_field)
+            if not doc_id:
+                continue
+            derived = build_premium_document(state_key, id_field, doc_id, strip_premium_document(doc))
+            derived_fields = {key: value for key, value in derived.items() if key.startswith("_") and key != id_field}
+            operations.append(UpdateOne({id_field: doc_id}, {"$set": derived_fields}))
+        if operations:
+            db[collection_name].bulk_write(operations, ordered=False)
+            updated += len(operations)
+    return updated
+
+
+def migrate_premium_meta_sections():
+    """Verschiebt trialClaims/offers aus dem Meta-Dokument in ihre eigenen Collections."""
+    if db is None:
+        return 0
+    projection = {"_id": 0, **{state_key: 1 for state_key in PREMIUM_MIGRATED_META_SECTIONS}}
+    meta = db.premium_state.find_one({"_id": "meta"}, projection) or {}
+    migrated = 0
+    for state_key, collection_name, id_field in PREMIUM_DOCUMENT_COLLECTIONS:
+        if state_key not in meta:
+            continue
+        section = meta.get(state_key) if isinstance(meta.get(state_key), dict) else {}
+        operations = [
+            UpdateOne(
+                {id_field: doc_id},
+                {"$setOnInsert": build_premium_document(state_key, id_field, doc_id, doc)},
+                upsert=True,
+            )
+            for doc_id, doc in section.items()
+            if doc_id and isinstance(doc, dict)
+        ]
+        if operations:
+            db[collection_name].bulk_write(operations, ordered=False)
+        db.premium_state.update_one({"_id": "meta"}, {"$unset": {state_key: ""}})
+        migrated += len(operations)
+    return migrated
+
+
+def record_premium_save(documents_written, backend):
+    PREMIUM_PERSISTENCE_METRICS["backend"] = backend
+    PREMIUM_PERSISTENCE_METRICS["lastDocumentsWritten"] = documents_written
+    if documents_written <= 0:
+        PREMIUM_PERSISTENCE_METRICS["skippedSaves"] += 1
+        return
+    PREMIUM_PERSISTENCE_METRICS["saves"] += 1
+    PREMIUM_PERSISTENCE_METRICS["documentsWritten"] += documents_written
+
+
+def load_premium(scope=None):
+    """Premium-State mit Baseline fuer save_premium().
+
+    scope = {"offers": [code], "meta": True} laedt nur diese Dokumente (und die
+    Meta-Felder nur mit "meta"); save_premium() schreibt dann auch nur diese.
+    """
+    if db is not None:
+        try:
+            state = {}
+            versions = {}
+            for state_key, collection_name, id_field in PREMIUM_DOCUMENT_COLLECTIONS:
+                if state_key in PREMIUM_MONGO_STANDALONE_SECTIONS:
+                    continue
+                if scope is not None and not scope.get(state_key):
+                    continue
+                query = {} if scope is None else {id_field: {"$in": list(scope[state_key])}}
+                section = {}
+                section_versions = {}
+                for doc in db[collection_name].find(query, {"_id": 0}):
+                    doc_id = doc.get(id_field)
+                    if doc_id:
+                        section[doc_id] = strip_premium_document(doc)
+                        section_versions[doc_id] = parse_int(doc.get("_version"), 0)
+                state[state_key] = section
+                versions[state_key] = section_versions
+            meta = {}
+            if scope is None or scope.get("meta"):
+                meta = db.premium_state.find_one({"_id": "meta"}, {"_id": 0}) or {}
+                versions["meta"] = parse_int(meta.pop("_version", 0), 0)
+            return track_premium_state({**meta, **state}, versions, scope)
+        except Exception:
+            pass
+    try:
+        with PREMIUM_FILE_LOCK:
+            current = load_premium_file_cached()
+            if scope is None:
+                return track_premium_state(copy.deepcopy(current))
+            subset = {
+                state_key: {
+                    doc_id: copy.deepcopy(current[state_key][doc_id])
+                    for doc_id in scope.get(state_key) or ()
+                    if doc_id in current.get(state_key, {})
+                }
+                for state_key, _, _ in PREMIUM_DOCUMENT_COLLECTIONS
+            }
+            if scope.get("meta"):
+                subset.update({field: copy.deepcopy(current.get(field)) for field in PREMIUM_META_FIELDS})
+            return track_premium_state(subset, scope=scope)
+    except Exception:
+        return empty_premium_state()
+
+
+PREMIUM_TRANSACTIONS = {"supported": None}
+
+
+def premium_transactions_supported():
+    """Multi-Dokument-Transaktionen gibt es nur auf Replica Sets und hinter mongos."""
+    if PREMIUM_TRANSACTIONS["supported"] is None:
+        supported = False
+        for command in ("hello", "isMaster"):
+            try:
+                reply = db.client.admin.command(command)
+            except Exception:
+                continue
+            supported = bool(reply.get("setName")) or reply.get("msg") == "isdbgrid"
+            break
+        PREMIUM_TRANSACTIONS["supported"] = supported
+    return PREMIUM_TRANSACTIONS["supported"]
+
+
+def plan_premium_writes(changes, versions=None, with_before=False, session=None):
+    """Pro Section: (state_key, collection, id_field, upserts, deletes, bekannte Versionen, Vorher-Stand)."""
+    plans = []
+    for state_key, collection_name, id_field in PREMIUM_DOCUMENT_COLLECTIONS:
+        if state_key in PREMIUM_MONGO_STANDALONE_SECTIONS:
+            continue
+        upserts = changes[state_key]["upserts"]
+        deletes = changes[state_key]["deletes"]
+        if deletes is None:
+            current_ids = changes[state_key]["currentIds"]
+            deletes = [
+                doc_id for doc_id in db[collection_name].distinct(id_field, session=session)
+                if doc_id not in current_ids
+            ]
+        if not upserts and not deletes:
+            continue
+        if versions is not None:
+            known = versions.setdefault(state_key, {})
+        else:
+            known = {
+                doc[id_field]: parse_int(doc.get("_version"), 0)
+                for doc in db[collection_name].find(
+                    {id_field: {"$in": list(upserts) + list(deletes)}},
+                    {"_id": 0, id_field: 1, "_version": 1},
+                    session=session,
+                )
+            }
+        # Vorher-Stand der zu ersetzenden Dokumente fuer ein eventuelles Rollback.
+        replaced_ids = [doc_id for doc_id in upserts if doc_id in known] if with_before else []
+        before = {
+            doc[id_field]: doc
+            for doc in db[collection_name].find({id_field: {"$in": replaced_ids}}, {"_id": 0})
+        } if replaced_ids else {}
+        plans.append((state_key, collection_name, id_field, upserts, deletes, known, before))
+    return plans
+
+
+def apply_premium_write_plans(plans, meta, versions=None, write_id=None, session=None):
+    """Bedingte Writes gegen die bekannten Versionen. Liefert (geschriebene Dokumente, Konflikte).
+
+    Mit write_id (mehrere Dokumente ohne Transaktion) tragen die Writes eine _writeId
+    und Deletes werden nur markiert, damit rollback_premium_writes() sie zuruecknehmen
+    kann; geloescht wird erst, wenn alles durchgegangen ist.
+    """
+    documents_written = 0
+    conflicts = 0
+    for state_key, collection_name, id_field, upserts, deletes, known, before in plans:
+        if not upserts:
+            continue
+        operations = []
+        replaced = inserted = 0
+        for doc_id, doc in upserts.items():
+            document = build_premium_document(state_key, id_field, doc_id, doc)
+            if write_id:
+                document["_writeId"] = write_id
+            if doc_id in known:
+                document["_version"] = known[doc_id] + 1
+                operations.append(ReplaceOne({id_field: doc_id, **premium_version_filter(known[doc_id])}, document))
+                replaced += 1
+            else:
+                document["_version"] = 1
+                operations.append(UpdateOne({id_field: doc_id}, {"$setOnInsert": document}, upsert=True))
+                inserted += 1
+        result = db[collection_name].bulk_write(operations, ordered=False, session=session)
+        # Ein $setOnInsert auf ein bereits vorhandenes Dokument zaehlt als Match statt als Upsert.
+        insert_conflicts = inserted - result.upserted_count
+        section_conflicts = insert_conflicts + (replaced - (result.matched_count - insert_conflicts))
+        conflicts += section_conflicts
+        documents_written += len(operations) - section_conflicts
+        if section_conflicts:
+            return documents_written, conflicts
+
+    for state_key, collection_name, id_field, upserts, deletes, known, before in plans:
+        if not deletes:
+            continue
+        if write_id:
+            result = db[collection_name].bulk_write([
+                UpdateOne(
+                    {id_field: doc_id, **premium_version_filter(known.get(doc_id, 0))},
+                    {"$set": {"_deleteId": write_id}, "$inc": {"_version": 1}},
+                )
+                for doc_id in deletes
+            ], ordered=False, session=session)
+            conflicts += len(deletes) - result.modified_count
+        else:
+            result = db[collection_name].bulk_write([
+                DeleteOne({id_field: doc_id, **premium_version_filter(known.get(doc_id, 0))})
+                for doc_id in deletes
+            ], ordered=False, session=session)
+            conflicts += len(deletes) - result.deleted_count
+            documents_written += result.deleted_count
+        if conflicts:
+            return documents_written, conflicts
+
+    if meta:
+        if versions is not None:
+            meta_version = versions.get("meta", 0)
+        else:
+            meta_version = parse_int(
+                (db.premium_state.find_one({"_id": "meta"}, {"_version": 1}, session=session) or {}).get("_version"), 0
+            )
+        try:
+            db.premium_state.update_one(
+                {"_id": "meta", **premium_version_filter(meta_version)},
+                {"$set": meta, "$inc": {"_version": 1}},
+                upsert=True,
+                session=session,
+            )
+            documents_written += 1
+        except DuplicateKeyError:
+            # Meta-Dokument existiert bereits mit anderer Version.
+            return documents_written, conflicts + 1
+
+    if write_id:
+        for state_key, collection_name, id_field, upserts, deletes, known, before in plans:
+            if deletes:
+                documents_written += db[collection_name].delete_many(
+                    {id_field: {"$in": list(deletes)}, "_deleteId": write_id}, session=session
+                ).deleted_count
+    return documents_written, conflicts
+
+
+def save_premium_to_mongo(changes, meta, versions=None):
+    """Bedingte Writes pro Dokument gegen die geladene _version.
+
+    Geaenderte Dokumente werden nur ersetzt, wenn ihre Version unveraendert ist,
+    neue nur per $setOnInsert angelegt. Liefert (geschriebene Dokumente, Konflikte).
+    Ohne versions (State nicht ueber load_premium() geladen) gilt der aktuelle
+    Stand in MongoDB als Basis.
+
+    Alles-oder-nichts ueber mehrere Dokumente: auf Replica Sets in einer Transaktion,
+    die bei einem Konflikt abgebrochen wird. Ohne Transaktionen ist ein einzelnes
+    Dokument von sich aus atomar; mehrere werden markiert geschrieben und bei einem
+    Konflikt per rollback_premium_writes() zurueckgenommen.
+    """
+    if premium_transactions_supported():
+        def write_in_transaction(session):
+            plans = plan_premium_writes(changes, versions, session=session)
+            documents_written, conflicts = apply_premium_write_plans(plans, meta, versions, session=session)
+            if conflicts:
+                session.abort_transaction()
+            return plans, documents_written, conflicts
+
+        with db.client.start_session() as session:
+            plans, documents_written, conflicts = session.with_transaction(write_in_transaction)
+    else:
+        plans = plan_premium_writes(changes, versions, with_before=True)
+        touched = sum(len(upserts) + len(deletes) for _, _, _, upserts, deletes, _, _ in plans) + (1 if meta else 0)
+        write_id = secrets.token_hex(8) if touched > 1 else None
+        documents_written, conflicts = apply_premium_write_plans(plans, meta, versions, write_id)
+        if conflicts and write_id:
+            rollback_premium_writes(plans, write_id)
+
+    if conflicts:
+        return 0, conflicts
+    if versions is not None:
+        for state_key, collection_name, id_field, upserts, deletes, known, before in plans:
+            for doc_id in upserts:
+                known[doc_id] = known.get(doc_id, 0) + 1
+            for doc_id in deletes:
+                known.pop(doc_id, None)
+        if meta:
+            versions["meta"] = versions.get("meta", 0) + 1
+    return documents_written, conflicts
+
+
+def rollback_premium_writes(plans, write_id):
+    """Macht die Writes eines abgebrochenen save_premium_to_mongo rueckgaengig.
+
+    Nur Dokumente, die noch unsere _writeId tragen, werden angefasst; die Version
+    steigt dabei weiter, damit parallel geladene Staende ebenfalls neu laden.
+    """
+    for state_key, collection_name, id_field, upserts, deletes, known, before in plans:
+        collection = db[collection_name]
+        if deletes:
+            collection.update_many(
+                {id_field: {"$in": list(deletes)}, "_deleteId": write_id},
+                {"$unset": {"_deleteId": ""}, "$inc": {"_version": 1}},
+            )
+        for doc_id in upserts:
+            original = before.get(doc_id)
+            if original is None:
+                collection.delete_one({id_field: doc_id, "_writeId": write_id})
+            else:
+                restored = {**original, "_version": known.get(doc_id, 0) + 2}
+                restored.pop("_writeId", None)
+                collection.replace_one({id_field: doc_id, "_writeId": write_id}, restored)
+
+
+def write_premium_file(safe_data):
+    tmp_file = PREMIUM_FILE.with_suffix(PREMIUM_FILE.suffix + ".tmp")
+    payload = json.dumps(safe_data, ensure_ascii=False, indent=2) + "\n"
+    try:
+        tmp_file.write_text(payload, encoding="utf-8")
+        tmp_file.replace(PREMIUM_FILE)
+    except Exception:
+        PREMIUM_FILE.write_text(payload, encoding="utf-8")
+    finally:
+        try:
+            if tmp_file.exists():
+                tmp_file.unlink()
+        except Exception:
+            pass
+
+
+# === Premium Journal (Datei-Backend) ===
+# Ohne MongoDB werden Mutationen als JSON-Zeilen an premium.journal angehaengt
+# (put/del pro Dokument, inc pro Zaehlerfeld, meta pro Feld). premium.json ist der Snapshot, der aus
+# Snapshot + Journal neu geschrieben wird: nach PREMIUM_JOURNAL_COMPACT_RECORDS
+# Eintraegen, nach PREMIUM_JOURNAL_COMPACT_IDLE_MS ohne Writes, spaetestens nach
+# PREMIUM_JOURNAL_COMPACT_MAX_DELAY_MS und beim Beenden - das Node-Backend liest
+# premium.json direkt. Replay ist idempotent: jeder Eintrag setzt den kompletten
+# Wert (inc traegt den neuen Zaehlerstand mit), der letzte gewinnt.
+
+
+class PremiumFileLock:
+    """RLock fuer Threads plus FileLock neben premium.json fuer mehrere Worker-Prozesse.
+
+    Reihenfolge immer FileLock -> RLock; beide sind reentrant.
+    """
+
+    def __init__(self, path):
+        self.file_lock = FileLock(str(path))
+        self.thread_lock = threading.RLock()
+
+    def __enter__(self):
+        self.file_lock.acquire()
+        try:
+            self.thread_lock.acquire()
+        except BaseException:
+            self.file_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self.thread_lock.release()
+        self.file_lock.release()
+        return False
+
+
+PREMIUM_FILE_LOCK = PremiumFileLock(PREMIUM_FILE.with_name(PREMIUM_FILE.name + ".lock"))
+PREMIUM_JOURNAL_STATE = {
+    "records": 0,
+    "lastFsync": 0.0,
+    "fsyncTimer": None,
+    "compactTimer": None,
+    "pendingSince": None,
+    "compacting": False,
+    "compactions": 0,
+    "tornTail": False,
+}
+
+
+def build_premium_journal_records(changes, meta, current):
+    records = []
+    for state_key, _, _ in PREMIUM_DOCUMENT_COLLECTIONS:
+        section = changes.get(state_key) or {}
+        for doc_id, doc in (section.get("upserts") or {}).items():
+            records.append({"op": "put", "section": state_key, "id": doc_id, "doc": doc})
+        deletes = section.get("deletes")
+        if deletes is None:
+            current_ids = section.get("currentIds") or set()
+            deletes = [doc_id for doc_id in current.get(state_key, {}) if doc_id not in current_ids]
+        for doc_id in deletes:
+            records.append({"op": "del", "section": state_key, "id": doc_id})
+    for field, value in meta.items():
+        records.append({"op": "meta", "field": field, "value": value})
+    return records
+
+
+def apply_premium_journal_record(data, record):
+    op = record.get("op")
+    if op in ("put", "del"):
+        state_key = record.get("section")
+        doc_id = record.get("id")
+        if state_key not in data or not isinstance(doc_id, str):
+            return False
+        if op == "put":
+            if not isinstance(record.get("doc"), dict):
+                return False
+            data[state_key][doc_id] = record["doc"]
+        else:
+            data[state_key].pop(doc_id, None)
+        return True
+    if op == "inc":
+        doc = data.get(record.get("section"), {}).get(record.get("id"))
+        if not isinstance(doc, dict) or not isinstance(record.get("field"), str):
+            return False
+        # Der mitgeschriebene Endstand macht ein erneutes Replay (z. B. nach Abbruch der Kompaktierung) harmlos.
+        doc[record["field"]] = parse_int(record.get("value"), parse_int(doc.get(record["field"]), 0) + parse_int(record.get("by"), 0))
+        return True
+    if op == "meta" and record.get("field") in PREMIUM_META_FIELDS:
+        data[record["field"]] = record.get("value")
+        return True
+    if op == "meta" and record.get("field") in PREMIUM_MIGRATED_META_SECTIONS and isinstance(record.get("value"), dict):
+        # Journal aus der Zeit, als die Section noch ein Meta-Feld war.
+        data[record["field"]] = record["value"]
+        return True
+    return False
+
+
+def replay_premium_journal(data):
+    """Spielt premium.journal auf den Snapshot ein. Eine abgerissene letzte Zeile wird ignoriert."""
+    if not PREMIUM_JOURNAL_FILE.exists():
+        return 0
+    applied = 0
+    try:
+        with open(PREMIUM_JOURNAL_FILE, "r", encoding="utf-8") as handle:
+            for line in handle:
+                # Neue Eintraege duerfen nicht an eine abgerissene Zeile angehaengt werden.
+                PREMIUM_JOURNAL_STATE["tornTail"] = not line.endswith("\n")
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(record, dict) and apply_premium_journal_record(data, record):
+                    applied += 1
+    except Exception:
+        pass
+    return applied
 
-# Seed premium data to MongoDB
-def seed_premium_if_needed():
-    if db is None:
+
+def fsync_path(path):
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
         return
     try:
-        if db.licenses.count_documents({}) == 0 and PREMIUM_FILE.exists():
-            data = ensure_premium_state(json.loads(PREMIUM_FILE.read_text(encoding="utf-8")))
-            if isinstance(data, dict):
-                licenses = data.get("licenses", {})
-                for lic_id, lic in licenses.items():
-                    if isinstance(lic, dict):
-                        lic["_licenseId"] = lic_id
-                        db.licenses.replace_one({"_licenseId": lic_id}, lic, upsert=True)
-                entitlements = data.get("serverEntitlements", {})
-                for srv_id, ent in entitlements.items():
-                    if isinstance(ent, dict):
-                        ent["_serverId"] = srv_id
-                        db.server_entitlements.replace_one({"_serverId": srv_id}, ent, upsert=True)
-                sessions = data.get("processedSessions", {})
-                for sess_id, sess in sessions.items():
-                    if isinstance(sess, dict):
-                        sess["_sessionId"] = sess_id
-                        db.processed_sessions.replace_one({"_sessionId": sess_id}, sess, upsert=True)
-                extra_state = {
-                    "trialClaims": data.get("trialClaims", {}),
-                    "offers": data.get("offers", {}),
-                    "discordBotListState": data.get("discordBotListState", {}),
-                    "recentRedemptions": data.get("recentRedemptions", []),
-                }
-                db.premium_state.replace_one({"_id": "meta"}, {"_id": "meta", **extra_state}, upsert=True)
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def fsync_premium_journal():
+    with PREMIUM_FILE_LOCK:
+        PREMIUM_JOURNAL_STATE["fsyncTimer"] = None
+        PREMIUM_JOURNAL_STATE["lastFsync"] = time.monotonic()
+        fsync_path(PREMIUM_JOURNAL_FILE)
+
+
+def append_premium_journal(records):
+    """Haengt Eintraege an; fsync wird auf hoechstens einen pro PREMIUM_JOURNAL_FSYNC_MS gebuendelt."""
+    payload = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+    with PREMIUM_FILE_LOCK:
+        if PREMIUM_JOURNAL_STATE["tornTail"]:
+            payload = "\n" + payload
+            PREMIUM_JOURNAL_STATE["tornTail"] = False
+        with open(PREMIUM_JOURNAL_FILE, "a", encoding="utf-8") as handle:
+            handle.write(payload)
+            handle.flush()
+        PREMIUM_JOURNAL_STATE["records"] += len(records)
+        interval = PREMIUM_JOURNAL_FSYNC_MS / 1000.0
+        elapsed = time.monotonic() - PREMIUM_JOURNAL_STATE["lastFsync"]
+        if interval <= 0 or elapsed >= interval:
+            fsync_premium_journal()
+        elif PREMIUM_JOURNAL_STATE["fsyncTimer"] is None:
+            timer = threading.Timer(interval - elapsed, fsync_premium_journal)
+            timer.daemon = True
+            PREMIUM_JOURNAL_STATE["fsyncTimer"] = timer
+            timer.start()
+
+
+def compact_premium_journal():
+    """Schreibt Snapshot + Journal als neues premium.json und leert das Journal.
+
+    Laeuft komplett unter dem FileLock, damit kein anderer Worker dazwischen
+    anhaengt oder selbst kompaktiert.
+    """
+    try:
+        with PREMIUM_FILE_LOCK:
+            # Liest auch Eintraege anderer Worker ein (Signatur von premium.json/-.journal).
+            snapshot = load_premium_file_cached()
+            if PREMIUM_JOURNAL_FILE.exists():
+                write_premium_file(snapshot)
+                fsync_path(PREMIUM_FILE)
+                PREMIUM_JOURNAL_FILE.unlink()
+                PREMIUM_JOURNAL_STATE["compactions"] += 1
+            PREMIUM_JOURNAL_STATE["records"] = 0
+            PREMIUM_JOURNAL_STATE["pendingSince"] = None
+            PREMIUM_JOURNAL_STATE["tornTail"] = False
+            PREMIUM_FILE_CACHE["signature"] = premium_file_signature()
     except Exception:
         pass
+    finally:
+        PREMIUM_JOURNAL_STATE["compacting"] = False
 
-seed_premium_if_needed()
 
+def schedule_premium_compaction(force=False):
+    with PREMIUM_FILE_LOCK:
+        if PREMIUM_JOURNAL_STATE["compacting"]:
+            return False
+        if not force and PREMIUM_JOURNAL_STATE["records"] < PREMIUM_JOURNAL_COMPACT_RECORDS:
+            return False
+        PREMIUM_JOURNAL_STATE["compacting"] = True
+    threading.Thread(target=compact_premium_journal, name="premium-journal-compaction", daemon=True).start()
+    return True
 
-# === Premium Helper Functions (MongoDB) ===
 
-def load_premium():
+def compact_premium_journal_when_idle():
+    with PREMIUM_FILE_LOCK:
+        PREMIUM_JOURNAL_STATE["compactTimer"] = None
+    schedule_premium_compaction(force=True)
+
+
+def schedule_premium_idle_compaction():
+    """Nach jedem Write: Kompaktierung bei Leerlauf, spaetestens nach der Maximalverzoegerung."""
+    with PREMIUM_FILE_LOCK:
+        now = time.monotonic()
+        if PREMIUM_JOURNAL_STATE["pendingSince"] is None:
+            PREMIUM_JOURNAL_STATE["pendingSince"] = now
+        overdue = (now - PREMIUM_JOURNAL_STATE["pendingSince"]) * 1000 >= PREMIUM_JOURNAL_COMPACT_MAX_DELAY_MS
+        timer = PREMIUM_JOURNAL_STATE["compactTimer"]
+        if timer is not None:
+            timer.cancel()
+            PREMIUM_JOURNAL_STATE["compactTimer"] = None
+        if not overdue:
+            timer = threading.Timer(PREMIUM_JOURNAL_COMPACT_IDLE_MS / 1000.0, compact_premium_journal_when_idle)
+            timer.daemon = True
+            PREMIUM_JOURNAL_STATE["compactTimer"] = timer
+            timer.start()
+    if overdue:
+        schedule_premium_compaction(force=True)
+
+
+def flush_premium_journal():
+    """Beim Beenden: ausstehendes Journal synchron in premium.json uebernehmen."""
+    if db is not None or not PREMIUM_JOURNAL_FILE.exists():
+        return
+    with PREMIUM_FILE_LOCK:
+        timer = PREMIUM_JOURNAL_STATE["compactTimer"]
+        if timer is not None:
+            timer.cancel()
+            PREMIUM_JOURNAL_STATE["compactTimer"] = None
+        PREMIUM_JOURNAL_STATE["compacting"] = True
+        compact_premium_journal()
+
+
+atexit.register(flush_premium_journal)
+
+
+def commit_premium_journal(records):
+    """Journal-Eintraege anhaengen und auf den In-Memory-Stand anwenden (Datei-Backend)."""
+    with PREMIUM_FILE_LOCK:
+        if not records:
+            record_premium_save(0, "file")
+            return 0
+        current = load_premium_file_cached()
+        append_premium_journal(records)
+        for record in records:
+            apply_premium_journal_record(current, copy.deepcopy(record))
+        PREMIUM_FILE_CACHE["indexes"] = {}
+        PREMIUM_FILE_CACHE["generation"] += 1
+        PREMIUM_FILE_CACHE["signature"] = premium_file_signature()
+        record_premium_save(len(records), "file")
+    if not schedule_premium_compaction():
+        schedule_premium_idle_compaction()
+    return len(records)
+
+
+def save_premium(data):
+    """Schreibt die Aenderungen seit load_premium(). False bei einem Versionskonflikt (siehe mutate_premium)."""
+    safe_data = ensure_premium_state(data)
+    changes, meta = diff_premium_state(data, safe_data)
     if db is not None:
         try:
-            licenses = {}
-            for doc in db.licenses.find({}, {"_id": 0}):
-                lid = doc.pop("_licenseId", None)
-                if lid:
-                    licenses[lid] = doc
-            server_ents = {}
-            for doc in db.server_entitlements.find({}, {"_id": 0}):
-                sid = doc.pop("_serverId", None)
-                if sid:
-                    server_ents[sid] = doc
-            processed = {}
-            for doc in db.processed_sessions.find({}, {"_id": 0}):
-                sess_id = doc.pop("_sessionId", None)
-                if sess_id:
-                    processed[sess_id] = doc
-            meta = db.premium_state.find_one({"_id": "meta"}, {"_id": 0}) or {}
-            return ensure_premium_state({
-                **meta,
-                "licenses": licenses,
-                "serverEntitlements": server_ents,
-                "processedSessions": processed,
-            })
+            documents_written, conflicts = save_premium_to_mongo(changes, meta, getattr(data, "versions", None))
+            record_premium_save(documents_written, "mongo")
+            if conflicts:
+                PREMIUM_PERSISTENCE_METRICS["conflicts"] += conflicts
+                return False
+            if isinstance(data, PremiumState):
+                data.baseline = build_premium_baseline(safe_data)
+            return True
         except Exception:
             pass
-    try:
-        if PREMIUM_FILE.exists():
-            return ensure_premium_state(json.loads(PREMIUM_FILE.read_text(encoding="utf-8")))
-        return empty_premium_state()
-    except Exception:
-        return empty_premium_state()
+
+    with PREMIUM_FILE_LOCK:
+        commit_premium_journal(build_premium_journal_records(changes, meta, load_premium_file_cached()))
+    if isinstance(data, PremiumState):
+        data.baseline = build_premium_baseline(safe_data)
+    return True
 
 
-def save_premium(data):
-    safe_data = ensure_premium_state(data)
+def mutate_premium(mutator, attempts=PREMIUM_MUTATION_ATTEMPTS, scope=None):
+    """Load-Modify-Save mit optimistischer Nebenlaeufigkeit.
+
+    mutator(data) aendert den geladenen State und liefert das Ergebnis. Bei einem
+    Versionskonflikt (anderer Worker war schneller) wird neu geladen und erneut
+    angewendet. Im Datei-Backend serialisiert PREMIUM_FILE_LOCK ueber alle Worker.
+    Mit scope (siehe load_premium) darf mutator nur die dort genannten Dokumente aendern.
+    """
+    for attempt in range(max(1, attempts)):
+        if db is None:
+            with PREMIUM_FILE_LOCK:
+                data = load_premium(scope)
+                result = mutator(data)
+                save_premium(data)
+                return result
+        data = load_premium(scope)
+        result = mutator(data)
+        if save_premium(data):
+            return result
+        time.sleep(random.uniform(0, 0.02 * (attempt + 1)))
+    raise RuntimeError("Premium-Daten wurden parallel geaendert. Bitte erneut versuchen.")
+
+
+# === Premium Repository (point lookups) ===
+# Einzelne Lizenzen/Entitlements werden direkt per Key gelesen. load_premium()
+# bleibt fuer Admin-Listings und Load-Modify-Save-Mutationen.
+
+PREMIUM_FILE_CACHE = {"signature": None, "data": None, "indexes": {}, "generation": 0}
+
+
+def premium_file_signature():
+    signature = []
+    for path in (PREMIUM_FILE, PREMIUM_JOURNAL_FILE):
+        try:
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def load_premium_file_cached():
+    """In-Memory-Stand aus premium.json (Snapshot) plus premium.journal.
+
+    Eigene Schreibvorgaenge aktualisieren den Stand direkt; neu eingelesen wird
+    nur, wenn sich Snapshot oder Journal von aussen geaendert haben.
+    """
+    with PREMIUM_FILE_LOCK:
+        signature = premium_file_signature()
+        if PREMIUM_FILE_CACHE.get("signature") != signature or PREMIUM_FILE_CACHE.get("data") is None:
+            data = empty_premium_state()
+            if PREMIUM_FILE.exists():
+                try:
+                    data = ensure_premium_state(json.loads(PREMIUM_FILE.read_text(encoding="utf-8")))
+                except Exception:
+                    data = empty_premium_state()
+            PREMIUM_JOURNAL_STATE["records"] = replay_premium_journal(data)
+            PREMIUM_FILE_CACHE["signature"] = signature
+            PREMIUM_FILE_CACHE["data"] = data
+            PREMIUM_FILE_CACHE["indexes"] = {}
+            PREMIUM_FILE_CACHE["generation"] += 1
+        return PREMIUM_FILE_CACHE["data"]
+
+
+def premium_file_index(name, builder):
+    """Abgeleiteter Index ueber den gecachten premium.json-Stand (z. B. Key-Hashmap)."""
+    data = load_premium_file_cached()
+    indexes = PREMIUM_FILE_CACHE.setdefault("indexes", {})
+    if name not in indexes:
+        indexes[name] = builder(data)
+    return indexes[name]
+
+
+def build_contact_email_index(data):
+    index = {}
+    for key, lic in data.get("licenses", {}).items():
+        if not isinstance(lic, dict):
+            continue
+        email = license_contact_email(lic)
+        if email:
+            index.setdefault(email, []).append(key)
+    return index
+
+
+def build_license_expiry_index(data):
+    # Parallele, nach Ablauf sortierte Listen fuer bisect; ohne gueltiges expiresAt zaehlt 0.
+    entries = sorted(
+        (license_expiry_epoch(lic) or 0, key)
+        for key, lic in data.get("licenses", {}).items()
+        if isinstance(lic, dict)
+    )
+    return [epoch for epoch, _ in entries], [key for _, key in entries]
+
+
+def build_license_key_index(data):
+    return {
+        normalize_license_key(key): key
+        for key, lic in data.get("licenses", {}).items()
+        if isinstance(lic, dict)
+    }
+
+
+def strip_premium_document(doc):
+    if not isinstance(doc, dict):
+        return None
+    return {key: value for key, value in doc.items() if not str(key).startswith("_")}
+
+
+def premium_repo_find_document(state_key, collection_name, id_field, doc_id):
+    normalized_id = str(doc_id or "").strip()
+    if not normalized_id:
+        return None
     if db is not None:
         try:
-            license_ids = []
-            for lic_id, lic in safe_data.get("licenses", {}).items():
-                if isinstance(lic, dict):
-                    doc = {**lic, "_licenseId": lic_id}
-                    db.licenses.replace_one({"_licenseId": lic_id}, doc, upsert=True)
-                    license_ids.append(lic_id)
-            if license_ids:
-                db.licenses.delete_many({"_licenseId": {"$nin": license_ids}})
-            else:
-                db.licenses.delete_many({})
-
-            server_ids = []
-            for srv_id, ent in safe_data.get("serverEntitlements", {}).items():
-                if isinstance(ent, dict):
-                    doc = {**ent, "_serverId": srv_id}
-                    db.server_entitlements.replace_one({"_serverId": srv_id}, doc, upsert=True)
-                    server_ids.append(srv_id)
-            if server_ids:
-                db.server_entitlements.delete_many({"_serverId": {"$nin": server_ids}})
-            else:
-                db.server_entitlements.delete_many({})
-
-            session_ids = []
-            for sess_id, sess in safe_data.get("processedSessions", {}).items():
-                if isinstance(sess, dict):
-                    doc = {**sess, "_sessionId": sess_id}
-                    db.processed_sessions.replace_one({"_sessionId": sess_id}, doc, upsert=True)
-                    session_ids.append(sess_id)
-            if session_ids:
-                db.processed_sessions.delete_many({"_sessionId": {"$nin": session_ids}})
-            else:
-                db.processed_sessions.delete_many({})
+            return strip_premium_document(db[collection_name].find_one({id_field: normalized_id}, {"_id": 0}))
+        except Exception:
+            pass
+    value = load_premium_file_cached().get(state_key, {}).get(normalized_id)
+    return copy.deepcopy(value) if isinstance(value, dict) else None
+
+
+def premium_repo_find_documents(state_key, collection_name, id_field, doc_ids):
+    normalized_ids = []
+    for doc_id in doc_ids or []:
+        normalized_id = str(doc_id or "").strip()
+        if normalized_id and normalized_id not in normalized_ids:
+            normalized_ids.append(normalized_id)
+    if not normalized_ids:
+        return {}
+    if db is not None:
+        try:
+            found = {}
+            for doc in db[collection_name].find({id_field: {"$in": normalized_ids}}, {"_id": 0}):
+                doc_id = doc.get(id_field)
+                if doc_id:
+                    found[doc_id] = strip_premium_document(doc)
+            return found
+        except Exception:
+            pass
+    section = load_premium_file_cached().get(state_key, {})
+    return {
+        doc_id: copy.deepcopy(section[doc_id])
+        for doc_id in normalized_ids
+        if isinstance(section.get(doc_id), dict)
+    }
 
-            db.premium_state.replace_one(
-                {"_id": "meta"},
-                {
-                    "_id": "meta",
-                    "trialClaims": safe_data.get("trialClaims", {}),
-                    "offers": safe_data.get("offers", {}),
-                    "discordBotListState": safe_data.get("discordBotListState", {}),
-                    "recentRedemptions": safe_data.get("recentRedemptions", []),
-                },
-                upsert=True,
-            )
-            return
+
+def premium_repo_list_documents(state_key, collection_name, id_field):
+    if db is not None:
+        try:
+            return {
+                doc[id_field]: strip_premium_document(doc)
+                for doc in db[collection_name].find({}, {"_id": 0})
+                if doc.get(id_field)
+            }
         except Exception:
             pass
-    tmp_file = PREMIUM_FILE.with_suffix(PREMIUM_FILE.suffix + ".tmp")
-    payload = json.dumps(safe_data, ensure_ascii=False, indent=2) + "\n"
-    try:
-        tmp_file.write_text(payload, encoding="utf-8")
-        tmp_file.replace(PREMIUM_FILE)
-    except Exception:
-        PREMIUM_FILE.write_text(payload, encoding="utf-8")
-    finally:
+    section = load_premium_file_cached().get(state_key, {})
+    return {doc_id: copy.deepcopy(doc) for doc_id, doc in section.items() if isinstance(doc, dict)}
+
+
+def premium_repo_get_offer(code):
+    return premium_repo_find_document("offers", "offers", "_code", code)
+
+
+def premium_repo_get_license(license_key):
+    return premium_repo_find_document("licenses", "licenses", "_licenseId", license_key)
+
+
+def premium_repo_resolve_license_key(license_key):
+    """Case-insensitive Lookup: liefert (gespeicherter Key, Lizenz) oder (None, None)."""
+    key = str(license_key or "").strip()
+    if not key:
+        return None, None
+    lic = premium_repo_get_license(key)
+    if lic:
+        return key, lic
+    normalized = normalize_license_key(key)
+    if db is not None:
         try:
-            if tmp_file.exists():
-                tmp_file.unlink()
+            doc = db.licenses.find_one({"_licenseKeyNorm": normalized}, {"_id": 0})
+            if isinstance(doc, dict) and doc.get("_licenseId"):
+                return doc.get("_licenseId"), strip_premium_document(doc)
+            return None, None
+        except Exception:
+            pass
+    resolved_key = premium_file_index("licenseKeys", build_license_key_index).get(normalized)
+    if not resolved_key:
+        return None, None
+    lic = load_premium_file_cached().get("licenses", {}).get(resolved_key)
+    return (resolved_key, copy.deepcopy(lic)) if isinstance(lic, dict) else (None, None)
+
+
+def premium_repo_get_entitlement(server_id):
+    return premium_repo_find_document("serverEntitlements", "server_entitlements", "_serverId", server_id)
+
+
+def premium_repo_get_processed_session(session_id):
+    return premium_repo_find_document("processedSessions", "processed_sessions", "_sessionId", session_id)
+
+
+def premium_repo_get_trial_claim(email):
+    return premium_repo_find_document("trialClaims", "trial_claims", "_email", str(email or "").strip().lower())
+
+
+def premium_repo_list_licenses_by_email(email):
+    needle = str(email or "").strip().lower()
+    if not needle:
+        return {}
+    if db is not None:
+        try:
+            return {
+                doc.get("_licenseId"): strip_premium_document(doc)
+                for doc in db.licenses.find({"_contactEmail": needle}, {"_id": 0})
+                if doc.get("_licenseId")
+            }
+        except Exception:
+            pass
+    keys = premium_file_index("contactEmails", build_contact_email_index).get(needle, [])
+    return premium_repo_find_documents("licenses", "licenses", "_licenseId", keys)
+
+
+def premium_repo_get_meta_section(section):
+    default_value = empty_premium_state().get(section)
+    if db is not None:
+        try:
+            doc = db.premium_state.find_one({"_id": "meta"}, {"_id": 0, section: 1}) or {}
+            value = doc.get(section)
+            return value if isinstance(value, type(default_value)) else default_value
         except Exception:
             pass
+    value = load_premium_file_cached().get(section)
+    return copy.deepcopy(value) if isinstance(value, type(default_value)) else default_value
 
 
 def list_licenses_by_contact_email(email):
     needle = str(email or "").strip().lower()
     if not needle:
         return []
-    data = load_premium()
-    matches = []
-    for key, lic in data.get("licenses", {}).items():
-        if not isinstance(lic, dict):
-            continue
-        lic_email = str(lic.get("email") or lic.get("contactEmail") or "").strip().lower()
-        if lic_email == needle:
-            matches.append({"licenseKey": key, **lic})
-    return matches
+    return [
+        {"licenseKey": key, **lic}
+        for key, lic in premium_repo_list_licenses_by_email(needle).items()
+        if isinstance(lic, dict)
+    ]
 
 
 def reserve_trial_claim(email, payload=None):
@@ -1320,67 +3635,289 @@ def reserve_trial_claim(email, payload=None):
     if not normalized_email:
         return {"ok": False}
 
-    data = load_premium()
-    claims = data.setdefault("trialClaims", {})
-    if normalized_email in claims:
-        return {"ok": False}
-
-    claims[normalized_email] = {
+    claim = {
         "email": normalized_email,
         "requestedAt": datetime.now(timezone.utc).isoformat(),
         **(payload or {}),
     }
-    save_premium(data)
-    return {"ok": True}
+    if db is not None:
+        try:
+            result = db.trial_claims.update_one(
+                {"_email": normalized_email},
+                {"$setOnInsert": build_premium_document("trialClaims", "_email", normalized_email, claim)},
+                upsert=True,
+            )
+            return {"ok": result.upserted_id is not None}
+        except Exception:
+            pass
+
+    if premium_repo_get_trial_claim(normalized_email):
+        return {"ok": False}
+
+    def apply(data):
+        claims = data.setdefault("trialClaims", {})
+        if normalized_email in claims:
+            return {"ok": False}
+        claims[normalized_email] = claim
+        return {"ok": True}
+
+    return mutate_premium(apply, scope={"trialClaims": [normalized_email]})
 
 
 def release_trial_claim(email):
     normalized_email = str(email or "").strip().lower()
     if not normalized_email:
         return
-    data = load_premium()
-    claims = data.setdefault("trialClaims", {})
-    if normalized_email in claims:
-        claims.pop(normalized_email, None)
-        save_premium(data)
+    if db is not None:
+        try:
+            db.trial_claims.delete_one({"_email": normalized_email})
+            return
+        except Exception:
+            pass
+    if not premium_repo_get_trial_claim(normalized_email):
+        return
+    mutate_premium(
+        lambda data: data.setdefault("trialClaims", {}).pop(normalized_email, None),
+        scope={"trialClaims": [normalized_email]},
+    )
 
 
 def finalize_trial_claim(email, payload=None):
     normalized_email = str(email or "").strip().lower()
     if not normalized_email:
         return
-    data = load_premium()
-    claims = data.setdefault("trialClaims", {})
-    current = claims.get(normalized_email, {})
-    claims[normalized_email] = {
-        **current,
+    updates = {
         **(payload or {}),
         "finalizedAt": datetime.now(timezone.utc).isoformat(),
     }
-    save_premium(data)
+    if db is not None:
+        try:
+            db.trial_claims.update_one(
+                {"_email": normalized_email},
+                {"$set": updates, "$setOnInsert": {"email": normalized_email}},
+                upsert=True,
+            )
+            return
+        except Exception:
+            pass
 
+    def apply(data):
+        claims = data.setdefault("trialClaims", {})
+        current = claims.get(normalized_email, {})
+        claims[normalized_email] = {
+            **current,
+            **updates,
+        }
 
-def list_offers(include_inactive=True):
-    data = load_premium()
-    offers = data.get("offers", {})
-    rows = []
-    for code, offer in offers.items():
-        if not isinstance(offer, dict):
-            continue
-        row = {"code": code, **offer}
-        if not include_inactive and not row.get("active", True):
-            continue
-        rows.append(row)
-    rows.sort(key=lambda item: str(item.get("updatedAt") or item.get("createdAt") or ""), reverse=True)
+    mutate_premium(apply, scope={"trialClaims": [normalized_email]})
+
+
+# === Admin-Listings (Cursor-Paginierung) ===
+# Sortierung absteigend nach (Zeitstempel, ID). Der Cursor kodiert das letzte
+# Paar der Seite; MongoDB filtert per Index, das Datei-Backend per bisect
+# auf vorsortierten Indizes.
+
+ADMIN_LIST_MAX_LIMIT = 500
+COUPONS_FILE_CACHE = {"signature": None, "entries": [], "rows": {}}
+
+
+def encode_list_cursor(sort_value, doc_id):
+    raw = json.dumps([sort_value, doc_id], separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_list_cursor(cursor):
+    value = str(cursor or "").strip()
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        sort_value, doc_id = json.loads(raw.decode("utf-8"))
+        return str(sort_value), str(doc_id)
+    except Exception:
+        raise ValueError("Ungueltiger Cursor.")
+
+
+def normalize_list_date(raw_value, end_of_day=False):
+    """ISO-Datum/Zeitstempel aus Query-Parametern auf das gespeicherte UTC-Format bringen."""
+    value = str(raw_value or "").strip()
+    if not value:
+        return None
+    parsed = parse_iso_datetime(value)
+    if parsed is None:
+        raise ValueError("Ungueltiges Datum: " + clip_text(value, 40))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day and len(value) == 10:
+        parsed = parsed + timedelta(days=1) - timedelta(microseconds=1)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def parse_list_bool(raw_value):
+    value = str(raw_value or "").strip().lower()
+    if value in ("1", "true", "yes"):
+        return True
+    if value in ("0", "false", "no"):
+        return False
+    return None
+
+
+def parse_list_tier(raw_value):
+    value = str(raw_value or "").strip().lower()
+    if not value:
+        return None
+    if value not in ("pro", "ultimate", "none"):
+        raise ValueError("tier muss 'pro', 'ultimate' oder 'none' sein.")
+    # "none" filtert Offers ohne Tier-Bindung.
+    return "" if value == "none" else value
+
+
+def build_sorted_list_index(rows, sort_field):
+    return sorted((str(row.get(sort_field) or ""), doc_id) for doc_id, row in rows.items() if isinstance(row, dict))
+
+
+def page_sorted_list_index(entries, rows, matches, cursor, limit, date_from=None, date_to=None):
+    """Seite aus einem aufsteigend sortierten [(sortWert, id)]-Index, absteigend gelesen."""
+    end = len(entries)
+    if cursor:
+        end = bisect.bisect_left(entries, cursor)
+    if date_to:
+        end = min(end, bisect.bisect_right(entries, (date_to, chr(0x10FFFF))))
+    start = bisect.bisect_left(entries, (date_from, "")) if date_from else 0
+    page = []
+    for position in range(end - 1, start - 1, -1):
+        doc_id = entries[position][1]
+        row = rows.get(doc_id)
+        if isinstance(row, dict) and matches(row):
+            page.append((entries[position], row))
+            if len(page) > limit:
+                break
+    return page
+
+
+def mongo_list_page(collection_name, query, sort_field, id_field, cursor, limit, date_from=None, date_to=None):
+    clauses = [query] if query else []
+    if date_from or date_to:
+        clauses.append({sort_field: {**({"$gte": date_from} if date_from else {}), **({"$lte": date_to} if date_to else {})}})
+    if cursor:
+        clauses.append({"$or": [{sort_field: {"$lt": cursor[0]}}, {sort_field: cursor[0], id_field: {"$lt": cursor[1]}}]})
+    mongo_query = {"$and": clauses} if len(clauses) > 1 else (clauses[0] if clauses else {})
+    docs = db[collection_name].find(mongo_query, {"_id": 0}).sort([(sort_field, -1), (id_field, -1)]).limit(limit + 1)
+    return [((str(doc.get(sort_field) or ""), doc.get(id_field)), strip_premium_document(doc)) for doc in docs if doc.get(id_field)]
+
+
+def finish_list_page(page, limit, build_row):
+    rows = [build_row(key[1], row) for key, row in page[:limit]]
+    next_cursor = encode_list_cursor(*page[limit - 1][0]) if len(page) > limit else None
+    return rows, next_cursor
+
+
+def list_offers(active=None, tier=None, updated_from=None, updated_to=None, cursor=None, limit=ADMIN_LIST_MAX_LIMIT):
+    """Offers nach updatedAt absteigend. Liefert (rows, nextCursor)."""
+    limit = max(1, min(ADMIN_LIST_MAX_LIMIT, int(limit)))
+    position = decode_list_cursor(cursor)
+
+    def build_row(code, offer):
+        return {"code": code, **offer}
+
+    if db is not None:
+        try:
+            query = {}
+            if active is not None:
+                query["active"] = {"$ne": False} if active else False
+            if tier is not None:
+                query["tier"] = tier
+            page = mongo_list_page("offers", query, "updatedAt", "_code", position, limit, updated_from, updated_to)
+            return finish_list_page(page, limit, build_row)
+        except Exception:
+            pass
+
+    def matches(offer):
+        if active is not None and (offer.get("active", True) is not False) != active:
+            return False
+        return tier is None or str(offer.get("tier") or "") == tier
+
+    offers = load_premium_file_cached().get("offers", {})
+    entries = premium_file_index("offersByUpdatedAt", lambda data: build_sorted_list_index(data.get("offers", {}), "updatedAt"))
+    page = page_sorted_list_index(entries, offers, matches, position, limit, updated_from, updated_to)
+    return finish_list_page([(key, copy.deepcopy(row)) for key, row in page], limit, build_row)
+
+
+def load_coupon_redemptions_cached():
+    """Vorsortierter Index ueber coupons.json (Node-Store), neu aufgebaut nur bei Datei-Aenderung."""
+    try:
+        stat = COUPONS_FILE.stat()
+    except OSError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if COUPONS_FILE_CACHE.get("signature") != signature:
+        rows = {}
+        try:
+            payload = json.loads(COUPONS_FILE.read_text(encoding="utf-8"))
+            redemptions = payload.get("redemptions", {}) if isinstance(payload, dict) else {}
+            for session_id, redemption in (redemptions.items() if isinstance(redemptions, dict) else []):
+                if isinstance(redemption, dict):
+                    sid = str(redemption.get("sessionId") or session_id).strip()
+                    rows[sid] = {**redemption, "sessionId": sid}
+        except Exception:
+            return None
+        COUPONS_FILE_CACHE["signature"] = signature
+        COUPONS_FILE_CACHE["rows"] = rows
+        COUPONS_FILE_CACHE["entries"] = build_sorted_list_index(rows, "processedAt")
+    return COUPONS_FILE_CACHE
+
+
+def build_redemption_list_rows(data):
+    rows = {doc_id: row for doc_id, row in data.get("offerRedemptions", {}).items() if isinstance(row, dict)}
+    # Alt-Eintraege aus der Meta-Liste (ohne eigene Collection) mit stabiler ID.
+    for position, row in enumerate(data.get("recentRedemptions", [])):
+        if isinstance(row, dict):
+            sid = str(row.get("sessionId") or f"legacy-{position}")
+            rows.setdefault(sid, {**row, "sessionId": sid})
     return rows
 
 
+def list_recent_redemptions(limit=100, code=None, tier=None, processed_from=None, processed_to=None, cursor=None):
+    """Einloesungen nach processedAt absteigend. Liefert (rows, nextCursor)."""
+    limit = max(1, min(ADMIN_LIST_MAX_LIMIT, int(limit)))
+    position = decode_list_cursor(cursor)
+
+    def build_row(session_id, redemption):
+        return {**redemption, "sessionId": str(redemption.get("sessionId") or session_id)}
+
+    def matches(redemption):
+        if code is not None and sanitize_offer_code(redemption.get("code")) != code:
+            return False
+        return tier is None or str(redemption.get("tier") or "") == tier
+
+    coupons = load_coupon_redemptions_cached()
+    if coupons is not None:
+        page = page_sorted_list_index(coupons["entries"], coupons["rows"], matches, position, limit, processed_from, processed_to)
+        return finish_list_page([(key, dict(row)) for key, row in page], limit, build_row)
+
+    if db is not None:
+        try:
+            query = {}
+            if code is not None:
+                query["code"] = code
+            if tier is not None:
+                query["tier"] = tier
+            page = mongo_list_page("offer_redemptions", query, "processedAt", "_sessionId", position, limit, processed_from, processed_to)
+            return finish_list_page(page, limit, build_row)
+        except Exception:
+            pass
+
+    rows = premium_file_index("redemptionRows", build_redemption_list_rows)
+    entries = premium_file_index("redemptionsByProcessedAt", lambda data: build_sorted_list_index(build_redemption_list_rows(data), "processedAt"))
+    page = page_sorted_list_index(entries, rows, matches, position, limit, processed_from, processed_to)
+    return finish_list_page([(key, copy.deepcopy(row)) for key, row in page], limit, build_row)
+
+
 def get_offer(code):
     normalized = sanitize_offer_code(code)
     if not normalized:
         return None
-    data = load_premium()
-    offer = data.get("offers", {}).get(normalized)
+    offer = premium_repo_get_offer(normalized)
     if not isinstance(offer, dict):
         return None
     return {"code": normalized, **offer}
@@ -1392,78 +3929,149 @@ def upsert_offer(payload, partial=False):
     if not code:
         raise ValueError("code ist erforderlich.")
 
-    data = load_premium()
-    offers = data.setdefault("offers", {})
-    existing = offers.get(code, {}) if isinstance(offers.get(code), dict) else {}
-
-    if partial and not existing:
-        raise ValueError("Code nicht gefunden.")
-
-    discount_percent = parse_int(body.get("discountPercent"), existing.get("discountPercent", 0))
-    discount_percent = max(0, min(100, discount_percent))
-    discount_cents = parse_int(body.get("discountCents"), existing.get("discountCents", 0))
-    discount_cents = max(0, discount_cents)
-    max_uses = parse_int(body.get("maxUses"), existing.get("maxUses", 0))
-    max_uses = max(0, max_uses)
-    uses = parse_int(existing.get("uses", 0), 0)
+    def apply(data):
+        offers = data.setdefault("offers", {})
+        existing = offers.get(code, {}) if isinstance(offers.get(code), dict) else {}
+
+        if partial and not existing:
+            raise ValueError("Code nicht gefunden.")
+
+        discount_percent = parse_int(body.get("discountPercent"), existing.get("discountPercent", 0))
+        discount_percent = max(0, min(100, discount_percent))
+        discount_cents = parse_int(body.get("discountCents"), existing.get("discountCents", 0))
+        discount_cents = max(0, discount_cents)
+        max_uses = parse_int(body.get("maxUses"), existing.get("maxUses", 0))
+        max_uses = max(0, max_uses)
+        uses = parse_int(existing.get("uses", 0), 0)
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        next_offer = {
+            **existing,
+            "label": clip_text(body.get("label", existing.get("label", "")), 120),
+            "description": clip_text(body.get("description", existing.get("description", "")), 400),
+            "active": bool(body.get("active", existing.get("active", True))),
+            "tier": str(body.get("tier", existing.get("tier", ""))).strip().lower(),
+            "discountPercent": discount_percent,
+            "discountCents": discount_cents,
+            "maxUses": max_uses,
+            "uses": uses,
+            "startsAt": str(body.get("startsAt", existing.get("startsAt", ""))).strip() or None,
+            "endsAt": str(body.get("endsAt", existing.get("endsAt", ""))).strip() or None,
+            "createdAt": existing.get("createdAt", now_iso),
+            "createdBy": str(body.get("createdBy", existing.get("createdBy", "api-admin"))).strip() or "api-admin",
+            "updatedAt": now_iso,
+            "updatedBy": str(body.get("updatedBy", existing.get("updatedBy", "api-admin"))).strip() or "api-admin",
+        }
 
-    now_iso = datetime.now(timezone.utc).isoformat()
-    next_offer = {
-        **existing,
-        "label": clip_text(body.get("label", existing.get("label", "")), 120),
-        "description": clip_text(body.get("description", existing.get("description", "")), 400),
-        "active": bool(body.get("active", existing.get("active", True))),
-        "tier": str(body.get("tier", existing.get("tier", ""))).strip().lower(),
-        "discountPercent": discount_percent,
-        "discountCents": discount_cents,
-        "maxUses": max_uses,
-        "uses": uses,
-        "startsAt": str(body.get("startsAt", existing.get("startsAt", ""))).strip() or None,
-        "endsAt": str(body.get("endsAt", existing.get("endsAt", ""))).strip() or None,
-        "createdAt": existing.get("createdAt", now_iso),
-        "createdBy": str(body.get("createdBy", existing.get("createdBy", "api-admin"))).strip() or "api-admin",
-        "updatedAt": now_iso,
-        "updatedBy": str(body.get("updatedBy", existing.get("updatedBy", "api-admin"))).strip() or "api-admin",
-    }
+        if next_offer.get("tier") not in ("", "pro", "ultimate"):
+            raise ValueError("tier muss leer, 'pro' oder 'ultimate' sein.")
+        if next_offer.get("discountPercent", 0) <= 0 and next_offer.get("discountCents", 0) <= 0:
+            raise ValueError("discountPercent oder discountCents muss gesetzt sein.")
 
-    if next_offer.get("tier") not in ("", "pro", "ultimate"):
-        raise ValueError("tier muss leer, 'pro' oder 'ultimate' sein.")
-    if next_offer.get("discountPercent", 0) <= 0 and next_offer.get("discountCents", 0) <= 0:
-        raise ValueError("discountPercent oder discountCents muss gesetzt sein.")
+        offers[code] = next_offer
+        return {"code": code, **next_offer}
 
-    offers[code] = next_offer
-    save_premium(data)
-    return {"code": code, **next_offer}
+    with get_offer_lock(code):
+        return mutate_premium(apply, scope={"offers": [code]})
 
 
 def delete_offer(code):
     normalized = sanitize_offer_code(code)
     if not normalized:
         return False
-    data = load_premium()
-    offers = data.setdefault("offers", {})
-    if normalized not in offers:
-        return False
-    offers.pop(normalized, None)
-    save_premium(data)
-    return True
+    with get_offer_lock(normalized):
+        return mutate_premium(
+            lambda data: data.setdefault("offers", {}).pop(normalized, None) is not None,
+            scope={"offers": [normalized]},
+        )
 
 
 def set_offer_active(code, active=True):
     normalized = sanitize_offer_code(code)
     if not normalized:
         return None
-    data = load_premium()
-    offers = data.setdefault("offers", {})
-    existing = offers.get(normalized)
-    if not isinstance(existing, dict):
-        return None
-    existing["active"] = bool(active)
-    existing["updatedAt"] = datetime.now(timezone.utc).isoformat()
-    existing["updatedBy"] = str(existing.get("updatedBy") or "api-admin")
-    offers[normalized] = existing
-    save_premium(data)
-    return {"code": normalized, **existing}
+
+    def apply(data):
+        offers = data.setdefault("offers", {})
+        existing = offers.get(normalized)
+        if not isinstance(existing, dict):
+            return None
+        existing["active"] = bool(active)
+        existing["updatedAt"] = datetime.now(timezone.utc).isoformat()
+        existing["updatedBy"] = str(existing.get("updatedBy") or "api-admin")
+        offers[normalized] = existing
+        return {"code": normalized, **existing}
+
+    with get_offer_lock(normalized):
+        return mutate_premium(apply, scope={"offers": [normalized]})
+
+
+OFFER_LOCKS = {}
+OFFER_LOCKS_GUARD = threading.Lock()
+
+
+def get_offer_lock(code):
+    # Ein Lock pro Gutschein: Einloesungen verschiedener Codes blockieren sich nicht.
+    with OFFER_LOCKS_GUARD:
+        return OFFER_LOCKS.setdefault(code, threading.Lock())
+
+
+def redeem_offer(code):
+    """Zaehlt eine Einloesung atomar hoch; uses kann maxUses nie ueberschreiten.
+
+    MongoDB: bedingtes $inc im Filter, ohne Versionsvergleich und ohne Laden des
+    Premium-States. Datei-Backend: Lock pro Gutschein innerhalb des Prozesses, dann
+    Lesen, Pruefen und ein einzelner inc-Eintrag im Journal unter PREMIUM_FILE_LOCK,
+    damit auch mehrere Worker maxUses nicht ueberschreiten. Liefert {"ok": True, "offer": ...} oder {"ok": False, "reason": ...}
+    mit reason "not_found", "inactive" oder "exhausted".
+    """
+    normalized = sanitize_offer_code(code)
+    if not normalized:
+        return {"ok": False, "reason": "not_found"}
+    if db is not None:
+        try:
+            offer = db.offers.find_one_and_update(
+                {
+                    "_code": normalized,
+                    "active": {"$ne": False},
+                    "$expr": {
+                        "$or": [
+                            {"$lte": [{"$ifNull": ["$maxUses", 0]}, 0]},
+                            {"$lt": [{"$ifNull": ["$uses", 0]}, "$maxUses"]},
+                        ]
+                    },
+                },
+                {"$inc": {"uses": 1, "_version": 1}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if offer is not None:
+                return {"ok": True, "offer": {"code": normalized, **strip_premium_document(offer)}}
+            return {"ok": False, "reason": offer_rejection_reason(premium_repo_get_offer(normalized))}
+        except Exception:
+            pass
+
+    with get_offer_lock(normalized), PREMIUM_FILE_LOCK:
+        offer = copy.deepcopy(load_premium_file_cached().get("offers", {}).get(normalized))
+        reason = offer_rejection_reason(offer)
+        if reason:
+            return {"ok": False, "reason": reason}
+        offer["uses"] = max(0, parse_int(offer.get("uses"), 0)) + 1
+        # Nur das Zaehlerfeld: eine parallele Aenderung am restlichen Angebot bleibt erhalten.
+        commit_premium_journal([
+            {"op": "inc", "section": "offers", "id": normalized, "field": "uses", "by": 1, "value": offer["uses"]}
+        ])
+        return {"ok": True, "offer": {"code": normalized, **offer}}
+
+
+def offer_rejection_reason(offer):
+    if not isinstance(offer, dict):
+        return "not_found"
+    if offer.get("active") is False:
+        return "inactive"
+    max_uses = max(0, parse_int(offer.get("maxUses"), 0))
+    if max_uses > 0 and max(0, parse_int(offer.get("uses"), 0)) >= max_uses:
+        return "exhausted"
+    return None
 
 
 def parse_iso_datetime(raw_value):
@@ -1556,8 +4164,7 @@ def get_discordbotlist_status(vote_limit=20):
     configured = (os.environ.get("DISCORDBOTLIST_ENABLED") or ("1" if token else "0")).strip() != "0" and bool(token) and bool(re.match(r"^\d{17,22}$", bot_id))
     stats_scope = "aggregate" if (os.environ.get("DISCORDBOTLIST_STATS_SCOPE") or "commander").strip().lower() == "aggregate" else "commander"
 
-    data = load_premium()
-    state = data.get("discordBotListState", {}) if isinstance(data.get("discordBotListState"), dict) else {}
+    state = premium_repo_get_meta_section("discordBotListState")
     recent_votes = state.get("votes", {}).get("recent", []) if isinstance(state.get("votes"), dict) else []
     if not isinstance(recent_votes, list):
         recent_votes = []
@@ -1581,68 +4188,119 @@ def get_processed_session(session_id):
     sid = str(session_id or "").strip()
     if not sid:
         return None
-    data = load_premium()
-    return data.get("processedSessions", {}).get(sid)
+    return premium_repo_get_processed_session(sid)
 
 
 def mark_processed_session(session_id, payload):
     sid = str(session_id or "").strip()
     if not sid:
         return
-    data = load_premium()
-    data.setdefault("processedSessions", {})[sid] = {
+    entry = {
         **(payload or {}),
         "processedAt": datetime.now(timezone.utc).isoformat(),
     }
+    if db is not None:
+        try:
+            # Ablauf ueber den TTL-Index auf _processedAt, Eindeutigkeit ueber _sessionId.
+            db.processed_sessions.update_one(
+                {"_sessionId": sid},
+                {"$setOnInsert": build_premium_document("processedSessions", "_sessionId", sid, entry)},
+                upsert=True,
+            )
+            return
+        except Exception:
+            pass
 
-    # Keep processedSessions bounded.
-    processed = data.get("processedSessions", {})
-    if len(processed) > 5000:
-        ordered = sorted(
-            processed.items(),
-            key=lambda entry: str(entry[1].get("processedAt", "")),
-            reverse=True,
-        )
-        data["processedSessions"] = dict(ordered[:5000])
-
-    save_premium(data)
+    # Datei-Backend: nur der neue Eintrag und die verdraengten Eintraege gehen ins Journal.
+    # Die aeltesten Eintraege (nach processedAt) fallen raus; die Reihenfolge im Dict
+    # ist nicht verlaesslich (Altbestand absteigend, Journal-Replay).
+    with PREMIUM_FILE_LOCK:
+        processed = load_premium_file_cached().get("processedSessions", {})
+        records = [{"op": "put", "section": "processedSessions", "id": sid, "doc": entry}]
+        excess = len(processed) + (0 if sid in processed else 1) - PROCESSED_SESSION_MAX_ENTRIES
+        if excess > 0:
+            oldest = heapq.nsmallest(
+                excess,
+                (item for item in processed.items() if item[0] != sid),
+                key=lambda item: str((item[1] or {}).get("processedAt", "")),
+            )
+            records.extend({"op": "del", "section": "processedSessions", "id": old_sid} for old_sid, _ in oldest)
+        commit_premium_journal(records)
 
 
 def is_expired(license_info):
-    if not license_info or not license_info.get("expiresAt"):
+    expires_epoch = license_expiry_epoch(license_info)
+    if expires_epoch is None:
         return True
-    return datetime.fromisoformat(license_info["expiresAt"].replace("Z", "+00:00")) <= datetime.now(timezone.utc)
+    return expires_epoch <= int(time.time())
 
 
 def remaining_days(license_info):
-    if not license_info or not license_info.get("expiresAt"):
+    expires_epoch = license_expiry_epoch(license_info)
+    if expires_epoch is None:
         return 0
-    diff = datetime.fromisoformat(license_info["expiresAt"].replace("Z", "+00:00")) - datetime.now(timezone.utc)
-    return max(0, int(diff.total_seconds() / 86400) + 1)
+    return max(0, int((expires_epoch - int(time.time())) / 86400) + 1)
+
+
+def list_licenses_by_expiry(expired=False, within_days=7, limit=100):
+    """Abgelaufene bzw. in den naechsten within_days ablaufende Lizenzen ueber den Ablauf-Index."""
+    now = int(time.time())
+    limit = max(1, min(500, int(limit)))
+    if expired:
+        lower, upper = None, now
+    else:
+        lower, upper = now, now + max(1, int(within_days)) * 86400
+
+    rows = []
+    if db is not None:
+        try:
+            query = {"$lte": upper} if lower is None else {"$gt": lower, "$lte": upper}
+            cursor = (
+                db.licenses.find({"_expiresAtEpoch": query}, {"_id": 0})
+                .sort("_expiresAtEpoch", -1 if expired else 1)
+                .limit(limit)
+            )
+            for doc in cursor:
+                if doc.get("_licenseId"):
+                    rows.append((doc["_licenseId"], strip_premium_document(doc)))
+        except Exception:
+            rows = None
+    if db is None or rows is None:
+        epochs, keys = premium_file_index("licenseExpiry", build_license_expiry_index)
+        start = 0 if lower is None else bisect.bisect_right(epochs, lower)
+        end = bisect.bisect_right(epochs, upper)
+        selected = keys[start:end]
+        selected = selected[::-1][:limit] if expired else selected[:limit]
+        licenses = load_premium_file_cached().get("licenses", {})
+        rows = [(key, copy.deepcopy(licenses.get(key))) for key in selected if isinstance(licenses.get(key), dict)]
+
+    result = []
+    for key, lic in rows:
+        entry = {**lic, "expired": is_expired(lic), "remainingDays": remaining_days(lic)}
+        result.append({"licenseKey": key, **sanitize_license_for_api(entry, include_sensitive=True)})
+    return result
 
 
 def get_server_license(server_id):
     """Get license for a server - supports both old and new format"""
-    data = load_premium()
     sid = str(server_id)
 
     # New format: serverEntitlements -> licenseId -> licenses
-    if "serverEntitlements" in data:
-        ent = data.get("serverEntitlements", {}).get(sid)
-        if ent:
-            lic = data.get("licenses", {}).get(ent.get("licenseId", ""))
-            if lic:
-                expired = is_expired(lic)
-                return {
-                    **lic,
-                    "expired": expired,
-                    "remainingDays": remaining_days(lic),
-                    "activeTier": "free" if expired else lic.get("plan", "free"),
-                    "tier": lic.get("plan", "free"),
-                }
+    ent = premium_repo_get_entitlement(sid)
+    if ent:
+        lic = premium_repo_get_license(ent.get("licenseId", ""))
+        if lic:
+            expired = is_expired(lic)
+            return {
+                **lic,
+                "expired": expired,
+                "remainingDays": remaining_days(lic),
+                "activeTier": "free" if expired else lic.get("plan", "free"),
+                "tier": lic.get("plan", "free"),
+            }
 
     # Old format: licenses keyed by serverId
-    lic = data.get("licenses", {}).get(sid)
+    lic = premium_repo_get_license(sid)
     if not lic:
         return None
     expired = is_expired(lic)
@@ -1655,12 +4313,47 @@ def get_server_license(server_id):
     }
 
 
+def get_server_license_version(server_id):
+    """Version der Lizenzdaten einer Guild fuer das ETag von /api/dashboard/license.
+
+    Laedt die Lizenz nicht: MongoDB liefert nur _version und Ablauf per Projektion, das
+    Datei-Backend die Generation des gecachten Premium-Stands (jeder Write erhoeht sie).
+    Dazu kommen Resttage und Ablauf-Flag, die sich ohne Write mit der Zeit aendern.
+    """
+    sid = str(server_id or "").strip()
+    expires_epoch = None
+    version = None
+    if db is not None:
+        try:
+            ent = db.server_entitlements.find_one({"_serverId": sid}, {"_id": 0, "licenseId": 1, "_version": 1}) or {}
+            lic = None
+            if ent.get("licenseId"):
+                lic = db.licenses.find_one({"_licenseId": ent.get("licenseId")}, {"_id": 0, "_version": 1, "_expiresAtEpoch": 1})
+            if lic is None:
+                lic = db.licenses.find_one({"_licenseId": sid}, {"_id": 0, "_version": 1, "_expiresAtEpoch": 1}) or {}
+            version = f"{parse_int(ent.get('_version'), 0)}-{parse_int(lic.get('_version'), 0)}"
+            expires_epoch = parse_int(lic.get("_expiresAtEpoch"), 0) if lic else None
+        except Exception:
+            version = None
+    if version is None:
+        data = load_premium_file_cached()
+        ent = data.get("serverEntitlements", {}).get(sid) or {}
+        licenses = data.get("licenses", {})
+        lic = licenses.get(str(ent.get("licenseId") or "")) or licenses.get(sid)
+        version = f"g{PREMIUM_FILE_CACHE['generation']}"
+        expires_epoch = (license_expiry_epoch(lic) or 0) if isinstance(lic, dict) else None
+    if expires_epoch is None:
+        return f"{version}-none"
+    now = int(time.time())
+    remaining = max(0, int((expires_epoch - now) / 86400) + 1) if expires_epoch else 0
+    return f"{version}-{remaining}{'x' if expires_epoch <= now else ''}"
+
+
 def get_license_by_key(license_key):
     key = str(license_key or "").strip()
     if not key:
         return None
-    data = load_premium()
-    lic = data.get("licenses", {}).get(key)
+    lic = premium_repo_get_license(key)
     if not lic:
         return None
     expired = is_expired(lic)
@@ -1674,24 +4367,47 @@ def get_license_by_key(license_key):
     }
 
 
+def get_tiers_for_servers(server_ids):
+    """Resolve active tiers for many servers with one lookup per collection."""
+    normalized_ids = []
+    for server_id in server_ids or []:
+        sid = str(server_id or "").strip()
+        if sid and sid not in normalized_ids:
+            normalized_ids.append(sid)
+    if not normalized_ids:
+        return {}
+
+    entitlements = premium_repo_find_documents("serverEntitlements", "server_entitlements", "_serverId", normalized_ids)
+    license_ids = [str(ent.get("licenseId") or "").strip() for ent in entitlements.values()]
+    licenses = premium_repo_find_documents("licenses", "licenses", "_licenseId", license_ids + normalized_ids)
+
+    tiers = {}
+    for sid in normalized_ids:
+        ent = entitlements.get(sid)
+        lic = licenses.get(str(ent.get("licenseId") or "").strip()) if ent else None
+        if lic:
+            tier = lic.get("plan", "free")
+        else:
+            # Old format: licenses keyed by serverId
+            lic = licenses.get(sid)
+            tier = lic.get("tier", lic.get("plan", "free")) if lic else "free"
+        if not lic or is_expired(lic):
+            tiers[sid] = "free"
+        else:
+            tiers[sid] = tier if tier in TIERS else "free"
+    return tiers
+
+
 def get_tier(server_id):
-    lic = get_server_license(server_id)
-    if not lic or lic.get("expired"):
-        return "free"
-    tier = lic.get("tier", lic.get("plan", "free"))
-    return tier if tier in TIERS else "free"
+    sid = str(server_id or "").strip()
+    return get_tiers_for_servers([sid]).get(sid, "free")
 
 
 def get_dashboard_guild_stats(server_id, tier):
-    dashboard_data = load_dashboard_data()
-    events_map = dashboard_data.get("events", {}) if isinstance(dashboard_data.get("events"), dict) else {}
-    perms_map = dashboard_data.get("perms", {}) if isinstance(dashboard_data.get("perms"), dict) else {}
-    telemetry_map = dashboard_data.get("telemetry", {}) if isinstance(dashboard_data.get("telemetry"), dict) else {}
-
-    guild_events = events_map.get(server_id, []) if isinstance(events_map.get(server_id), list) else []
-    guild_perms = perms_map.get(server_id, {}) if isinstance(perms_map.get(server_id), dict) else {}
-    telemetry_raw = telemetry_map.get(server_id, {}) if isinstance(telemetry_map.get(server_id), dict) else {}
-    telemetry = normalize_dashboard_telemetry(telemetry_raw)
+    guild_events, command_role_map, telemetry = dashboard_repo_stats_source(server_id, advanced=(tier == "ultimate"))
+    # Telemetrie wird beim Schreiben normalisiert; nur fuer Guilds ohne Daten Defaults bauen.
+    if not telemetry:
+        telemetry = normalize_dashboard_telemetry({})
 
     active_events = len([item for item in guild_events if isinstance(item, dict) and item.get("enabled") is not False])
     basic = {
@@ -1702,7 +4418,7 @@ def get_dashboard_guild_stats(server_id, tier):
         "topStation": telemetry.get("topStation", {"name": "-", "listeners": 0}),
         "eventsConfigured": len(guild_events),
         "eventsActive": active_events,
-        "permRules": len((guild_perms.get("commandRoleMap") or {}).keys()) if isinstance(guild_perms.get("commandRoleMap"), dict) else 0,
+        "permRules": len(command_role_map) if isinstance(command_role_map, dict) else 0,
         "updatedAt": telemetry.get("updatedAt") or datetime.now(timezone.utc).isoformat(),
     }
 
@@ -1787,15 +4503,8 @@ def add_license(email, tier, months, seats=1, activated_by="stripe", note=""):
     seats = max(1, min(5, int(seats) if isinstance(seats, (int, float)) else 1))
     if months < 1:
         raise ValueError("Mindestens 1 Monat.")
-    data = load_premium()
     now = datetime.now(timezone.utc)
-
-    license_key = generate_license_key()
-    # Sicherstellen dass der Key eindeutig ist
-    while license_key in data.get("licenses", {}):
-        license_key = generate_license_key()
-
-    data.setdefault("licenses", {})[license_key] = {
+    license_info = {
         "tier": tier,
         "plan": tier,
         "seats": seats,
@@ -1807,25 +4516,62 @@ def add_license(email, tier, months, seats=1, activated_by="stripe", note=""):
         "activatedBy": activated_by,
         "note": note,
     }
-    save_premium(data)
-    return {**data["licenses"][license_key], "licenseKey": license_key}
+
+    if db is not None:
+        license_key = None
+        try:
+            # Anlegen per $setOnInsert: ein vorhandenes Dokument bedeutet Key-Kollision, dann neuer Key.
+            for _ in range(PREMIUM_MUTATION_ATTEMPTS):
+                candidate = generate_license_key()
+                document = build_premium_document("licenses", "_licenseId", candidate, license_info)
+                document["_version"] = 1
+                try:
+                    previous = db.licenses.find_one_and_update(
+                        {"_licenseId": candidate},
+                        {"$setOnInsert": document},
+                        projection={"_id": 1},
+                        upsert=True,
+                    )
+                except DuplicateKeyError:
+                    continue
+                if previous is None:
+                    license_key = candidate
+                    break
+        except Exception:
+            license_key = None
+        if license_key is not None:
+            record_premium_save(1, "mongo")
+            return {**license_info, "licenseKey": license_key}
+
+    def apply(data):
+        licenses = data.setdefault("licenses", {})
+        license_key = generate_license_key()
+        # Sicherstellen dass der Key eindeutig ist
+        while license_key in licenses:
+            license_key = generate_license_key()
+        licenses[license_key] = dict(license_info)
+        return {**license_info, "licenseKey": license_key}
+
+    return mutate_premium(apply)
 
 
 def upgrade_license(server_id, new_tier):
-    data = load_premium()
     sid = str(server_id)
-    lic = data.get("licenses", {}).get(sid)
-    if not lic or is_expired(lic):
-        raise ValueError("Keine aktive Lizenz zum Upgraden.")
-    data["licenses"][sid] = {
-        **lic,
-        "tier": new_tier,
-        "plan": new_tier,
-        "upgradedAt": datetime.now(timezone.utc).isoformat(),
-        "upgradedFrom": lic.get("tier"),
-    }
-    save_premium(data)
-    return data["licenses"][sid]
+
+    def apply(data):
+        lic = data.get("licenses", {}).get(sid)
+        if not lic or is_expired(lic):
+            raise ValueError("Keine aktive Lizenz zum Upgraden.")
+        data["licenses"][sid] = {
+            **lic,
+            "tier": new_tier,
+            "plan": new_tier,
+            "upgradedAt": datetime.now(timezone.utc).isoformat(),
+            "upgradedFrom": lic.get("tier"),
+        }
+        return data["licenses"][sid]
+
+    return mutate_premium(apply, scope={"licenses": [sid]})
 
 
 def sanitize_license_for_api(license_info, include_sensitive=False):
@@ -1855,6 +4601,28 @@ def sanitize_license_for_api(license_info, include_sensitive=False):
     return payload
 
 
+def bootstrap_mongo(create_indexes=True):
+    """Startup-Migrationen (Seed aus premium.json + Journal, Layout, abgeleitete Felder), danach Index-Provisionierung."""
+    if db is None:
+        return []
+    migrations = (
+        seed_premium_if_needed,
+        migrate_premium_meta_sections,
+        backfill_premium_derived_fields,
+        migrate_dashboard_state,
+        ensure_telemetry_series_collection,
+    )
+    for migration in migrations:
+        try:
+            migration()
+        except Exception:
+            pass
+    return ensure_mongo_indexes() if create_indexes else []
+
+
+bootstrap_mongo(create_indexes=(os.environ.get("MONGO_AUTO_INDEXES") or "1").strip() != "0")
+
+
 # === API Routes ===
 
 @app.get("/api/health")
@@ -1862,6 +4630,71 @@ async def health():
     return {"ok": True, "status": "online", "brand": "OmniFM", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
+def build_metrics_text():
+    lines = []
+
+    def push(name, help_text, metric_type, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            label_str = ",".join(f'{key}="{value_text}"' for key, value_text in labels.items())
+            lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+    backend_labels = {"backend": PREMIUM_PERSISTENCE_METRICS.get("backend", "file")}
+    push(
+        "omnifm_premium_saves_total",
+        "Premium saves that wrote at least one document",
+        "counter",
+        [(backend_labels, PREMIUM_PERSISTENCE_METRICS.get("saves", 0))],
+    )
+    push(
+        "omnifm_premium_saves_skipped_total",
+        "Premium saves without any changed document",
+        "counter",
+        [(backend_labels, PREMIUM_PERSISTENCE_METRICS.get("skippedSaves", 0))],
+    )
+    push(
+        "omnifm_premium_documents_written_total",
+        "Premium documents written by save_premium",
+        "counter",
+        [(backend_labels, PREMIUM_PERSISTENCE_METRICS.get("documentsWritten", 0))],
+    )
+    push(
+        "omnifm_premium_documents_written_last",
+        "Premium documents written by the most recent save",
+        "gauge",
+        [(backend_labels, PREMIUM_PERSISTENCE_METRICS.get("lastDocumentsWritten", 0))],
+    )
+    push(
+        "omnifm_premium_save_conflicts_total",
+        "Premium documents rejected by a version check and retried",
+        "counter",
+        [(backend_labels, PREMIUM_PERSISTENCE_METRICS.get("conflicts", 0))],
+    )
+    push(
+        "omnifm_premium_journal_records",
+        "Records in premium.journal not yet compacted into premium.json",
+        "gauge",
+        [({}, PREMIUM_JOURNAL_STATE.get("records", 0))],
+    )
+    push(
+        "omnifm_premium_journal_compactions_total",
+        "Background compactions of premium.journal into premium.json",
+        "counter",
+        [({}, PREMIUM_JOURNAL_STATE.get("compactions", 0))],
+    )
+    return "\n".join(lines) + "\n"
+
+
+@app.get("/api/metrics")
+async def get_metrics(request: Request):
+    if not METRICS_ENABLED:
+        return json_error(404, "Metrics sind deaktiviert.")
+    if not is_metrics_request_authorized(request):
+        return json_error(401, "Unauthorized. Metrics token required.")
+    return PlainTextResponse(build_metrics_text(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/bots")
 async def get_bots():
     bots = []
@@ -2170,60 +5003,611 @@ async def auth_discord_callback(request: Request, code: str = "", state: str = "
     return response
 
 
-@app.get("/api/auth/session")
-async def auth_session(request: Request):
-    rate_limited = enforce_api_rate_limit(request, "read")
-    if rate_limited is not None:
-        return rate_limited
+@app.get("/api/auth/session")
+async def auth_session(request: Request):
+    rate_limited = enforce_api_rate_limit(request, "read")
+    if rate_limited is not None:
+        return rate_limited
+
+    session, _ = get_dashboard_session(request)
+    if not session:
+        return {
+            "authenticated": False,
+            "oauthConfigured": is_discord_oauth_configured(),
+            "user": None,
+            "guilds": [],
+        }
+
+    guilds = resolve_dashboard_guilds_for_session(session)
+    return {
+        "authenticated": True,
+        "oauthConfigured": is_discord_oauth_configured(),
+        "user": session.get("user", {}),
+        "guilds": guilds,
+        "expiresAt": session.get("expiresAt"),
+    }
+
+
+@app.post("/api/auth/logout")
+async def auth_logout(request: Request):
+    rate_limited = enforce_api_rate_limit(request, "write")
+    if rate_limited is not None:
+        return rate_limited
+
+    _, token = get_dashboard_session(request)
+    if token:
+        DASHBOARD_SESSION_STORE.pop(token, None)
+
+    response = JSONResponse(status_code=200, content={"success": True})
+    response.delete_cookie(SESSION_COOKIE_NAME, path="/")
+    return response
+
+
+@app.get("/api/dashboard/guilds")
+async def dashboard_guilds(request: Request):
+    rate_limited = enforce_api_rate_limit(request, "read")
+    if rate_limited is not None:
+        return rate_limited
+    session, _ = get_dashboard_session(request)
+    if not session:
+        return json_error(401, "Nicht eingeloggt.")
+    return {"guilds": resolve_dashboard_guilds_for_session(session)}
+
+
+@app.get("/api/dashboard/stats")
+async def dashboard_stats(request: Request, serverId: str = ""):
+    rate_limited = enforce_api_rate_limit(request, "read")
+    if rate_limited is not None:
+        return rate_limited
+
+    session, _ = get_dashboard_session(request)
+    if not session:
+        return json_error(401, "Nicht eingeloggt.")
+
+    guild = resolve_session_guild_for_server(session, serverId)
+    if not guild:
+        return json_error(403, "Kein Zugriff auf diesen Server.")
+
+    tier = guild.get("tier", "free")
+    if TIER_RANK.get(tier, 0) < TIER_RANK.get("pro", 1):
+        return json_error(403, "Dashboard ist erst ab Pro verfuegbar.")
+
+    def build_payload():
+        stats_payload = get_dashboard_guild_stats(guild.get("id"), tier)
+        return {
+            "serverId": guild.get("id"),
+            "tier": tier,
+            "basic": stats_payload.get("basic", {}),
+            "advanced": stats_payload.get("advanced") if tier == "ultimate" else None,
+        }
+
+    etag = dashboard_etag("stats", get_dashboard_version(guild.get("id"), "stats"), tier)
+    return dashboard_conditional_response(request, etag, build_payload)
+
+
+# === Stats-Ingestion ===
+# Die Bots melden Session-Start/-Ende, Listener-Snapshots und Commands gebuendelt.
+# Pro Batch entsteht je Guild genau ein $inc/$max-Update auf guild_stats und je
+# Guild+Tag eins auf daily_stats, damit Dashboard-Reads nie Roh-Sessions aggregieren.
+# Zeit-Buckets (hours, daysOfWeek, date) in lokaler Serverzeit wie im Node-Store
+# (getHours/getDay). Jeder Batch traegt eine batchId: Roh-Dokumente bekommen daraus
+# feste _ids, Zaehler-Updates greifen nur, wenn die batchId noch nicht in
+# _ingestBatches des Dokuments steht. Ein Retry nach Teilerfolg zaehlt so nichts doppelt.
+
+STATS_INGEST_BATCH_MAX = 5000
+STATS_INGEST_TYPES = ("sessionStart", "sessionEnd", "snapshot", "command")
+STATS_INGEST_BATCH_ID_REGEX = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+STATS_INGEST_APPLIED_BATCHES = 50
+STATS_INGEST_BATCH_RETENTION_SECONDS = 7 * 86400
+
+
+def parse_stats_ingest_time(raw_value, default):
+    if isinstance(raw_value, bool):
+        return default
+    if isinstance(raw_value, (int, float)):
+        if raw_value <= 0:
+            return default
+        try:
+            return datetime.fromtimestamp(raw_value / 1000, timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return default
+    parsed = parse_iso_datetime(raw_value)
+    if parsed is None:
+        return default
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def stats_local_time(at):
+    """Lokale Serverzeit wie Date.getHours()/getDay() im Node-Store."""
+    return at.astimezone()
+
+
+def stats_bucket_key(raw_value, max_len=120):
+    """Map-Key fuer guild_stats; Punkte und fuehrende $ wuerden in MongoDB als Pfad/Operator gelesen."""
+    value = str(raw_value or "").strip()[:max_len]
+    return value.replace(".", "_").lstrip("$")
+
+
+def stats_count(raw_value):
+    try:
+        return max(0, int(float(raw_value or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def stats_listener_average(raw_value):
+    try:
+        return max(0, round(float(raw_value or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def new_stats_ingest_update():
+    return {"inc": {}, "max": {}, "min": {}, "set": {}}
+
+
+def stats_ingest_inc(update, field, amount=1):
+    update["inc"][field] = update["inc"].get(field, 0) + amount
+
+
+def stats_ingest_max(update, field, value):
+    if field not in update["max"] or value > update["max"][field]:
+        update["max"][field] = value
+
+
+def aggregate_stats_ingest_events(events, now=None, batch_id="", skip_guilds=()):
+    """Events -> (guild_updates, daily_updates, sessions, snapshots, results) ohne DB-Zugriff.
+
+    Mit batch_id bekommen Sessions und Snapshots die _id "<batch_id>:<index>".
+    Events fuer Guilds in skip_guilds (laufender Stats-Reset) werden abgelehnt.
+    """
+    now = now or datetime.now(timezone.utc)
+    guild_updates = {}
+    daily_updates = {}
+    sessions = []
+    snapshots = []
+    results = []
+
+    def daily(guild_id, at):
+        key = (guild_id, stats_local_time(at).strftime("%Y-%m-%d"))
+        if key not in daily_updates:
+            update = new_stats_ingest_update()
+            update["inc"].update({"totalStarts": 0, "totalListeningMs": 0, "totalSessions": 0})
+            update["max"]["peakListeners"] = 0
+            daily_updates[key] = update
+        return daily_updates[key]
+
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            results.append({"index": index, "error": "ungueltiger Eintrag"})
+            continue
+        event_type = str(event.get("type") or "").strip()
+        if event_type not in STATS_INGEST_TYPES:
+            results.append({"index": index, "error": "unbekannter type"})
+            continue
+        guild_id = str(event.get("serverId") or "").strip()
+        if not is_valid_server_id(guild_id):
+            results.append({"index": index, "error": "ungueltige serverId"})
+            continue
+        if guild_id in skip_guilds:
+            results.append({"index": index, "error": "Stats-Reset fuer diese Guild laeuft"})
+            continue
+        command = stats_bucket_key(str(event.get("command") or "").lower(), 80)
+        if event_type == "command" and not command:
+            results.append({"index": index, "error": "command fehlt"})
+            continue
+        guild = guild_updates.setdefault(guild_id, new_stats_ingest_update())
+
+        if event_type == "sessionStart":
+            at = parse_stats_ingest_time(event.get("timestamp"), now)
+            at_ms = int(at.timestamp() * 1000)
+            listeners = stats_count(event.get("listeners"))
+            station_key = str(event.get("stationKey") or "").strip()[:120]
+            station_name = str(event.get("stationName") or "").strip()[:120]
+            stats_ingest_inc(guild, "totalStarts")
+            stats_ingest_inc(guild, f"stationStarts.{stats_bucket_key(station_name or station_key) or 'unknown'}")
+            channel_key = stats_bucket_key(event.get("channelId"), 40)
+            if channel_key:
+                stats_ingest_inc(guild, f"voiceChannels.{channel_key}")
+            local = stats_local_time(at)
+            stats_ingest_inc(guild, f"hours.{local.hour}")
+            # Wie Date.getDay(): 0 = Sonntag.
+            stats_ingest_inc(guild, f"daysOfWeek.{(local.weekday() + 1) % 7}")
+            stats_ingest_max(guild, "peakListeners", listeners)
+            stats_ingest_max(guild, "lastStartedAt", at_ms)
+            first_seen = guild["min"].get("firstSeenAt")
+            guild["min"]["firstSeenAt"] = at_ms if first_seen is None else min(first_seen, at_ms)
+            if station_key and station_name and stats_bucket_key(station_key):
+                guild["set"][f"stationNames.{stats_bucket_key(station_key)}"] = station_name
+            day = daily(guild_id, at)
+            stats_ingest_inc(day, "totalStarts")
+            stats_ingest_max(day, "peakListeners", listeners)
+
+        elif event_type == "sessionEnd":
+            ended = parse_stats_ingest_time(event.get("endedAt"), now)
+            started = parse_stats_ingest_time(event.get("startedAt"), ended)
+            if started > ended:
+                started = ended
+            duration_ms = stats_count(event.get("durationMs")) or int((ended - started).total_seconds() * 1000)
+            human_ms = stats_count(event.get("humanListeningMs")) if "humanListeningMs" in event else duration_ms
+            peak = stats_count(event.get("peakListeners"))
+            station_key = str(event.get("stationKey") or "").strip()[:120]
+            sessions.append({
+                **({"_id": f"{batch_id}:{index}"} if batch_id else {}),
+                "guildId": guild_id,
+                "botId": str(event.get("botId") or "").strip()[:80],
+                "stationKey": station_key,
+                "stationName": str(event.get("stationName") or "").strip()[:120],
+                "channelId": str(event.get("channelId") or "").strip()[:40],
+                "startedAt": format_mongo_datetime(started),
+                "endedAt": format_mongo_datetime(ended),
+                "durationMs": duration_ms,
+                "humanListeningMs": human_ms,
+                "peakListeners": peak,
+                "avgListeners": stats_listener_average(event.get("avgListeners")),
+            })
+            stats_ingest_inc(guild, "totalListeningMs", human_ms)
+            stats_ingest_inc(guild, "totalSessions")
+            stats_ingest_inc(guild, "totalStops")
+            if human_ms > 0:
+                stats_ingest_inc(guild, f"stationListeningMs.{stats_bucket_key(station_key) or 'unknown'}", human_ms)
+            stats_ingest_max(guild, "longestSessionMs", human_ms)
+            stats_ingest_max(guild, "peakListeners", peak)
+            stats_ingest_max(guild, "lastStoppedAt", int(ended.timestamp() * 1000))
+            day = daily(guild_id, started)
+            stats_ingest_inc(day, "totalListeningMs", human_ms)
+            stats_ingest_inc(day, "totalSessions")
+            stats_ingest_max(day, "peakListeners", peak)
+
+        elif event_type == "snapshot":
+            at = parse_stats_ingest_time(event.get("timestamp"), now)
+            listeners = stats_count(event.get("listeners"))
+            snapshots.append({
+                **({"_id": f"{batch_id}:{index}"} if batch_id else {}),
+                "guildId": guild_id,
+                "listeners": listeners,
+                "timestamp": at,
+            })
+            stats_ingest_max(guild, "peakListeners", listeners)
+            stats_ingest_max(daily(guild_id, at), "peakListeners", listeners)
+
+        else:
+            at = parse_stats_ingest_time(event.get("timestamp"), now)
+            stats_ingest_inc(guild, f"commands.{command}")
+            stats_ingest_max(guild, "lastCommandAt", int(at.timestamp() * 1000))
+
+    return guild_updates, daily_updates, sessions, snapshots, results
+
+
+def stats_ingest_update_document(update, set_on_insert=None, batch_id=""):
+    document = {"$setOnInsert": set_on_insert} if set_on_insert else {}
+    for operator in ("inc", "max", "min", "set"):
+        if update[operator]:
+            document[f"${operator}"] = update[operator]
+    if batch_id:
+        document["$push"] = {"_ingestBatches": {"$each": [batch_id], "$slice": -STATS_INGEST_APPLIED_BATCHES}}
+    return document
+
+
+def insert_stats_ingest_documents(collection, documents):
+    """insert_many, bei dem bereits gespeicherte _ids (Retry desselben Batches) kein Fehler sind."""
+    if not documents:
+        return
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+            raise
+
+
+def apply_stats_ingest_counters(collection, updates, batch_id, created_at):
+    """Erst Dokumente anlegen ($setOnInsert), dann Zaehler nur auf Dokumenten ohne diese batchId."""
+    keys = list(updates)
+    collection.bulk_write([
+        UpdateOne(key_filter, {"$setOnInsert": {**key_filter, "createdAt": created_at}}, upsert=True)
+        for key_filter in (updates[key][0] for key in keys)
+    ], ordered=False)
+    collection.bulk_write([
+        UpdateOne(
+            {**key_filter, "_ingestBatches": {"$ne": batch_id}},
+            stats_ingest_update_document(update, batch_id=batch_id),
+        )
+        for key_filter, update in (updates[key] for key in keys)
+    ], ordered=False)
+
+
+def write_stats_ingest(batch_id, guild_updates, daily_updates, sessions, snapshots):
+    """Roh-Daten per insert_many, Zaehler per bulk_write; avgSessionMs danach serverseitig nachziehen.
+
+    Jeder Schritt ist fuer dieselbe batch_id wiederholbar, ein Retry nach einem Fehler also sicher.
+    """
+    created_at = datetime.now(timezone.utc)
+    insert_stats_ingest_documents(db.listening_sessions, sessions)
+    insert_stats_ingest_documents(db.listener_snapshots, snapshots)
+    if guild_updates:
+        apply_stats_ingest_counters(
+            db.guild_stats,
+            {guild_id: ({"guildId": guild_id}, update) for guild_id, update in guild_updates.items()},
+            batch_id,
+            created_at,
+        )
+    if daily_updates:
+        apply_stats_ingest_counters(
+            db.daily_stats,
+            {key: ({"guildId": key[0], "date": key[1]}, update) for key, update in daily_updates.items()},
+            batch_id,
+            created_at,
+        )
+    session_guilds = sorted({session["guildId"] for session in sessions})
+    if session_guilds:
+        # Math.round(totalListeningMs / totalSessions) wie im Node-Store.
+        db.guild_stats.update_many({"guildId": {"$in": session_guilds}}, [{"$set": {"avgSessionMs": {"$cond": [
+            {"$gt": ["$totalSessions", 0]},
+            {"$floor": {"$add": [{"$divide": ["$totalListeningMs", "$totalSessions"]}, 0.5]}},
+            0,
+        ]}}}])
+
+
+@app.post("/api/dashboard/stats/ingest")
+async def dashboard_stats_ingest(request: Request, body: dict):
+    """Listening-Stats vieler Guilds in einem Call: {"events": [{"type": "sessionStart", "serverId": "...", ...}]}"""
+    rate_limited = enforce_api_rate_limit(request, "write")
+    if rate_limited is not None:
+        return rate_limited
+    if not is_admin_request(request):
+        return json_error(401, "Unauthorized. API admin token required.")
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list):
+        return json_error(400, "events muss ein Array sein.")
+    if len(events) > STATS_INGEST_BATCH_MAX:
+        return json_error(413, f"Maximal {STATS_INGEST_BATCH_MAX} Events pro Batch.")
+    batch_id = str(body.get("batchId") or "").strip()
+    if not STATS_INGEST_BATCH_ID_REGEX.match(batch_id):
+        return json_error(400, "batchId erforderlich (1-128 Zeichen: A-Z, a-z, 0-9, . _ : -).")
+    if db is None:
+        return json_error(503, "MongoDB nicht verbunden.")
+
+    try:
+        processed = db.stats_ingest_batches.find_one({"_id": batch_id}, {"_id": 0, "result": 1})
+    except Exception:
+        processed = None
+    if processed and isinstance(processed.get("result"), dict):
+        return {**processed["result"], "replay": True}
+
+    event_guilds = {str(event.get("serverId") or "").strip() for event in events if isinstance(event, dict)}
+    guild_updates, daily_updates, sessions, snapshots, rejected = aggregate_stats_ingest_events(
+        events, batch_id=batch_id, skip_guilds=active_stats_reset_guilds(event_guilds),
+    )
+    try:
+        write_stats_ingest(batch_id, guild_updates, daily_updates, sessions, snapshots)
+    except Exception as e:
+        return json_error(500, f"Fehler beim Speichern: {str(e)}")
+    for guild_id in guild_updates:
+        invalidate_stats_analytics(guild_id)
+
+    result = {
+        "success": True,
+        "batchId": batch_id,
+        "accepted": len(events) - len(rejected),
+        "rejected": len(rejected),
+        "guilds": len(guild_updates),
+        "errors": rejected,
+    }
+    now = datetime.now(timezone.utc)
+    try:
+        db.stats_ingest_batches.update_one(
+            {"_id": batch_id},
+            {"$setOnInsert": {
+                "result": result,
+                "createdAt": now,
+                "expiresAt": now + timedelta(seconds=STATS_INGEST_BATCH_RETENTION_SECONDS),
+            }},
+            upsert=True,
+        )
+    except Exception:
+        pass
+    return {**result, "replay": False}
+
+
+# === Stats-Reset als Hintergrund-Job ===
+# Der Reset loescht in Chunks per _id ($in) statt mit einem grossen delete_many und
+# pausiert nach jedem Chunk mindestens so lange, wie der Chunk gedauert hat. Die
+# Rohdaten gehen zuerst und die aggregierten Zaehler zuletzt, damit waehrend des Jobs
+# nichts aus Rohdaten neu in guild_stats/daily_stats landet. Ingest und Retention-Sweep
+# ueberspringen Guilds mit laufendem Job (active_stats_reset_guilds).
+# Der Job-Status liegt im Prozess und, mit MongoDB, in stats_reset_jobs.
+
+STATS_RESET_COLLECTIONS = ("listening_sessions", "listener_snapshots", "daily_stats", "guild_stats")
+STATS_RESET_JOB_RETENTION_SECONDS = 86400
+STATS_RESET_JOB_STALE_SECONDS = 300
+STATS_RESET_JOBS = {}
+STATS_RESET_ACTIVE = {}
+STATS_RESET_JOBS_LOCK = threading.Lock()
+
+
+def public_stats_reset_job(job):
+    return {key: value for key, value in job.items() if key not in ("_id", "updatedAt", "updatedAtEpoch", "expiresAt")}
+
+
+def copy_stats_reset_job(job):
+    return dict(job, deleted=dict(job["deleted"]))
+
+
+def save_stats_reset_job(job):
+    now = datetime.now(timezone.utc)
+    with STATS_RESET_JOBS_LOCK:
+        job["updatedAtEpoch"] = int(now.timestamp())
+        snapshot = copy_stats_reset_job(job)
+    if db is not None:
+        try:
+            db.stats_reset_jobs.replace_one({"_id": snapshot["jobId"]}, {
+                **snapshot,
+                "updatedAt": now,
+                "expiresAt": now + timedelta(seconds=STATS_RESET_JOB_RETENTION_SECONDS),
+            }, upsert=True)
+        except Exception:
+            pass
+    return snapshot
+
+
+def prune_stats_reset_jobs_locked(now_epoch):
+    cutoff = now_epoch - STATS_RESET_JOB_RETENTION_SECONDS
+    for job_id in [job_id for job_id, job in STATS_RESET_JOBS.items() if job.get("updatedAtEpoch", now_epoch) < cutoff]:
+        STATS_RESET_JOBS.pop(job_id, None)
+
+
+def find_active_stats_reset_job(guild_id):
+    """Laufender Job dieser Guild, auch aus einem anderen Worker (solange er sich meldet)."""
+    with STATS_RESET_JOBS_LOCK:
+        job_id = STATS_RESET_ACTIVE.get(guild_id)
+        if job_id and job_id in STATS_RESET_JOBS:
+            return copy_stats_reset_job(STATS_RESET_JOBS[job_id])
+    if db is not None:
+        try:
+            fresh = datetime.now(timezone.utc) - timedelta(seconds=STATS_RESET_JOB_STALE_SECONDS)
+            doc = db.stats_reset_jobs.find_one(
+                {"serverId": guild_id, "status": {"$in": ["queued", "running"]}, "updatedAt": {"$gte": fresh}},
+                sort=[("updatedAt", -1)],
+            )
+            if doc:
+                return public_stats_reset_job(doc)
+        except Exception:
+            pass
+    return None
+
+
+def active_stats_reset_guilds(guild_ids):
+    """Teilmenge von guild_ids mit laufendem Reset-Job (lokal oder in einem anderen Worker)."""
+    guild_ids = {guild_id for guild_id in guild_ids if guild_id}
+    if not guild_ids:
+        return set()
+    with STATS_RESET_JOBS_LOCK:
+        active = {guild_id for guild_id in guild_ids if guild_id in STATS_RESET_ACTIVE}
+    if db is not None and guild_ids - active:
+        try:
+            fresh = datetime.now(timezone.utc) - timedelta(seconds=STATS_RESET_JOB_STALE_SECONDS)
+            active.update(db.stats_reset_jobs.distinct("serverId", {
+                "serverId": {"$in": sorted(guild_ids - active)},
+                "status": {"$in": ["queued", "running"]},
+                "updatedAt": {"$gte": fresh},
+            }))
+        except Exception:
+            pass
+    return active
 
-    session, _ = get_dashboard_session(request)
-    if not session:
-        return {
-            "authenticated": False,
-            "oauthConfigured": is_discord_oauth_configured(),
-            "user": None,
-            "guilds": [],
-        }
 
-    guilds = resolve_dashboard_guilds_for_session(session)
-    return {
-        "authenticated": True,
-        "oauthConfigured": is_discord_oauth_configured(),
-        "user": session.get("user", {}),
-        "guilds": guilds,
-        "expiresAt": session.get("expiresAt"),
-    }
+def get_stats_reset_job(guild_id, job_id=""):
+    """Job per ID oder, ohne ID, der juengste Job der Guild."""
+    with STATS_RESET_JOBS_LOCK:
+        candidates = [
+            job for job in STATS_RESET_JOBS.values()
+            if job["serverId"] == guild_id and (not job_id or job["jobId"] == job_id)
+        ]
+        if candidates:
+            return copy_stats_reset_job(max(candidates, key=lambda job: job["createdAt"]))
+    if db is not None:
+        try:
+            query = {"serverId": guild_id}
+            if job_id:
+                query["_id"] = job_id
+            doc = db.stats_reset_jobs.find_one(query, sort=[("updatedAt", -1)])
+            if doc:
+                return public_stats_reset_job(doc)
+        except Exception:
+            pass
+    return None
 
 
-@app.post("/api/auth/logout")
-async def auth_logout(request: Request):
-    rate_limited = enforce_api_rate_limit(request, "write")
-    if rate_limited is not None:
-        return rate_limited
+def throttle_stats_chunk(started):
+    # Drosselung: hoechstens ~50 % der Zeit loeschen/rollen, nie ohne Pause.
+    time.sleep(max(STATS_RESET_CHUNK_PAUSE_MS / 1000, time.monotonic() - started))
 
-    _, token = get_dashboard_session(request)
-    if token:
-        DASHBOARD_SESSION_STORE.pop(token, None)
 
-    response = JSONResponse(status_code=200, content={"success": True})
-    response.delete_cookie(SESSION_COOKIE_NAME, path="/")
-    return response
+def delete_guild_documents_chunked(job, coll_name):
+    collection = db[coll_name]
+    guild_id = job["serverId"]
+    while True:
+        started = time.monotonic()
+        ids = [doc["_id"] for doc in collection.find({"guildId": guild_id}, {"_id": 1}).limit(STATS_RESET_CHUNK_SIZE)]
+        if not ids:
+            return
+        deleted = collection.delete_many({"_id": {"$in": ids}}).deleted_count
+        with STATS_RESET_JOBS_LOCK:
+            job["deleted"][coll_name] = job["deleted"].get(coll_name, 0) + deleted
+            job["deletedTotal"] += deleted
+            job["chunks"] += 1
+        save_stats_reset_job(job)
+        throttle_stats_chunk(started)
 
 
-@app.get("/api/dashboard/guilds")
-async def dashboard_guilds(request: Request):
-    rate_limited = enforce_api_rate_limit(request, "read")
-    if rate_limited is not None:
-        return rate_limited
-    session, _ = get_dashboard_session(request)
-    if not session:
-        return json_error(401, "Nicht eingeloggt.")
-    return {"guilds": resolve_dashboard_guilds_for_session(session)}
+def run_stats_reset_job(job):
+    guild_id = job["serverId"]
+    try:
+        with STATS_RESET_JOBS_LOCK:
+            job["status"] = "running"
+            job["startedAt"] = datetime.now(timezone.utc).isoformat()
+        save_stats_reset_job(job)
+        if db is not None:
+            for coll_name in STATS_RESET_COLLECTIONS:
+                with STATS_RESET_JOBS_LOCK:
+                    job["collection"] = coll_name
+                    job["deleted"].setdefault(coll_name, 0)
+                delete_guild_documents_chunked(job, coll_name)
+        series_deleted = delete_telemetry_series(guild_id)
+        with STATS_RESET_JOBS_LOCK:
+            job["collection"] = None
+            job["deleted"].update(series_deleted)
+            job["deletedTotal"] += sum(series_deleted.values())
+            job["status"] = "done"
+    except Exception as e:
+        with STATS_RESET_JOBS_LOCK:
+            job["status"] = "failed"
+            job["error"] = f"Fehler beim Zuruecksetzen: {str(e)}"
+    finally:
+        invalidate_stats_analytics(guild_id)
+        with STATS_RESET_JOBS_LOCK:
+            job["finishedAt"] = datetime.now(timezone.utc).isoformat()
+            if STATS_RESET_ACTIVE.get(guild_id) == job["jobId"]:
+                STATS_RESET_ACTIVE.pop(guild_id, None)
+        save_stats_reset_job(job)
+
+
+def start_stats_reset_job(guild_id):
+    """Startet den Reset oder liefert den schon laufenden Job der Guild zurueck."""
+    active = find_active_stats_reset_job(guild_id)
+    if active:
+        return active, False
+    now = datetime.now(timezone.utc)
+    job = {
+        "jobId": secrets.token_hex(12),
+        "serverId": guild_id,
+        "status": "queued",
+        "collection": None,
+        "deleted": {},
+        "deletedTotal": 0,
+        "chunks": 0,
+        "createdAt": now.isoformat(),
+        "startedAt": None,
+        "finishedAt": None,
+        "error": None,
+    }
+    with STATS_RESET_JOBS_LOCK:
+        job_id = STATS_RESET_ACTIVE.get(guild_id)
+        if job_id and job_id in STATS_RESET_JOBS:
+            return copy_stats_reset_job(STATS_RESET_JOBS[job_id]), False
+        prune_stats_reset_jobs_locked(int(now.timestamp()))
+        STATS_RESET_JOBS[job["jobId"]] = job
+        STATS_RESET_ACTIVE[guild_id] = job["jobId"]
+    snapshot = save_stats_reset_job(job)
+    threading.Thread(target=run_stats_reset_job, args=(job,), name=f"stats-reset-{guild_id}", daemon=True).start()
+    return snapshot, True
 
 
-@app.get("/api/dashboard/stats")
-async def dashboard_stats(request: Request, serverId: str = ""):
-    rate_limited = enforce_api_rate_limit(request, "read")
+@app.delete("/api/dashboard/stats/reset")
+async def dashboard_stats_reset(request: Request, serverId: str = ""):
+    rate_limited = enforce_api_rate_limit(request, "write")
     if rate_limited is not None:
         return rate_limited
 
@@ -2235,22 +5619,17 @@ async def dashboard_stats(request: Request, serverId: str = ""):
     if not guild:
         return json_error(403, "Kein Zugriff auf diesen Server.")
 
-    tier = guild.get("tier", "free")
-    if TIER_RANK.get(tier, 0) < TIER_RANK.get("pro", 1):
-        return json_error(403, "Dashboard ist erst ab Pro verfuegbar.")
+    gid = guild.get("id", "")
+    if not gid:
+        return json_error(400, "Ungueltige Server-ID.")
 
-    stats_payload = get_dashboard_guild_stats(guild.get("id"), tier)
-    return {
-        "serverId": guild.get("id"),
-        "tier": tier,
-        "basic": stats_payload.get("basic", {}),
-        "advanced": stats_payload.get("advanced") if tier == "ultimate" else None,
-    }
+    job, created = start_stats_reset_job(gid)
+    return JSONResponse(status_code=202, content={"success": True, "created": created, **public_stats_reset_job(job)})
 
 
-@app.delete("/api/dashboard/stats/reset")
-async def dashboard_stats_reset(request: Request, serverId: str = ""):
-    rate_limited = enforce_api_rate_limit(request, "write")
+@app.get("/api/dashboard/stats/reset/status")
+async def dashboard_stats_reset_status(request: Request, serverId: str = "", jobId: str = ""):
+    rate_limited = enforce_api_rate_limit(request, "read")
     if rate_limited is not None:
         return rate_limited
 
@@ -2262,26 +5641,433 @@ async def dashboard_stats_reset(request: Request, serverId: str = ""):
     if not guild:
         return json_error(403, "Kein Zugriff auf diesen Server.")
 
-    gid = guild.get("id", "")
-    if not gid:
-        return json_error(400, "Ungueltige Server-ID.")
+    job = get_stats_reset_job(guild.get("id", ""), str(jobId or "").strip())
+    if not job:
+        return json_error(404, "Kein Reset-Job gefunden.")
+    return {"success": True, **public_stats_reset_job(job)}
+
+
+# === Stats-Retention ===
+# listener_snapshots und listening_sessions werden pro Tier nur begrenzt aufbewahrt.
+# Ein Sweep rollt Dokumente jenseits der Aufbewahrung pro Guild und Tag in daily_stats
+# (Snapshot-Summen, Stations-Hoerzeit) und setzt erst danach expiresAt; geloescht wird
+# ausschliesslich ueber den TTL-Index. Ein Lease in maintenance_locks sorgt dafuer,
+# dass bei mehreren Workern nur einer sweept; er wird vor jedem Chunk verlaengert, und
+# wer ihn verloren hat, hoert auf. Guilds mit laufendem Stats-Reset werden uebersprungen,
+# sonst schreibt der Rollup geloeschte daily_stats zurueck.
+
+
+def parse_tier_days(raw_value, defaults):
+    """"free=7,pro=30,ultimate=90" -> {"free": 7, ...}; fehlende/ungueltige Tiers behalten den Default."""
+    result = dict(defaults)
+    for part in str(raw_value or "").split(","):
+        tier, _, days = part.partition("=")
+        tier = tier.strip().lower()
+        if tier in result:
+            try:
+                result[tier] = max(1, int(days.strip()))
+            except ValueError:
+                pass
+    return result
 
-    deleted_counts = {}
-    if db is not None:
+
+STATS_SNAPSHOT_RETENTION_DAYS = parse_tier_days(
+    os.environ.get("STATS_SNAPSHOT_RETENTION_DAYS"), {"free": 7, "pro": 30, "ultimate": 90}
+)
+STATS_SESSION_RETENTION_DAYS = parse_tier_days(
+    os.environ.get("STATS_SESSION_RETENTION_DAYS"), {"free": 30, "pro": 90, "ultimate": 365}
+)
+try:
+    STATS_RETENTION_SWEEP_MINUTES = max(0, int((os.environ.get("STATS_RETENTION_SWEEP_MINUTES") or "60").strip() or "60"))
+except Exception:
+    STATS_RETENTION_SWEEP_MINUTES = 60
+STATS_RETENTION_GUILD_BATCH = 500
+STATS_RETENTION_LEASE_SECONDS = 900
+STATS_RETENTION_OWNER = f"{os.getpid()}-{secrets.token_hex(4)}"
+STATS_RETENTION_WORKER = {"started": False}
+
+
+def acquire_maintenance_lease(name, seconds):
+    now = datetime.now(timezone.utc)
+    try:
+        db.maintenance_locks.update_one(
+            {"_id": name, "leaseUntil": {"$lt": now}},
+            {"$set": {"leaseUntil": now + timedelta(seconds=seconds), "owner": STATS_RETENTION_OWNER}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # Lease existiert und ist noch nicht abgelaufen.
+        return False
+
+
+def renew_maintenance_lease(name, seconds):
+    """False, wenn der Lease nicht mehr diesem Prozess gehoert (abgelaufen und neu vergeben)."""
+    try:
+        result = db.maintenance_locks.update_one(
+            {"_id": name, "owner": STATS_RETENTION_OWNER},
+            {"$set": {"leaseUntil": datetime.now(timezone.utc) + timedelta(seconds=seconds)}},
+        )
+        return result.matched_count > 0
+    except Exception:
+        return False
+
+
+def release_maintenance_lease(name):
+    try:
+        db.maintenance_locks.delete_one({"_id": name, "owner": STATS_RETENTION_OWNER})
+    except Exception:
+        pass
+
+
+def stats_retention_cutoff_filter(field, cutoff):
+    # Date-Werte (Node: Snapshots) und ISO-Strings (Sessions) vergleicht MongoDB nur typgleich.
+    return {"$or": [
+        {field: {"$lt": cutoff}},
+        {field: {"$lt": format_mongo_datetime(cutoff)}},
+    ]}
+
+
+def roll_up_expired_stats(coll_name, guild_id, cutoff, add_to_day, renew_lease=None):
+    """Chunkweise: Dokumente vor cutoff in daily_stats aufsummieren, dann fuer den TTL-Index markieren.
+
+    Liefert (rolled, stopped): stopped ist "reset" bei laufendem Stats-Reset der Guild,
+    "lease", wenn renew_lease() False liefert, sonst None.
+    """
+    collection = db[coll_name]
+    field = "timestamp" if coll_name == "listener_snapshots" else "startedAt"
+    query = {"guildId": guild_id, "expiresAt": {"$exists": False}, **stats_retention_cutoff_filter(field, cutoff)}
+    rolled = 0
+    while True:
+        if renew_lease is not None and not renew_lease():
+            return rolled, "lease"
+        if active_stats_reset_guilds({guild_id}):
+            return rolled, "reset"
+        started = time.monotonic()
+        docs = list(collection.find(query).limit(STATS_RESET_CHUNK_SIZE))
+        if not docs:
+            return rolled, None
+        daily_updates = {}
+        for doc in docs:
+            # Lokaler Kalendertag wie beim Ingest (stats_local_time).
+            at = datetime.fromtimestamp(stats_value_epoch(doc.get(field)), timezone.utc)
+            date = stats_local_time(at).strftime("%Y-%m-%d")
+            add_to_day(daily_updates.setdefault(date, new_stats_ingest_update()), doc)
+        now = datetime.now(timezone.utc)
+        db.daily_stats.bulk_write([
+            UpdateOne(
+                {"guildId": guild_id, "date": date},
+                stats_ingest_update_document(update, {"guildId": guild_id, "date": date, "createdAt": now}),
+                upsert=True,
+            )
+            for date, update in daily_updates.items()
+        ], ordered=False)
+        # Erst nach dem Rollup: ein Abbruch dazwischen zaehlt den Chunk hoechstens doppelt, verliert ihn aber nie.
+        collection.update_many({"_id": {"$in": [doc["_id"] for doc in docs]}}, {"$set": {"expiresAt": now}})
+        rolled += len(docs)
+        throttle_stats_chunk(started)
+
+
+def add_snapshot_to_day(update, doc):
+    listeners = stats_count(doc.get("listeners"))
+    stats_ingest_inc(update, "snapshotSamples")
+    stats_ingest_inc(update, "snapshotListenerSum", listeners)
+    stats_ingest_max(update, "peakListeners", listeners)
+
+
+def add_session_to_day(update, doc):
+    listening_ms = stats_count(doc.get("humanListeningMs", doc.get("durationMs")))
+    stats_ingest_inc(update, "archivedSessions")
+    if listening_ms > 0:
+        stats_ingest_inc(update, f"stationListeningMs.{stats_bucket_key(doc.get('stationKey')) or 'unknown'}", listening_ms)
+    stats_ingest_max(update, "longestSessionMs", listening_ms)
+
+
+def apply_stats_retention(guild_tiers, now=None, renew_lease=None):
+    """Rollup pro Guild; bricht ab (leaseLost), sobald renew_lease() False liefert."""
+    now = now or datetime.now(timezone.utc)
+    summary = {"guilds": 0, "snapshots": 0, "sessions": 0, "skipped": 0, "leaseLost": False}
+    resetting = active_stats_reset_guilds(guild_tiers)
+    for guild_id, tier in guild_tiers.items():
+        if guild_id in resetting:
+            summary["skipped"] += 1
+            continue
+        snapshot_days = STATS_SNAPSHOT_RETENTION_DAYS.get(tier, STATS_SNAPSHOT_RETENTION_DAYS["free"])
+        session_days = STATS_SESSION_RETENTION_DAYS.get(tier, STATS_SESSION_RETENTION_DAYS["free"])
+        snapshots, stopped = roll_up_expired_stats(
+            "listener_snapshots", guild_id, now - timedelta(days=snapshot_days), add_snapshot_to_day, renew_lease
+        )
+        sessions = 0
+        if stopped is None:
+            sessions, stopped = roll_up_expired_stats(
+                "listening_sessions", guild_id, now - timedelta(days=session_days), add_session_to_day, renew_lease
+            )
+        summary["snapshots"] += snapshots
+        summary["sessions"] += sessions
+        if snapshots or sessions:
+            invalidate_stats_analytics(guild_id)
+        if stopped == "lease":
+            summary["leaseLost"] = True
+            break
+        summary["guilds" if stopped is None else "skipped"] += 1
+    return summary
+
+
+def run_stats_retention_sweep():
+    """Alle Guilds aus guild_stats in Batches; None, wenn ein anderer Worker den Lease haelt."""
+    if db is None or not acquire_maintenance_lease("stats-retention", STATS_RETENTION_LEASE_SECONDS):
+        return None
+    summary = {"guilds": 0, "snapshots": 0, "sessions": 0, "skipped": 0, "leaseLost": False, "telemetryPoints": 0}
+
+    def renew_lease():
+        return renew_maintenance_lease("stats-retention", STATS_RETENTION_LEASE_SECONDS)
+
+    try:
+        last_id = None
+        while not summary["leaseLost"]:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            docs = list(db.guild_stats.find(query, {"_id": 1, "guildId": 1}).sort("_id", 1).limit(STATS_RETENTION_GUILD_BATCH))
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+            guild_ids = [str(doc.get("guildId") or "") for doc in docs if doc.get("guildId")]
+            batch = apply_stats_retention(get_tiers_for_servers(guild_ids), renew_lease=renew_lease)
+            for key in ("guilds", "snapshots", "sessions", "skipped"):
+                summary[key] += batch[key]
+            summary["leaseLost"] = batch["leaseLost"]
+        if not summary["leaseLost"]:
+            if renew_lease():
+                summary["telemetryPoints"] = sum(trim_telemetry_series().values())
+            else:
+                summary["leaseLost"] = True
+    finally:
+        release_maintenance_lease("stats-retention")
+    return summary
+
+
+def stats_retention_loop():
+    while True:
+        time.sleep(STATS_RETENTION_SWEEP_MINUTES * 60)
         try:
-            for coll_name in ["daily_stats", "listening_sessions", "listener_snapshots"]:
-                r = db[coll_name].delete_many({"guildId": gid})
-                deleted_counts[coll_name] = r.deleted_count
-            r = db.guild_stats.delete_many({"guildId": gid})
-            deleted_counts["guild_stats"] = r.deleted_count
-        except Exception as e:
-            return json_error(500, f"Fehler beim Zuruecksetzen: {str(e)}")
+            run_stats_retention_sweep()
+        except Exception:
+            pass
+
+
+def start_stats_retention_worker():
+    if db is None or STATS_RETENTION_SWEEP_MINUTES <= 0 or STATS_RETENTION_WORKER["started"]:
+        return False
+    STATS_RETENTION_WORKER["started"] = True
+    threading.Thread(target=stats_retention_loop, name="stats-retention", daemon=True).start()
+    return True
+
+
+start_stats_retention_worker()
+
+
+# === Stats-Detail: ein Roundtrip ===
+# guild_stats, daily_stats, listening_sessions, listener_snapshots und die Telemetrie-
+# Zeitreihe kommen ueber $unionWith in eine Pipeline und per $facet als ein Dokument
+# zurueck; Datumswerte formatiert MongoDB. Die Analytics-Signatur wird aus diesen
+# Sektionen gebildet; nur wenn sie sich aendert, laufen die Analytics-Queries erneut.
+# Ohne $unionWith (MongoDB < 4.4) die Einzelqueries.
+
+STATS_DETAIL_SESSION_LIMIT = 20
+STATS_DETAIL_SNAPSHOT_LIMIT = 288
+STATS_DETAIL_GUILD_FIELDS = (
+    "totalListeningMs", "totalSessions", "avgSessionMs", "longestSessionMs", "totalStarts", "peakListeners",
+    "stationStarts", "stationListeningMs", "stationNames", "hours", "daysOfWeek", "commands", "voiceChannels",
+)
+STATS_DETAIL_PIPELINE = {"supported": True}
+
+
+def mongo_iso_expression(field):
+    """Date -> ISO-String wie Date.toISOString(); aeltere String-Werte bleiben wie gespeichert."""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": field}, "date"]},
+            {"$dateToString": {"date": field, "format": "%Y-%m-%dT%H:%M:%S.%LZ"}},
+            {"$ifNull": [{"$toString": field}, ""]},
+        ]
+    }
+
+
+def format_mongo_datetime(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    return str(value if value is not None else "")
+
+
+def telemetry_series_union_stage(guild_id, resolution, since):
+    """$unionWith-Stage fuer die Zeitreihe im Format der Records aus read_telemetry_series."""
+    if resolution == "raw":
+        time_field = "$ts"
+        fields = {
+            "samples": {"$literal": 1},
+            "listenersSum": {"$ifNull": ["$listeners", 0]},
+            "listenersMax": {"$ifNull": ["$listeners", 0]},
+            "streamsSum": {"$ifNull": ["$activeStreams", 0]},
+            "streamsMax": {"$ifNull": ["$activeStreams", 0]},
+        }
+    else:
+        time_field = "$bucket"
+        fields = {name: {"$ifNull": [f"${name}", 0]} for name in ("samples", "listenersSum", "listenersMax", "streamsSum", "streamsMax")}
+    return {"$unionWith": {"coll": TELEMETRY_SERIES_COLLECTIONS[resolution], "pipeline": [
+        {"$match": {"guildId": guild_id, time_field[1:]: {"$gte": since}}},
+        {"$project": {"_id": 0, "_section": {"$literal": "telemetry"}, "_order": time_field, "bucket": time_field, **fields}},
+    ]}}
+
+
+def telemetry_series_section_records(docs):
+    return [
+        (
+            mongo_datetime_epoch(doc.get("bucket")),
+            doc.get("samples", 0),
+            doc.get("listenersSum", 0),
+            doc.get("listenersMax", 0),
+            doc.get("streamsSum", 0),
+            doc.get("streamsMax", 0),
+        )
+        for doc in docs
+    ]
+
+
+def build_stats_detail_pipeline(guild_id, cutoff, days, timeline=None):
+    session_fields = {
+        "_id": 0,
+        "_section": {"$literal": "session"},
+        "_order": "$startedAt",
+        "stationKey": {"$ifNull": ["$stationKey", ""]},
+        "stationName": {"$ifNull": ["$stationName", ""]},
+        "startedAt": mongo_iso_expression("$startedAt"),
+        "durationMs": {"$ifNull": ["$humanListeningMs", {"$ifNull": ["$durationMs", 0]}]},
+        "peakListeners": {"$ifNull": ["$peakListeners", 0]},
+        "avgListeners": {"$ifNull": ["$avgListeners", 0]},
+    }
+    return [
+        {"$match": {"guildId": guild_id}},
+        {"$limit": 1},
+        {"$project": {"_id": 0, "_section": {"$literal": "guild"}, **{field: 1 for field in STATS_DETAIL_GUILD_FIELDS}}},
+        {"$unionWith": {"coll": "daily_stats", "pipeline": [
+            {"$match": {"guildId": guild_id, "date": {"$gte": cutoff}}},
+            {"$sort": {"date": -1}},
+            {"$limit": days},
+            {"$project": {"_id": 0, "_ingestBatches": 0}},
+            {"$addFields": {"_section": {"$literal": "daily"}}},
+        ]}},
+        {"$unionWith": {"coll": "listening_sessions", "pipeline": [
+            {"$match": {"guildId": guild_id}},
+            {"$sort": {"startedAt": -1}},
+            {"$limit": STATS_DETAIL_SESSION_LIMIT},
+            {"$project": session_fields},
+        ]}},
+        {"$unionWith": {"coll": "listener_snapshots", "pipeline": [
+            {"$match": {"guildId": guild_id}},
+            {"$sort": {"timestamp": -1}},
+            {"$limit": STATS_DETAIL_SNAPSHOT_LIMIT},
+            {"$project": {
+                "_id": 0,
+                "_section": {"$literal": "snapshot"},
+                "_order": "$timestamp",
+                "timestamp": mongo_iso_expression("$timestamp"),
+                "listeners": {"$ifNull": ["$listeners", 0]},
+            }},
+        ]}},
+        *([telemetry_series_union_stage(guild_id, *timeline)] if timeline else []),
+        {"$facet": {
+            "guild": [{"$match": {"_section": "guild"}}],
+            "daily": [{"$match": {"_section": "daily"}}, {"$sort": {"date": -1}}],
+            "sessions": [{"$match": {"_section": "session"}}, {"$sort": {"_order": -1}}],
+            "snapshots": [{"$match": {"_section": "snapshot"}}, {"$sort": {"_order": 1}}],
+            "telemetry": [{"$match": {"_section": "telemetry"}}, {"$sort": {"_order": 1}}],
+        }},
+    ]
+
+
+def load_stats_detail_sections_sequential(guild_id, cutoff, days, timeline=None):
+    guild_stat = db.guild_stats.find_one({"guildId": guild_id}, {"_id": 0, "_ingestBatches": 0})
+    sessions = db.listening_sessions.find(
+        {"guildId": guild_id}, {"_id": 0}
+    ).sort("startedAt", -1).limit(STATS_DETAIL_SESSION_LIMIT)
+    snapshots = list(db.listener_snapshots.find(
+        {"guildId": guild_id}, {"_id": 0, "timestamp": 1, "listeners": 1}
+    ).sort("timestamp", -1).limit(STATS_DETAIL_SNAPSHOT_LIMIT))
+    return {
+        "guild": [guild_stat] if guild_stat else [],
+        "daily": list(db.daily_stats.find(
+            {"guildId": guild_id, "date": {"$gte": cutoff}}, {"_id": 0, "_ingestBatches": 0}
+        ).sort("date", -1).limit(days)),
+        "sessions": [{
+            "stationKey": doc.get("stationKey", ""),
+            "stationName": doc.get("stationName", ""),
+            "startedAt": format_mongo_datetime(doc.get("startedAt", "")),
+            "durationMs": doc.get("humanListeningMs", doc.get("durationMs", 0)),
+            "peakListeners": doc.get("peakListeners", 0),
+            "avgListeners": doc.get("avgListeners", 0),
+        } for doc in sessions],
+        "snapshots": [{
+            "timestamp": format_mongo_datetime(doc.get("timestamp", "")),
+            "listeners": doc.get("listeners", 0),
+        } for doc in reversed(snapshots)],
+        "telemetry": read_telemetry_series(guild_id, timeline[0], mongo_datetime_epoch(timeline[1])) if timeline else [],
+    }
 
-    return {"success": True, "serverId": gid, "deleted": deleted_counts}
+
+def load_stats_detail_sections(guild_id, cutoff, days, timeline=None):
+    """timeline = (resolution, since) laedt die Telemetrie-Zeitreihe in derselben Pipeline mit."""
+    if STATS_DETAIL_PIPELINE["supported"]:
+        try:
+            sections = next(db.guild_stats.aggregate(build_stats_detail_pipeline(guild_id, cutoff, days, timeline)), {})
+            sections["telemetry"] = telemetry_series_section_records(sections.get("telemetry") or [])
+            return sections
+        except OperationFailure as exc:
+            # 40324: unbekannte Pipeline-Stage ($unionWith) -> Server kann das nicht, nicht erneut versuchen.
+            if exc.code == 40324:
+                STATS_DETAIL_PIPELINE["supported"] = False
+        except Exception:
+            pass
+    return load_stats_detail_sections_sequential(guild_id, cutoff, days, timeline)
+
+
+def apply_stats_detail_sections(result, sections):
+    result["dailyStats"] = [
+        {key: value for key, value in doc.items() if key != "_section"} for doc in sections.get("daily") or []
+    ]
+    result["sessionHistory"] = [{
+        "stationKey": doc.get("stationKey", ""),
+        "stationName": doc.get("stationName", ""),
+        "startedAt": doc.get("startedAt", ""),
+        "durationMs": doc.get("durationMs", 0),
+        "peakListeners": doc.get("peakListeners", 0),
+        "avgListeners": doc.get("avgListeners", 0),
+    } for doc in sections.get("sessions") or []]
+    guild_stat = (sections.get("guild") or [None])[0]
+    if guild_stat:
+        result["listeningStats"] = {
+            "totalListeningMs": guild_stat.get("totalListeningMs", 0),
+            "totalSessions": guild_stat.get("totalSessions", 0),
+            "avgSessionMs": guild_stat.get("avgSessionMs", 0),
+            "longestSessionMs": guild_stat.get("longestSessionMs", 0),
+            "totalStarts": guild_stat.get("totalStarts", 0),
+            "peakListeners": guild_stat.get("peakListeners", 0),
+            "stationStarts": guild_stat.get("stationStarts", {}),
+            "stationListeningMs": guild_stat.get("stationListeningMs", {}),
+            "stationNames": guild_stat.get("stationNames", {}),
+            "hours": guild_stat.get("hours", {}),
+            "daysOfWeek": guild_stat.get("daysOfWeek", {}),
+            "commands": guild_stat.get("commands", {}),
+            "voiceChannels": guild_stat.get("voiceChannels", {}),
+        }
+    result["listenerTimeline"] = [
+        {"timestamp": doc.get("timestamp", ""), "listeners": doc.get("listeners", 0)}
+        for doc in sections.get("snapshots") or []
+    ]
 
 
 @app.get("/api/dashboard/stats/detail")
-async def dashboard_stats_detail(request: Request, serverId: str = "", days: int = 30):
+async def dashboard_stats_detail(request: Request, serverId: str = "", days: int = 30, resolution: str = "auto"):
     rate_limited = enforce_api_rate_limit(request, "read")
     if rate_limited is not None:
         return rate_limited
@@ -2304,53 +6090,24 @@ async def dashboard_stats_detail(request: Request, serverId: str = "", days: int
     }
     if db is not None:
         try:
-            from datetime import timedelta
+            # Zeitreihe und Analytics-Signatur kommen aus derselben Pipeline; Analytics
+            # selbst werden nur bei geaenderter Signatur neu berechnet.
+            generation = STATS_ANALYTICS_GENERATIONS.get(gid, 0)
+            window = resolve_telemetry_timeline_window("ultimate", days, resolution)
+            timeline = (window[0], datetime.now(timezone.utc) - timedelta(days=window[1])) if window else None
             cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d")
-            daily = list(db.daily_stats.find(
-                {"guildId": gid, "date": {"$gte": cutoff}},
-                {"_id": 0}
-            ).sort("date", -1).limit(days))
-            result["dailyStats"] = daily
-
-            sessions = list(db.listening_sessions.find(
-                {"guildId": gid}, {"_id": 0}
-            ).sort("startedAt", -1).limit(20))
-            result["sessionHistory"] = [{
-                "stationKey": s.get("stationKey", ""),
-                "stationName": s.get("stationName", ""),
-                "startedAt": s.get("startedAt").isoformat() if hasattr(s.get("startedAt", ""), "isoformat") else str(s.get("startedAt", "")),
-                "durationMs": s.get("humanListeningMs", s.get("durationMs", 0)),
-                "peakListeners": s.get("peakListeners", 0),
-                "avgListeners": s.get("avgListeners", 0),
-            } for s in sessions]
-
-            guild_stat = db.guild_stats.find_one({"guildId": gid}, {"_id": 0})
-            if guild_stat:
-                result["listeningStats"] = {
-                    "totalListeningMs": guild_stat.get("totalListeningMs", 0),
-                    "totalSessions": guild_stat.get("totalSessions", 0),
-                    "avgSessionMs": guild_stat.get("avgSessionMs", 0),
-                    "longestSessionMs": guild_stat.get("longestSessionMs", 0),
-                    "totalStarts": guild_stat.get("totalStarts", 0),
-                    "peakListeners": guild_stat.get("peakListeners", 0),
-                    "stationStarts": guild_stat.get("stationStarts", {}),
-                    "stationListeningMs": guild_stat.get("stationListeningMs", {}),
-                    "stationNames": guild_stat.get("stationNames", {}),
-                    "hours": guild_stat.get("hours", {}),
-                    "daysOfWeek": guild_stat.get("daysOfWeek", {}),
-                    "commands": guild_stat.get("commands", {}),
-                    "voiceChannels": guild_stat.get("voiceChannels", {}),
-                }
-
-            snapshots = list(db.listener_snapshots.find(
-                {"guildId": gid}, {"_id": 0}
-            ).sort("timestamp", -1).limit(288))
-            result["listenerTimeline"] = [{
-                "timestamp": s.get("timestamp").isoformat() if hasattr(s.get("timestamp", ""), "isoformat") else str(s.get("timestamp", "")),
-                "listeners": s.get("listeners", 0),
-            } for s in reversed(snapshots)]
+            sections = load_stats_detail_sections(gid, cutoff, days, timeline)
+            apply_stats_detail_sections(result, sections)
+            result["telemetryTimeline"] = (
+                build_telemetry_timeline(window[0], window[1], sections.get("telemetry") or [])
+                if window else {"resolution": None, "days": 0, "points": []}
+            )
+            result["analytics"] = get_stats_analytics(gid, days, stats_analytics_signature_from_sections(sections, generation))
+            return result
         except Exception:
             pass
+    result["telemetryTimeline"] = load_telemetry_timeline(gid, "ultimate", days, resolution)
+    result["analytics"] = get_stats_analytics(gid, days)
     return result
 
 
@@ -2367,18 +6124,24 @@ async def dashboard_settings_get(request: Request, serverId: str = ""):
         return json_error(403, "Kein Zugriff auf diesen Server.")
 
     gid = guild.get("id", "")
+    # guild_settings schreibt auch das Node-Backend (ohne dashboard_versions): ETag aus dem Inhalt.
     settings = {}
     if db is not None:
         try:
-            settings = db.guild_settings.find_one({"guildId": gid}, {"_id": 0}) or {}
+            settings = db.guild_settings.find_one({"guildId": gid}, {"_id": 0, "weeklyDigest": 1, "fallbackStation": 1}) or {}
         except Exception:
             pass
-    return {
-        "guildId": gid,
-        "tier": guild.get("tier", "free"),
-        "weeklyDigest": settings.get("weeklyDigest", {"enabled": False, "channelId": "", "dayOfWeek": 1, "hour": 9, "language": "de"}),
-        "fallbackStation": settings.get("fallbackStation", ""),
-    }
+
+    def build_payload():
+        return {
+            "guildId": gid,
+            "tier": guild.get("tier", "free"),
+            "weeklyDigest": settings.get("weeklyDigest", {"enabled": False, "channelId": "", "dayOfWeek": 1, "hour": 9, "language": "de"}),
+            "fallbackStation": settings.get("fallbackStation", ""),
+        }
+
+    etag = dashboard_etag("settings", dashboard_content_version(settings), guild.get("tier", "free"))
+    return dashboard_conditional_response(request, etag, build_payload)
 
 
 @app.put("/api/dashboard/settings")
@@ -2463,31 +6226,42 @@ async def dashboard_stations_all(request: Request, serverId: str = ""):
 
     gid = guild.get("id", "")
     tier = guild.get("tier", "free")
-    file_data = load_stations_from_file()
-    all_stations = file_data.get("stations", {})
 
-    free_list, pro_list = [], []
-    for key, val in all_stations.items():
-        if key.startswith("custom:"):
-            continue
-        st_tier = (val.get("tier", "free") or "free").lower()
-        entry = {"key": key, "name": val.get("name", key), "url": val.get("url", ""), "genre": val.get("genre", ""), "country": val.get("country", "")}
-        if st_tier == "free":
-            free_list.append(entry)
-        elif st_tier == "pro" and tier in ("pro", "ultimate"):
-            pro_list.append(entry)
-    free_list.sort(key=lambda s: s["name"])
-    pro_list.sort(key=lambda s: s["name"])
-
-    custom_list = []
-    if db is not None and tier == "ultimate":
-        try:
-            for doc in db.custom_stations.find({"guildId": gid}, {"_id": 0}):
-                custom_list.append({"key": doc.get("key", ""), "name": doc.get("name", ""), "url": doc.get("url", ""), "genre": doc.get("genre", ""), "custom": True})
-        except Exception:
-            pass
+    def build_payload():
+        file_data = load_stations_from_file()
+        all_stations = file_data.get("stations", {})
 
-    return {"free": free_list, "pro": pro_list, "custom": custom_list, "tier": tier}
+        free_list, pro_list = [], []
+        for key, val in all_stations.items():
+            if key.startswith("custom:"):
+                continue
+            st_tier = (val.get("tier", "free") or "free").lower()
+            entry = {"key": key, "name": val.get("name", key), "url": val.get("url", ""), "genre": val.get("genre", ""), "country": val.get("country", "")}
+            if st_tier == "free":
+                free_list.append(entry)
+            elif st_tier == "pro" and tier in ("pro", "ultimate"):
+                pro_list.append(entry)
+        free_list.sort(key=lambda s: s["name"])
+        pro_list.sort(key=lambda s: s["name"])
+
+        custom_list = []
+        if db is not None and tier == "ultimate":
+            try:
+                for doc in db.custom_stations.find({"guildId": gid}, {"_id": 0}):
+                    custom_list.append({"key": doc.get("key", ""), "name": doc.get("name", ""), "url": doc.get("url", ""), "genre": doc.get("genre", ""), "custom": True})
+            except Exception:
+                pass
+
+        return {"free": free_list, "pro": pro_list, "custom": custom_list, "tier": tier}
+
+    # stations.json gilt fuer alle Guilds; Aenderungen daran erkennt das ETag ueber mtime/Groesse.
+    try:
+        stations_stat = STATIONS_FILE.stat()
+        stations_signature = f"{stations_stat.st_mtime_ns:x}-{stations_stat.st_size:x}"
+    except OSError:
+        stations_signature = "0"
+    etag = dashboard_etag("stations", get_dashboard_version(gid, "stations"), tier, stations_signature)
+    return dashboard_conditional_response(request, etag, build_payload)
 
 
 @app.get("/api/dashboard/custom-stations")
@@ -2554,6 +6328,7 @@ async def dashboard_custom_stations_create(request: Request, body: dict, serverI
         return json_error(400, f"Station mit Key '{key}' existiert bereits.")
 
     db.custom_stations.insert_one({"guildId": gid, "key": key, "name": name, "url": url, "genre": genre})
+    bump_dashboard_versions([gid], ("stations",))
     return {"success": True, "station": {"key": key, "name": name, "url": url, "genre": genre}}
 
 
@@ -2597,6 +6372,7 @@ async def dashboard_custom_stations_update(request: Request, body: dict, serverI
 
     if updates:
         db.custom_stations.update_one({"guildId": gid, "key": key}, {"$set": updates})
+        bump_dashboard_versions([gid], ("stations",))
 
     return {
         "success": True,
@@ -2627,6 +6403,8 @@ async def dashboard_custom_stations_delete(request: Request, serverId: str = "",
     gid = guild.get("id", "")
     if db is not None:
         r = db.custom_stations.delete_one({"guildId": gid, "key": key})
+        if r.deleted_count > 0:
+            bump_dashboard_versions([gid], ("stations",))
         return {"success": r.deleted_count > 0, "key": key}
     return {"success": False, "key": key}
 
@@ -2641,11 +6419,91 @@ async def dashboard_upsert_telemetry(request: Request, body: dict, serverId: str
     if not is_valid_server_id(serverId):
         return json_error(400, "ungueltige serverId")
 
-    data = load_dashboard_data()
-    telemetry_map = data.setdefault("telemetry", {})
-    telemetry_map[serverId] = normalize_dashboard_telemetry(body)
-    save_dashboard_data(data)
-    return {"success": True, "serverId": serverId, "telemetry": telemetry_map[serverId]}
+    telemetry = dashboard_repo_set("telemetry", serverId, normalize_dashboard_telemetry(body))
+    record_telemetry_points({serverId: telemetry})
+    return {"success": True, "serverId": serverId, "telemetry": telemetry}
+
+
+DASHBOARD_TELEMETRY_BATCH_MAX = 1000
+
+
+@app.post("/api/dashboard/telemetry/batch")
+async def dashboard_upsert_telemetry_batch(request: Request, body: dict):
+    """Telemetrie vieler Guilds in einem Call: {"items": [{"serverId": "...", ...telemetrie}]}"""
+    rate_limited = enforce_api_rate_limit(request, "write")
+    if rate_limited is not None:
+        return rate_limited
+    if not is_admin_request(request):
+        return json_error(401, "Unauthorized. API admin token required.")
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        return json_error(400, "items muss ein Array sein.")
+    if len(items) > DASHBOARD_TELEMETRY_BATCH_MAX:
+        return json_error(413, f"Maximal {DASHBOARD_TELEMETRY_BATCH_MAX} Guilds pro Batch.")
+
+    payloads = {}
+    results = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({"serverId": None, "status": "rejected", "error": "ungueltiger Eintrag"})
+            continue
+        server_id = str(item.get("serverId") or "").strip()
+        if not is_valid_server_id(server_id):
+            results.append({"serverId": server_id or None, "status": "rejected", "error": "ungueltige serverId"})
+            continue
+        raw = item.get("telemetry") if isinstance(item.get("telemetry"), dict) else item
+        if server_id in payloads:
+            # Doppelte Guild im Batch: der letzte Eintrag gewinnt.
+            for row in results:
+                if row["serverId"] == server_id and row["status"] == "accepted":
+                    row["status"] = "superseded"
+        payloads[server_id] = normalize_dashboard_telemetry(raw)
+        results.append({"serverId": server_id, "status": "accepted"})
+
+    dashboard_repo_set_many("telemetry", payloads)
+    record_telemetry_points(payloads)
+    accepted = sum(1 for row in results if row["status"] == "accepted")
+    return {
+        "success": True,
+        "accepted": accepted,
+        "rejected": sum(1 for row in results if row["status"] == "rejected"),
+        "results": results,
+    }
+
+
+def parse_due_events_time(raw_value, default_epoch):
+    value = str(raw_value or "").strip()
+    if not value:
+        return default_epoch
+    if value.isdigit():
+        return int(value)
+    parsed = parse_iso_datetime(value)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+@app.get("/api/dashboard/events/due")
+async def dashboard_due_events(request: Request, until: str = "", since: str = "", limit: int = 100):
+    rate_limited = enforce_api_rate_limit(request, "read")
+    if rate_limited is not None:
+        return rate_limited
+    if not is_admin_request(request):
+        return json_error(401, "Unauthorized. API admin token required.")
+    now_epoch = int(time.time())
+    until_epoch = parse_due_events_time(until, now_epoch)
+    since_epoch = parse_due_events_time(since, now_epoch - DUE_EVENTS_GRACE_SECONDS)
+    if until_epoch is None or since_epoch is None:
+        return json_error(400, "until/since muessen ISO-Zeitpunkte oder Unix-Sekunden sein.")
+    since_epoch = max(since_epoch, now_epoch - DUE_EVENTS_GRACE_SECONDS)
+    events = find_due_events(until_epoch, since_epoch, max(1, min(DUE_EVENTS_MAX_LIMIT, limit)))
+    return {
+        "since": datetime.fromtimestamp(since_epoch, timezone.utc).isoformat(),
+        "until": datetime.fromtimestamp(until_epoch, timezone.utc).isoformat(),
+        "events": events,
+    }
 
 
 @app.get("/api/dashboard/events")
@@ -2663,10 +6521,12 @@ async def dashboard_events_list(request: Request, serverId: str = ""):
     if TIER_RANK.get(guild.get("tier", "free"), 0) < TIER_RANK.get("pro", 1):
         return json_error(403, "Events sind erst ab Pro verfuegbar.")
 
-    data = load_dashboard_data()
-    events_map = data.get("events", {}) if isinstance(data.get("events"), dict) else {}
-    rows = events_map.get(guild.get("id"), []) if isinstance(events_map.get(guild.get("id")), list) else []
-    return {"serverId": guild.get("id"), "events": rows}
+    etag = dashboard_etag("events", get_dashboard_version(guild.get("id"), "events"), guild.get("tier", "free"))
+    return dashboard_conditional_response(
+        request,
+        etag,
+        lambda: {"serverId": guild.get("id"), "events": dashboard_repo_get("events", guild.get("id"))},
+    )
 
 
 @app.post("/api/dashboard/events")
@@ -2684,13 +6544,7 @@ async def dashboard_events_create(request: Request, body: dict, serverId: str =
     if TIER_RANK.get(guild.get("tier", "free"), 0) < TIER_RANK.get("pro", 1):
         return json_error(403, "Events sind erst ab Pro verfuegbar.")
 
-    event_payload = normalize_dashboard_event(body)
-    data = load_dashboard_data()
-    events_map = data.setdefault("events", {})
-    rows = events_map.setdefault(guild.get("id"), [])
-    rows.insert(0, event_payload)
-    events_map[guild.get("id")] = rows[:200]
-    save_dashboard_data(data)
+    event_payload = dashboard_repo_add_event(guild.get("id"), normalize_dashboard_event(body))
     return {"success": True, "event": event_payload}
 
 
@@ -2709,25 +6563,18 @@ async def dashboard_events_update(request: Request, event_id: str, body: dict, s
     if TIER_RANK.get(guild.get("tier", "free"), 0) < TIER_RANK.get("pro", 1):
         return json_error(403, "Events sind erst ab Pro verfuegbar.")
 
-    data = load_dashboard_data()
-    events_map = data.setdefault("events", {})
-    rows = events_map.setdefault(guild.get("id"), [])
-    updated = None
-    for index, row in enumerate(rows):
-        if str(row.get("id")) != str(event_id):
-            continue
+    def build_updated(row):
         merged = {**row, **(body if isinstance(body, dict) else {})}
         merged["id"] = str(row.get("id"))
         merged["createdAt"] = row.get("createdAt")
         updated = normalize_dashboard_event(merged)
         updated["id"] = str(row.get("id"))
         updated["createdAt"] = row.get("createdAt")
-        rows[index] = updated
-        break
+        return updated
+
+    updated = dashboard_repo_update_event(guild.get("id"), event_id, build_updated)
     if not updated:
         return json_error(404, "Event nicht gefunden.")
-    events_map[guild.get("id")] = rows
-    save_dashboard_data(data)
     return {"success": True, "event": updated}
 
 
@@ -2746,14 +6593,8 @@ async def dashboard_events_delete(request: Request, event_id: str, serverId: str
     if TIER_RANK.get(guild.get("tier", "free"), 0) < TIER_RANK.get("pro", 1):
         return json_error(403, "Events sind erst ab Pro verfuegbar.")
 
-    data = load_dashboard_data()
-    events_map = data.setdefault("events", {})
-    rows = events_map.setdefault(guild.get("id"), [])
-    next_rows = [row for row in rows if str(row.get("id")) != str(event_id)]
-    if len(next_rows) == len(rows):
+    if not dashboard_repo_delete_event(guild.get("id"), event_id):
         return json_error(404, "Event nicht gefunden.")
-    events_map[guild.get("id")] = next_rows
-    save_dashboard_data(data)
     return {"success": True, "eventId": str(event_id)}
 
 
@@ -2772,17 +6613,17 @@ async def dashboard_perms_get(request: Request, serverId: str = ""):
     if TIER_RANK.get(guild.get("tier", "free"), 0) < TIER_RANK.get("pro", 1):
         return json_error(403, "Berechtigungen sind erst ab Pro verfuegbar.")
 
-    data = load_dashboard_data()
-    perms_map = data.get("perms", {}) if isinstance(data.get("perms"), dict) else {}
-    payload = perms_map.get(guild.get("id"), {"commandRoleMap": {}, "updatedAt": None})
-    if not isinstance(payload, dict):
-        payload = {"commandRoleMap": {}, "updatedAt": None}
-    return {
-        "serverId": guild.get("id"),
-        "tier": guild.get("tier"),
-        "commandRoleMap": payload.get("commandRoleMap", {}),
-        "updatedAt": payload.get("updatedAt"),
-    }
+    def build_payload():
+        payload = dashboard_repo_get("perms", guild.get("id")) or {"commandRoleMap": {}, "updatedAt": None}
+        return {
+            "serverId": guild.get("id"),
+            "tier": guild.get("tier"),
+            "commandRoleMap": payload.get("commandRoleMap", {}),
+            "updatedAt": payload.get("updatedAt"),
+        }
+
+    etag = dashboard_etag("perms", get_dashboard_version(guild.get("id"), "perms"), guild.get("tier", "free"))
+    return dashboard_conditional_response(request, etag, build_payload)
 
 
 @app.put("/api/dashboard/perms")
@@ -2800,11 +6641,8 @@ async def dashboard_perms_put(request: Request, body: dict, serverId: str = ""):
     if TIER_RANK.get(guild.get("tier", "free"), 0) < TIER_RANK.get("pro", 1):
         return json_error(403, "Berechtigungen sind erst ab Pro verfuegbar.")
 
-    normalized = normalize_dashboard_perms(body)
-    data = load_dashboard_data()
-    perms_map = data.setdefault("perms", {})
-    perms_map[guild.get("id")] = normalized
-    save_dashboard_data(data)
+    normalized = dashboard_repo_set("perms", guild.get("id"), normalize_dashboard_perms(body))
+    invalidate_compiled_dashboard_perms(guild.get("id"))
     return {
         "success": True,
         "serverId": guild.get("id"),
@@ -2813,6 +6651,33 @@ async def dashboard_perms_put(request: Request, body: dict, serverId: str = ""):
     }
 
 
+@app.post("/api/dashboard/perms/check")
+async def dashboard_perms_check(request: Request, body: dict, serverId: str = ""):
+    """Viele (Rollen, Befehl)-Paare in einem Call: {"checks": [{"roles": ["..."], "command": "play"}]}"""
+    rate_limited = enforce_api_rate_limit(request, "read")
+    if rate_limited is not None:
+        return rate_limited
+    if not is_admin_request(request):
+        return json_error(401, "Unauthorized. API admin token required.")
+    if not is_valid_server_id(serverId):
+        return json_error(400, "ungueltige serverId")
+    checks = body.get("checks") if isinstance(body, dict) else None
+    if not isinstance(checks, list):
+        return json_error(400, "checks muss ein Array sein.")
+    if len(checks) > DASHBOARD_PERMS_CHECK_MAX:
+        return json_error(413, f"Maximal {DASHBOARD_PERMS_CHECK_MAX} Pruefungen pro Request.")
+
+    compiled = get_compiled_dashboard_perms(serverId)
+    results = []
+    for check in checks:
+        check = check if isinstance(check, dict) else {}
+        command = clip_text(check.get("command"), 64).lstrip("/").lower()
+        roles = [str(role) for role in check.get("roles") or [] if role is not None] if isinstance(check.get("roles"), list) else []
+        allowed, restricted = check_dashboard_permission(compiled, roles, command)
+        results.append({"command": command, "allowed": allowed, "restricted": restricted})
+    return {"serverId": serverId, "updatedAt": compiled.get("updatedAt"), "results": results}
+
+
 # === Dashboard License ===
 
 @app.get("/api/dashboard/license")
@@ -2829,35 +6694,38 @@ async def dashboard_license(request: Request, serverId: str = ""):
         return json_error(403, "Kein Zugriff auf diesen Server.")
 
     tier = guild.get("tier", "free")
-    lic = get_server_license(guild.get("id"))
-    tier_config = TIERS.get(tier, TIERS["free"])
-
-    result = {
-        "serverId": guild.get("id"),
-        "tier": tier,
-        "tierName": tier_config.get("name", "Free"),
-        "dashboardEnabled": guild.get("dashboardEnabled", False),
-        "ultimateEnabled": guild.get("ultimateEnabled", False),
-        "license": None,
-    }
-
-    if lic:
-        linked_servers = lic.get("linkedServerIds", [])
-        seats = max(1, int(lic.get("seats", 1) or 1))
-        result["license"] = {
-            "plan": lic.get("plan", lic.get("tier", "free")),
-            "seats": seats,
-            "seatsUsed": len(linked_servers) if isinstance(linked_servers, list) else 0,
-            "active": not bool(lic.get("expired")),
-            "expired": bool(lic.get("expired")),
-            "expiresAt": lic.get("expiresAt"),
-            "remainingDays": lic.get("remainingDays", 0),
-            "billingPeriod": lic.get("billingPeriod", "monthly"),
-            "durationMonths": lic.get("durationMonths"),
-            "emailMasked": mask_email(lic.get("email") or lic.get("contactEmail") or ""),
+    # ETag aus Lizenz-Version und Resttagen: ein passendes If-None-Match spart das Laden der Lizenz.
+    etag = dashboard_etag("license", get_server_license_version(guild.get("id")), tier)
+
+    def build_payload():
+        lic = get_server_license(guild.get("id"))
+        tier_config = TIERS.get(tier, TIERS["free"])
+        result = {
+            "serverId": guild.get("id"),
+            "tier": tier,
+            "tierName": tier_config.get("name", "Free"),
+            "dashboardEnabled": guild.get("dashboardEnabled", False),
+            "ultimateEnabled": guild.get("ultimateEnabled", False),
+            "license": None,
         }
+        if lic:
+            linked_servers = lic.get("linkedServerIds", [])
+            seats = max(1, int(lic.get("seats", 1) or 1))
+            result["license"] = {
+                "plan": lic.get("plan", lic.get("tier", "free")),
+                "seats": seats,
+                "seatsUsed": len(linked_servers) if isinstance(linked_servers, list) else 0,
+                "active": not bool(lic.get("expired")),
+                "expired": bool(lic.get("expired")),
+                "expiresAt": lic.get("expiresAt"),
+                "remainingDays": lic.get("remainingDays", 0),
+                "billingPeriod": lic.get("billingPeriod", "monthly"),
+                "durationMonths": lic.get("durationMonths"),
+                "emailMasked": mask_email(lic.get("email") or lic.get("contactEmail") or ""),
+            }
+        return result
 
-    return result
+    return dashboard_conditional_response(request, etag, build_payload)
 
 
 @app.get("/api/dashboard/emojis")
@@ -2919,17 +6787,7 @@ async def check_premium(request: Request, serverId: str = "", licenseKey: str =
 
     # Lizenz per Key suchen
     if licenseKey:
-        data = load_premium()
-        licenses = data.get("licenses", {})
-        lic = licenses.get(licenseKey)
-        resolved_key = licenseKey
-        if not lic:
-            lower_query = licenseKey.lower()
-            for key, value in licenses.items():
-                if str(key).lower() == lower_query:
-                    lic = value
-                    resolved_key = key
-                    break
+        resolved_key, lic = premium_repo_resolve_license_key(licenseKey)
         if not lic:
             return json_error(404, "Lizenz-Key nicht gefunden.")
         expired = is_expired(lic)
@@ -3171,9 +7029,22 @@ async def premium_offers(request: Request):
         return json_error(401, "Unauthorized. API admin token required.")
 
     if request.method == "GET":
-        include_inactive = request.query_params.get("includeInactive", "1") != "0"
-        offers = list_offers(include_inactive=include_inactive)
-        return {"offers": offers}
+        params = request.query_params
+        active = parse_list_bool(params.get("active"))
+        if params.get("includeInactive", "1") == "0":
+            active = True
+        try:
+            offers, next_cursor = list_offers(
+                active=active,
+                tier=parse_list_tier(params.get("tier")),
+                updated_from=normalize_list_date(params.get("from")),
+                updated_to=normalize_list_date(params.get("to"), end_of_day=True),
+                cursor=params.get("cursor"),
+                limit=parse_int(params.get("limit"), ADMIN_LIST_MAX_LIMIT),
+            )
+        except ValueError as exc:
+            return json_error(400, str(exc))
+        return {"offers": offers, "nextCursor": next_cursor}
 
     if request.method in ("POST", "PATCH"):
         try:
@@ -3232,13 +7103,47 @@ async def premium_offer_active(request: Request, body: dict):
 
 
 @app.get("/api/premium/redemptions")
-async def premium_redemptions(request: Request, limit: int = 100):
+async def premium_redemptions(
+    request: Request,
+    limit: int = 100,
+    cursor: str = "",
+    code: str = "",
+    tier: str = "",
+    dateFrom: str = Query("", alias="from"),
+    dateTo: str = Query("", alias="to"),
+):
+    rate_limited = enforce_api_rate_limit(request, "read")
+    if rate_limited is not None:
+        return rate_limited
+    if not is_admin_request(request):
+        return json_error(401, "Unauthorized. API admin token required.")
+    try:
+        redemptions, next_cursor = list_recent_redemptions(
+            limit,
+            code=sanitize_offer_code(code) or None,
+            tier=parse_list_tier(tier),
+            processed_from=normalize_list_date(dateFrom),
+            processed_to=normalize_list_date(dateTo, end_of_day=True),
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        return json_error(400, str(exc))
+    return {"redemptions": redemptions, "nextCursor": next_cursor}
+
+
+@app.get("/api/premium/licenses/expiring")
+async def premium_licenses_expiring(request: Request, days: int = 7, status: str = "expiring", limit: int = 100):
     rate_limited = enforce_api_rate_limit(request, "read")
     if rate_limited is not None:
         return rate_limited
     if not is_admin_request(request):
         return json_error(401, "Unauthorized. API admin token required.")
-    return {"redemptions": list_recent_redemptions(limit)}
+    status = str(status or "").strip().lower()
+    if status not in ("expiring", "expired"):
+        return json_error(400, "status muss 'expiring' oder 'expired' sein.")
+    days = max(1, min(365, days))
+    licenses = list_licenses_by_expiry(expired=status == "expired", within_days=days, limit=limit)
+    return {"success": True, "status": status, "days": days, "licenses": licenses}
 
 
 @app.get("/api/premium/pricing")
@@ -3515,3 +7420,47 @@ async def verify_premium(request: Request, body: dict):
         return {"success": False, "message": "Zahlung nicht abgeschlossen."}
     except Exception as e:
         return json_error(500, f"Verifizierung fehlgeschlagen: {clip_text(e)}")
+
+
+def run_cli(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OmniFM legacy backend maintenance")
+    parser.add_argument("command", choices=["ensure-indexes", "verify-indexes", "apply-stats-retention"])
+    args = parser.parse_args(argv)
+
+    if db is None:
+        print("MongoDB nicht verbunden (MONGO_URL/DB_NAME pruefen).")
+        return 1
+
+    if args.command == "apply-stats-retention":
+        summary = run_stats_retention_sweep()
+        if summary is None:
+            print("Retention-Sweep laeuft bereits in einem anderen Prozess.")
+            return 1
+        print(
+            f"[{'warn' if summary['leaseLost'] else 'ok'}] {summary['guilds']} Guilds, {summary['snapshots']} Snapshots, "
+            f"{summary['sessions']} Sessions archiviert, {summary['skipped']} Guilds mit laufendem Reset uebersprungen, "
+            f"{summary['telemetryPoints']} Telemetrie-Punkte gekuerzt"
+        )
+        if summary["leaseLost"]:
+            print("Lease verloren, Sweep abgebrochen; ein anderer Prozess macht weiter.")
+            return 1
+        return 0
+
+    if args.command == "ensure-indexes":
+        results = ensure_mongo_indexes()
+    else:
+        # Nicht angelegte Indexe (z. B. Unique-Kollisionen) gehoeren mit in den Bericht.
+        results = [entry for entry in ensure_mongo_indexes() if not entry.get("ok")] + verify_mongo_query_plans()
+
+    failed = [entry for entry in results if not entry.get("ok")]
+    for entry in results:
+        status = "ok" if entry.get("ok") else "FAIL"
+        detail = entry.get("error") or ",".join(entry.get("stages", [])) or entry.get("index", "")
+        print(f"[{status}] {entry.get('collection')} {entry.get('query', '')} {detail}".rstrip())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run_cli())
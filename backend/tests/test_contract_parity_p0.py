@@ -136,12 +136,31 @@ def test_offer_preview_empty_coupon_success_and_invalid_coupon_error(api_client)
 def test_admin_endpoints_require_admin_token(api_client):
     discord_status = api_client.get(f"{BASE_URL}/api/discordbotlist/status", timeout=15)
     offers = api_client.get(f"{BASE_URL}/api/premium/offers", timeout=15)
+    expiring = api_client.get(f"{BASE_URL}/api/premium/licenses/expiring", timeout=15)
+    telemetry_batch = api_client.post(f"{BASE_URL}/api/dashboard/telemetry/batch", json={"items": []}, timeout=15)
+    due_events = api_client.get(f"{BASE_URL}/api/dashboard/events/due", timeout=15)
+    perms_check = api_client.post(
+        f"{BASE_URL}/api/dashboard/perms/check",
+        params={"serverId": "123456789012345678"},
+        json={"checks": []},
+        timeout=15,
+    )
+    stats_ingest = api_client.post(f"{BASE_URL}/api/dashboard/stats/ingest", json={"events": []}, timeout=15)
 
     assert discord_status.status_code == 401
     assert offers.status_code == 401
+    assert expiring.status_code == 401
+    assert telemetry_batch.status_code == 401
+    assert due_events.status_code == 401
+    assert perms_check.status_code == 401
+    assert stats_ingest.status_code == 401
 
     discord_data = discord_status.json()
     offers_data = offers.json()
 
     assert "error" in discord_data
     assert "error" in offers_data
+    assert "error" in expiring.json()
+    assert "error" in telemetry_batch.json()
+    assert "error" in due_events.json()
+    assert "error" in perms_check.json()
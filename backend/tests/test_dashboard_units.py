@@ -0,0 +1,514 @@
+"""
+Dashboard repository unit tests (no running server required)
+Covers the legacy backend's per-guild dashboard storage:
+- per-guild dashboard documents: targeted writes and the migration from dashboard_state
+- dashboard_repo_stats_source: one aggregation on MongoDB 4.4+, per-collection queries otherwise
+- ETag / If-None-Match: settings written by either backend, dashboard.json versions read only after a change
+- find_due_events: the process-wide heap of upcoming events and its lazy deletion
+- compiled command permissions: role bitsets and /api/dashboard/perms/check
+- /api/dashboard/telemetry/batch: per-item results and one write for the whole batch
+- file storage: the shared dashboard.json and the opt-in per-guild shards with their one-time migration
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import OperationFailure
+
+# Import without MongoDB; tests that need one swap in mongomock.
+os.environ["MONGO_URL"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+
+GUILD_ID = "123456789012345678"
+AUTH = {"Authorization": "Bearer unit-test-session"}
+
+
+@pytest.fixture
+def dashboard_mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().omnifm_test
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setitem(server.DASHBOARD_STATS_SOURCE_PIPELINE, "supported", True)
+    database.dashboard_events.insert_one({"_id": GUILD_ID, "events": [
+        {"id": "a", "title": "Morning", "enabled": True},
+        {"id": "b", "title": "Night", "enabled": False},
+    ]})
+    database.dashboard_perms.insert_one({"_id": GUILD_ID, "commandRoleMap": {"play": ["DJ"]}, "updatedAt": "x"})
+    database.dashboard_telemetry.insert_one({"_id": GUILD_ID, "listenersNow": 4, "peakListeners": 9, "history": [1, 2]})
+    return database
+
+
+@pytest.fixture
+def empty_mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().omnifm_test
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+class TestPerGuildDocuments:
+    """One document per guild and section instead of the global dashboard_state document"""
+
+    def test_event_writes_target_the_guild_document(self, monkeypatch, empty_mongo):
+        monkeypatch.setattr(server, "DASHBOARD_EVENTS_MAX", 3)
+        for index in range(4):
+            server.dashboard_repo_add_event(GUILD_ID, {"id": f"e{index}", "title": str(index)})
+        assert [row["id"] for row in server.dashboard_repo_get("events", GUILD_ID)] == ["e3", "e2", "e1"]
+
+        assert server.dashboard_repo_update_event(GUILD_ID, "e2", lambda row: {**row, "title": "changed"})["title"] == "changed"
+        assert server.dashboard_repo_update_event(GUILD_ID, "missing", lambda row: row) is None
+        assert server.dashboard_repo_delete_event(GUILD_ID, "e1") is True
+        assert server.dashboard_repo_delete_event(GUILD_ID, "e1") is False
+        assert server.dashboard_repo_get("events", GUILD_ID) == [{"id": "e3", "title": "3"}, {"id": "e2", "title": "changed"}]
+        assert empty_mongo.dashboard_versions.find_one({"_id": GUILD_ID}) == {"_id": GUILD_ID, "events": 6, "stats": 6}
+        assert empty_mongo.dashboard_state.count_documents({}) == 0
+
+    def test_migration_spreads_the_global_document(self, empty_mongo):
+        other_guild = "223456789012345678"
+        empty_mongo.dashboard_state.insert_one({
+            "_id": "dashboard_state",
+            "events": {GUILD_ID: [{"id": "a"}, "broken"], other_guild: "not a list"},
+            "perms": {GUILD_ID: {"commandRoleMap": {"play": ["Old"]}}, other_guild: {"commandRoleMap": {}}},
+            "telemetry": {GUILD_ID: {"listenersNow": 5, "updatedAt": "2026-01-01T00:00:00+00:00"}},
+        })
+        # Bereits pro Guild geschrieben: neuer als der Altbestand.
+        empty_mongo.dashboard_perms.insert_one({"_id": GUILD_ID, "commandRoleMap": {"play": ["New"]}})
+
+        assert server.migrate_dashboard_state() == 4
+        assert empty_mongo.dashboard_state.count_documents({}) == 0
+        assert server.dashboard_repo_get("events", GUILD_ID) == [{"id": "a"}]
+        assert server.dashboard_repo_get("events", other_guild) == []
+        assert server.dashboard_repo_get("perms", GUILD_ID) == {"commandRoleMap": {"play": ["New"]}}
+        telemetry = server.dashboard_repo_get("telemetry", GUILD_ID)
+        assert (telemetry["listenersNow"], telemetry["updatedAt"]) == (5, "2026-01-01T00:00:00+00:00")
+        assert server.migrate_dashboard_state() == 0
+
+
+class AggregateOnly:
+    """Collection stand-in that answers aggregate() and fails any other query"""
+
+    def __init__(self, docs=None, error=None):
+        self.docs = docs or []
+        self.error = error
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        if self.error:
+            raise self.error
+        return iter([dict(doc) for doc in self.docs])
+
+    def find_one(self, *args, **kwargs):
+        raise AssertionError("stats source should come from the aggregation")
+
+
+class TestDashboardStatsSource:
+    """/api/dashboard/stats reads events, perms and telemetry in one round trip"""
+
+    def test_single_aggregation_returns_all_sections(self, monkeypatch):
+        events = AggregateOnly([
+            {"_section": "events", "events": [{"enabled": True}]},
+            {"_section": "perms", "commandRoleMap": {"play": ["DJ"]}},
+            {"_section": "telemetry", "listenersNow": 4},
+        ])
+        monkeypatch.setattr(server, "db", SimpleNamespace(dashboard_events=events))
+        monkeypatch.setitem(server.DASHBOARD_STATS_SOURCE_PIPELINE, "supported", True)
+
+        rows, role_map, telemetry = server.dashboard_repo_stats_source(GUILD_ID)
+        assert rows == [{"enabled": True}]
+        assert role_map == {"play": ["DJ"]}
+        assert telemetry == {"listenersNow": 4}
+        assert len(events.pipelines) == 1
+        unions = [stage["$unionWith"]["coll"] for stage in events.pipelines[0] if "$unionWith" in stage]
+        assert unions == ["dashboard_perms", "dashboard_telemetry"]
+
+    def test_missing_documents_give_empty_sections(self, monkeypatch):
+        monkeypatch.setattr(server, "db", SimpleNamespace(dashboard_events=AggregateOnly([])))
+        monkeypatch.setitem(server.DASHBOARD_STATS_SOURCE_PIPELINE, "supported", True)
+        assert server.dashboard_repo_stats_source(GUILD_ID) == ([], None, {})
+
+    def test_basic_tier_projects_only_basic_telemetry_fields(self):
+        pipeline = server.build_dashboard_stats_source_pipeline(GUILD_ID, advanced=False)
+        telemetry_stage = pipeline[-1]["$unionWith"]["pipeline"][1]["$project"]
+        assert set(telemetry_stage) == {"_id", *server.DASHBOARD_TELEMETRY_BASIC_FIELDS}
+        advanced = server.build_dashboard_stats_source_pipeline(GUILD_ID, advanced=True)
+        assert advanced[-1]["$unionWith"]["pipeline"][1]["$project"] == {"_id": 0}
+
+    def test_servers_without_union_with_use_single_queries(self, dashboard_mongo):
+        """mongomock has no $unionWith, like MongoDB < 4.4"""
+        rows, role_map, telemetry = server.dashboard_repo_stats_source(GUILD_ID)
+        assert rows == [{"enabled": True}, {"enabled": False}]
+        assert role_map == {"play": ["DJ"]}
+        assert telemetry == {"listenersNow": 4, "peakListeners": 9}
+        _, _, advanced = server.dashboard_repo_stats_source(GUILD_ID, advanced=True)
+        assert advanced == {"listenersNow": 4, "peakListeners": 9, "history": [1, 2]}
+
+    def test_unknown_stage_disables_the_pipeline(self, monkeypatch, dashboard_mongo):
+        failing = AggregateOnly(error=OperationFailure("Unrecognized pipeline stage name: '$unionWith'", code=40324))
+        monkeypatch.setattr(dashboard_mongo.dashboard_events, "aggregate", failing.aggregate)
+
+        assert server.dashboard_repo_stats_source(GUILD_ID)[1] == {"play": ["DJ"]}
+        assert server.DASHBOARD_STATS_SOURCE_PIPELINE["supported"] is False
+        server.dashboard_repo_stats_source(GUILD_ID)
+        assert len(failing.pipelines) == 1
+
+
+@pytest.fixture
+def dashboard_client(monkeypatch):
+    """TestClient with a logged-in session that manages GUILD_ID on the Pro tier"""
+    monkeypatch.setitem(server.DASHBOARD_SESSION_STORE, "unit-test-session", {
+        "expiresAt": server.time.time() + 3600,
+        "guilds": [{"id": GUILD_ID, "name": "Unit", "permissions": "8"}],
+    })
+    monkeypatch.setattr(server, "get_tiers_for_servers", lambda ids: {guild_id: "pro" for guild_id in ids})
+    monkeypatch.setattr(server, "enforce_api_rate_limit", lambda request, scope: None)
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def dashboard_file(monkeypatch, tmp_path):
+    """Shared dashboard.json (DASHBOARD_SHARDED_FILES=0) in tmp_path"""
+    monkeypatch.setattr(server, "db", None)
+    monkeypatch.setattr(server, "DASHBOARD_SHARDED_FILES", False)
+    monkeypatch.setattr(server, "DASHBOARD_FILE", tmp_path / "dashboard.json")
+    monkeypatch.setattr(server, "DASHBOARD_FILE_VERSIONS_CACHE", {"entry": (None, {})})
+    return tmp_path / "dashboard.json"
+
+
+def conditional_get(client, path, etag):
+    return client.get(path, params={"serverId": GUILD_ID}, headers={**AUTH, "If-None-Match": etag})
+
+
+class TestDashboardSettingsEtag:
+    """/api/dashboard/settings: the ETag follows guild_settings, whoever wrote it"""
+
+    def test_matching_etag_returns_304(self, dashboard_client, dashboard_mongo):
+        first = dashboard_client.get("/api/dashboard/settings", params={"serverId": GUILD_ID}, headers=AUTH)
+        assert first.status_code == 200
+        assert first.json()["fallbackStation"] == ""
+        again = conditional_get(dashboard_client, "/api/dashboard/settings", first.headers["etag"])
+        assert again.status_code == 304
+        assert again.headers["etag"] == first.headers["etag"]
+
+    def test_write_without_version_bump_changes_the_etag(self, dashboard_client, dashboard_mongo):
+        """The Node.js backend updates guild_settings directly and never touches dashboard_versions"""
+        etag = dashboard_client.get("/api/dashboard/settings", params={"serverId": GUILD_ID}, headers=AUTH).headers["etag"]
+        dashboard_mongo.guild_settings.update_one(
+            {"guildId": GUILD_ID}, {"$set": {"fallbackStation": "jazz", "voiceGuard": {"enabled": True}}}, upsert=True,
+        )
+        changed = conditional_get(dashboard_client, "/api/dashboard/settings", etag)
+        assert changed.status_code == 200
+        assert changed.json()["fallbackStation"] == "jazz"
+        assert changed.headers["etag"] != etag
+        assert dashboard_mongo.dashboard_versions.count_documents({}) == 0
+
+    def test_fields_outside_the_response_keep_the_etag(self, dashboard_client, dashboard_mongo):
+        dashboard_mongo.guild_settings.insert_one({"guildId": GUILD_ID, "fallbackStation": "rock"})
+        etag = dashboard_client.get("/api/dashboard/settings", params={"serverId": GUILD_ID}, headers=AUTH).headers["etag"]
+        dashboard_mongo.guild_settings.update_one({"guildId": GUILD_ID}, {"$set": {"voiceGuard": {"enabled": True}}})
+        assert conditional_get(dashboard_client, "/api/dashboard/settings", etag).status_code == 304
+
+
+class TestDashboardFileEtag:
+    """Shared dashboard.json: a 304 only needs stat(), writes from either backend change the ETag"""
+
+    def test_304_does_not_parse_the_file_again(self, monkeypatch, dashboard_client, dashboard_file):
+        server.dashboard_repo_add_event(GUILD_ID, server.normalize_dashboard_event({"title": "Morning"}))
+        etag = dashboard_client.get("/api/dashboard/events", params={"serverId": GUILD_ID}, headers=AUTH).headers["etag"]
+        reads = []
+        original = server.read_dashboard_guild_file
+        monkeypatch.setattr(server, "read_dashboard_guild_file", lambda path: reads.append(path) or original(path))
+
+        assert conditional_get(dashboard_client, "/api/dashboard/events", etag).status_code == 304
+        assert reads == []
+
+    def test_python_and_node_writes_change_the_etag(self, dashboard_client, dashboard_file):
+        server.dashboard_repo_add_event(GUILD_ID, server.normalize_dashboard_event({"title": "Morning"}))
+        etag = dashboard_client.get("/api/dashboard/events", params={"serverId": GUILD_ID}, headers=AUTH).headers["etag"]
+        assert etag.startswith('"events.1-')
+
+        server.dashboard_repo_add_event(GUILD_ID, server.normalize_dashboard_event({"title": "Night"}))
+        after_python = conditional_get(dashboard_client, "/api/dashboard/events", etag)
+        assert after_python.status_code == 200
+        assert after_python.headers["etag"].startswith('"events.2-')
+        assert len(after_python.json()["events"]) == 2
+
+        # Node.js schreibt dashboard.json ohne Versionszaehler.
+        data = json.loads(dashboard_file.read_text(encoding="utf-8"))
+        data["events"][GUILD_ID] = data["events"][GUILD_ID][:1]
+        dashboard_file.write_text(json.dumps(data), encoding="utf-8")
+        os.utime(dashboard_file, ns=(1, 1))
+        after_node = conditional_get(dashboard_client, "/api/dashboard/events", after_python.headers["etag"])
+        assert after_node.status_code == 200
+        assert after_node.headers["etag"] == '"events.2-1.pro"'
+        assert len(after_node.json()["events"]) == 1
+
+
+@pytest.fixture
+def due_index(monkeypatch, dashboard_file):
+    monkeypatch.setattr(server, "DUE_EVENTS_INDEX", {"heap": [], "entries": {}, "guilds": {}, "builtAt": 0.0, "seq": 0, "stale": 0})
+    return server.DUE_EVENTS_INDEX
+
+
+def scheduled_event(event_id, minutes, **fields):
+    starts_at = datetime.fromtimestamp(int(time.time()) + minutes * 60, timezone.utc).isoformat()
+    return server.normalize_dashboard_event({"id": event_id, "startsAt": starts_at, "timezone": "UTC", **fields})
+
+
+def due_ids(minutes_ahead, limit=100, since_minutes=-60):
+    now = int(time.time())
+    due = server.find_due_events(now + minutes_ahead * 60, now + since_minutes * 60, limit)
+    return [(row["serverId"], row["event"]["id"]) for row in due]
+
+
+class TestDueEventsIndex:
+    """/api/dashboard/events/due walks only the part of the heap before until"""
+
+    def test_rebuild_reads_all_guilds_in_start_order(self, due_index, dashboard_file):
+        other_guild = "223456789012345678"
+        dashboard_file.write_text(json.dumps({"events": {
+            GUILD_ID: [scheduled_event("late", 50), scheduled_event("off", 5, enabled=False), scheduled_event("soon", 10)],
+            other_guild: [scheduled_event("middle", 20), {"id": "broken", "startsAt": "not a date"}],
+        }}), encoding="utf-8")
+        assert due_ids(60) == [(GUILD_ID, "soon"), (other_guild, "middle"), (GUILD_ID, "late")]
+        assert due_ids(30, limit=1) == [(GUILD_ID, "soon")]
+        assert due_ids(5) == []
+
+    def test_naive_start_uses_the_event_timezone(self):
+        event = {"startsAt": "2026-07-01T20:00:00", "timezone": "Europe/Berlin"}
+        assert server.event_start_epoch(event) == int(datetime(2026, 7, 1, 18, 0, tzinfo=timezone.utc).timestamp())
+        assert server.event_start_epoch({"startsAt": "2026-07-01T20:00:00", "timezone": "Not/AZone"}) == int(
+            datetime(2026, 7, 1, 20, 0, tzinfo=timezone.utc).timestamp()
+        )
+
+    def test_writes_replace_entries_lazily(self, due_index):
+        server.dashboard_repo_add_event(GUILD_ID, scheduled_event("a", 10))
+        server.dashboard_repo_add_event(GUILD_ID, scheduled_event("b", 20))
+        assert due_ids(60) == [(GUILD_ID, "a"), (GUILD_ID, "b")]
+
+        server.dashboard_repo_update_event(GUILD_ID, "a", lambda row: {**row, "startsAt": scheduled_event("a", 30)["startsAt"]})
+        assert due_ids(60) == [(GUILD_ID, "b"), (GUILD_ID, "a")]
+        server.dashboard_repo_update_event(GUILD_ID, "b", lambda row: {**row, "enabled": False})
+        server.dashboard_repo_delete_event(GUILD_ID, "a")
+        assert due_ids(60) == []
+        assert due_index["entries"] == {}
+
+    def test_past_events_leave_the_index_after_the_grace_period(self, due_index):
+        server.dashboard_repo_add_event(GUILD_ID, scheduled_event("old", -120))
+        server.dashboard_repo_add_event(GUILD_ID, scheduled_event("recent", -10))
+        assert due_ids(60) == [(GUILD_ID, "recent")]
+        assert list(due_index["entries"]) == [(GUILD_ID, "recent")]
+
+    def test_matches_a_full_sort(self, due_index):
+        rng = random.Random(18)
+        events = [scheduled_event(f"e{index}", rng.randint(-50, 600)) for index in range(300)]
+        server.update_dashboard_guilds([GUILD_ID], lambda _, payload: payload.update(events=events) or True)
+        server.rebuild_due_events_index()
+        for event in events[:100]:
+            server.due_events_index_update(GUILD_ID, {**event, "startsAt": scheduled_event("x", rng.randint(-50, 600))["startsAt"]})
+
+        def brute_force(until_epoch, since_epoch, limit):
+            rows = sorted(
+                (epoch, seq, key)
+                for key, (epoch, seq, _) in due_index["entries"].items()
+                if since_epoch <= epoch <= until_epoch
+            )
+            return [key for _, _, key in rows[:limit]]
+
+        now = int(time.time())
+        for minutes, limit in ((30, 100), (300, 25), (700, 1000)):
+            expected = brute_force(now + minutes * 60, now - 3600, limit)
+            assert due_ids(minutes, limit=limit) == expected
+
+
+class TestCompiledCommandPerms:
+    """commandRoleMap compiled into role bits and per-command masks"""
+
+    def test_roles_share_bits_across_commands(self):
+        compiled = server.compile_dashboard_perms({"play": ["DJ", "111"], "stop": ["DJ"], "help": []})
+        assert compiled["roleBits"] == {"DJ": 0, "111": 1}
+        assert compiled["commandMasks"] == {"play": 0b11, "stop": 0b01, "help": 0}
+
+    def test_check_results(self):
+        compiled = server.compile_dashboard_perms({"play": ["DJ", "111"], "help": []})
+        assert server.check_dashboard_permission(compiled, ["111"], "play") == (True, True)
+        assert server.check_dashboard_permission(compiled, ["Member"], "play") == (False, True)
+        assert server.check_dashboard_permission(compiled, [], "help") == (True, False)
+        assert server.check_dashboard_permission(compiled, [], "volume") == (True, False)
+
+    def test_matches_a_set_based_check(self):
+        rng = random.Random(20)
+        roles = [f"role{index}" for index in range(80)]
+        role_map = {f"cmd{index}": rng.sample(roles, rng.randint(0, 6)) for index in range(40)}
+        compiled = server.compile_dashboard_perms(role_map)
+        for _ in range(500):
+            command = f"cmd{rng.randint(0, 45)}"
+            held = rng.sample(roles, rng.randint(0, 5))
+            allowed_roles = set(role_map.get(command) or [])
+            expected = (not allowed_roles or bool(allowed_roles & set(held)), bool(allowed_roles))
+            assert server.check_dashboard_permission(compiled, held, command) == expected
+
+    def test_check_endpoint_sees_saved_perms_immediately(self, monkeypatch, dashboard_client, dashboard_file):
+        monkeypatch.setattr(server, "ADMIN_API_TOKEN", "unit-admin")
+        monkeypatch.setattr(server, "DASHBOARD_PERMS_CACHE", {})
+        admin = {"X-Admin-Token": "unit-admin"}
+        checks = {"checks": [{"roles": ["DJ"], "command": "/Play"}, {"roles": ["Member"], "command": "play"}]}
+
+        before = dashboard_client.post("/api/dashboard/perms/check", params={"serverId": GUILD_ID}, headers=admin, json=checks)
+        assert [row["allowed"] for row in before.json()["results"]] == [True, True]
+
+        saved = dashboard_client.put(
+            "/api/dashboard/perms", params={"serverId": GUILD_ID}, headers=AUTH, json={"commandRoleMap": {"play": ["DJ"]}},
+        )
+        assert saved.status_code == 200
+        after = dashboard_client.post("/api/dashboard/perms/check", params={"serverId": GUILD_ID}, headers=admin, json=checks)
+        assert after.json()["results"] == [
+            {"command": "play", "allowed": True, "restricted": True},
+            {"command": "play", "allowed": False, "restricted": True},
+        ]
+
+    def test_check_endpoint_rejects_bad_requests(self, monkeypatch, dashboard_client, dashboard_file):
+        monkeypatch.setattr(server, "ADMIN_API_TOKEN", "unit-admin")
+        admin = {"X-Admin-Token": "unit-admin"}
+        too_many = {"checks": [{"roles": [], "command": "play"}] * (server.DASHBOARD_PERMS_CHECK_MAX + 1)}
+        assert dashboard_client.post("/api/dashboard/perms/check", params={"serverId": GUILD_ID}, json=too_many).status_code == 401
+        assert dashboard_client.post("/api/dashboard/perms/check", params={"serverId": GUILD_ID}, headers=admin, json=too_many).status_code == 413
+        assert dashboard_client.post("/api/dashboard/perms/check", params={"serverId": "x"}, headers=admin, json={"checks": []}).status_code == 400
+        assert dashboard_client.post("/api/dashboard/perms/check", params={"serverId": GUILD_ID}, headers=admin, json={"checks": {}}).status_code == 400
+
+
+@pytest.fixture
+def dashboard_shards(monkeypatch, tmp_path):
+    """DASHBOARD_SHARDED_FILES=1 with dashboard.json and dashboard/ in tmp_path"""
+    monkeypatch.setattr(server, "db", None)
+    monkeypatch.setattr(server, "DASHBOARD_SHARDED_FILES", True)
+    monkeypatch.setattr(server, "DASHBOARD_FILE", tmp_path / "dashboard.json")
+    monkeypatch.setattr(server, "DASHBOARD_DIR", tmp_path / "dashboard")
+    monkeypatch.setattr(server, "DASHBOARD_SHARD_MIGRATION", {"done": False})
+    return tmp_path
+
+
+class TestDashboardFileStorage:
+    """Shared dashboard.json by default, per-guild files with DASHBOARD_SHARDED_FILES=1"""
+
+    def test_shared_file_keeps_sections_it_does_not_own(self, dashboard_file):
+        other_guild = "223456789012345678"
+        dashboard_file.write_text(json.dumps({
+            "authSessions": {"token": {"user": "1"}},
+            "perms": {other_guild: {"commandRoleMap": {"stop": ["Mod"]}}},
+        }), encoding="utf-8")
+        server.dashboard_repo_set("perms", GUILD_ID, {"commandRoleMap": {"play": ["DJ"]}})
+
+        data = json.loads(dashboard_file.read_text(encoding="utf-8"))
+        assert data["authSessions"] == {"token": {"user": "1"}}
+        assert data["perms"][other_guild] == {"commandRoleMap": {"stop": ["Mod"]}}
+        assert data["perms"][GUILD_ID] == {"commandRoleMap": {"play": ["DJ"]}}
+        assert data["versions"][GUILD_ID] == {"perms": 1, "stats": 1}
+        assert not list(dashboard_file.parent.glob(".*.tmp"))
+
+    def test_shard_path_uses_the_last_two_id_digits(self, dashboard_shards):
+        assert server.dashboard_guild_path(GUILD_ID) == dashboard_shards / "dashboard" / "78" / f"{GUILD_ID}.json"
+        assert server.dashboard_guild_path("7").parent.name == "_7"
+        assert server.dashboard_guild_path("../x").name == "___x.json"
+
+    def test_migration_copies_each_guild_once(self, dashboard_shards):
+        other_guild = "223456789012345678"
+        legacy = {
+            "events": {GUILD_ID: [{"id": "a", "title": "Morning"}]},
+            "perms": {other_guild: {"commandRoleMap": {"play": ["DJ"]}}},
+            "telemetry": {GUILD_ID: {"listenersNow": 3, "updatedAt": "2026-01-01T00:00:00+00:00"}},
+            "authSessions": {"token": {}},
+        }
+        (dashboard_shards / "dashboard.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+        payload = server.load_dashboard_guild(GUILD_ID)
+        assert payload["events"] == [{"id": "a", "title": "Morning"}]
+        assert payload["telemetry"]["listenersNow"] == 3
+        assert payload["telemetry"]["updatedAt"] == "2026-01-01T00:00:00+00:00"
+        assert server.load_dashboard_guild(other_guild) == {"perms": {"commandRoleMap": {"play": ["DJ"]}}}
+        assert json.loads((dashboard_shards / "dashboard.json").read_text(encoding="utf-8")) == legacy
+        assert (dashboard_shards / "dashboard" / ".migrated").exists()
+
+        # Ein neuer Prozess migriert nach dem Marker nicht erneut.
+        server.dashboard_repo_add_event(GUILD_ID, {"id": "b", "title": "Night"})
+        server.DASHBOARD_SHARD_MIGRATION["done"] = False
+        assert [row["id"] for row in server.load_dashboard_guild(GUILD_ID)["events"]] == ["b", "a"]
+
+    def test_shard_data_written_before_the_migration_wins(self, dashboard_shards):
+        (dashboard_shards / "dashboard.json").write_text(json.dumps({
+            "perms": {GUILD_ID: {"commandRoleMap": {"play": ["Old"]}}},
+            "events": {GUILD_ID: [{"id": "a"}]},
+        }), encoding="utf-8")
+        path = server.dashboard_guild_path(GUILD_ID)
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps({"perms": {"commandRoleMap": {"play": ["New"]}}}), encoding="utf-8")
+
+        payload = server.load_dashboard_guild(GUILD_ID)
+        assert payload["perms"] == {"commandRoleMap": {"play": ["New"]}}
+        assert payload["events"] == [{"id": "a"}]
+
+    def test_sharded_writes_touch_only_the_guild_file(self, dashboard_shards):
+        other_guild = "223456789012345677"
+        server.dashboard_repo_set_many("perms", {
+            GUILD_ID: {"commandRoleMap": {"play": ["DJ"]}},
+            other_guild: {"commandRoleMap": {"stop": ["Mod"]}},
+        })
+        assert not (dashboard_shards / "dashboard.json").exists()
+        assert sorted(path.parent.name for path in (dashboard_shards / "dashboard").glob("*/*.json")) == ["77", "78"]
+        assert server.dashboard_repo_get("perms", other_guild) == {"commandRoleMap": {"stop": ["Mod"]}}
+        assert server.get_dashboard_version(GUILD_ID, "perms") == 1
+        assert not list((dashboard_shards / "dashboard").glob("*/.*.tmp"))
+
+
+class TestTelemetryBatch:
+    """Bot workers post telemetry for many guilds in one call"""
+
+    @pytest.fixture
+    def batch(self, monkeypatch, dashboard_client, dashboard_file):
+        monkeypatch.setattr(server, "ADMIN_API_TOKEN", "unit-admin")
+        recorded, writes = [], []
+        monkeypatch.setattr(server, "record_telemetry_points", lambda payloads: recorded.append(dict(payloads)))
+        original = server.write_dashboard_guild_file
+        monkeypatch.setattr(server, "write_dashboard_guild_file", lambda *args, **kwargs: writes.append(args[0]) or original(*args, **kwargs))
+
+        def post(items):
+            return dashboard_client.post("/api/dashboard/telemetry/batch", headers={"X-Admin-Token": "unit-admin"}, json={"items": items})
+
+        return SimpleNamespace(post=post, recorded=recorded, writes=writes, client=dashboard_client)
+
+    def test_mixed_batch_reports_each_item(self, batch):
+        other_guild = "223456789012345678"
+        response = batch.post([
+            {"serverId": GUILD_ID, "listenersNow": 2},
+            {"serverId": "nope", "listenersNow": 1},
+            "not an object",
+            {"serverId": other_guild, "telemetry": {"listenersNow": 7, "activeStreams": 2}},
+            {"serverId": GUILD_ID, "listenersNow": 4},
+        ])
+        body = response.json()
+        assert (body["accepted"], body["rejected"]) == (2, 2)
+        assert [row["status"] for row in body["results"]] == ["superseded", "rejected", "rejected", "accepted", "accepted"]
+
+        assert len(batch.writes) == 1
+        assert server.dashboard_repo_get("telemetry", GUILD_ID)["listenersNow"] == 4
+        assert server.dashboard_repo_get("telemetry", other_guild)["activeStreams"] == 2
+        assert [sorted(payloads) for payloads in batch.recorded] == [sorted([GUILD_ID, other_guild])]
+
+    def test_limits_and_auth(self, batch):
+        too_many = [{"serverId": GUILD_ID}] * (server.DASHBOARD_TELEMETRY_BATCH_MAX + 1)
+        assert batch.post(too_many).status_code == 413
+        assert batch.client.post("/api/dashboard/telemetry/batch", json={"items": []}).status_code == 401
+        assert batch.client.post(
+            "/api/dashboard/telemetry/batch", headers={"X-Admin-Token": "unit-admin"}, json={"items": {}},
+        ).status_code == 400
+        assert batch.writes == []
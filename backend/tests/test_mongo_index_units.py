@@ -0,0 +1,86 @@
+"""
+MongoDB index maintenance unit tests (no running server required)
+Covers the legacy backend's index provisioning and query-plan check:
+- ensure_mongo_indexes: every spec is created, repeated runs are no-ops
+- verify_mongo_query_plans / run_cli: collection scans on hot queries fail the check
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Import without MongoDB; tests swap in mongomock.
+os.environ["MONGO_URL"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().omnifm_test
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def query_plans(monkeypatch, mongo):
+    """mongomock has no explain(): winning plans come from this dict (collection -> stage)"""
+    import mongomock
+
+    stages = {}
+
+    def explain(cursor):
+        stage = stages.get(cursor.collection.name, "IXSCAN")
+        return {"queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": stage}}}}}
+
+    monkeypatch.setattr(mongomock.collection.Cursor, "explain", explain, raising=False)
+    return stages
+
+
+class TestEnsureIndexes:
+    """ensure-indexes creates MONGO_INDEX_SPECS and is safe to run on every start"""
+
+    def test_every_spec_is_created_once(self, mongo):
+        results = server.ensure_mongo_indexes()
+        assert [entry for entry in results if not entry["ok"]] == []
+        assert len(results) == len(server.MONGO_INDEX_SPECS)
+        for collection_name, keys, options in server.MONGO_INDEX_SPECS:
+            indexes = mongo[collection_name].index_information()
+            assert any(index["key"] == keys for index in indexes.values()), (collection_name, keys)
+            if options.get("name"):
+                assert options["name"] in indexes
+
+        assert [entry for entry in server.ensure_mongo_indexes() if not entry["ok"]] == []
+
+    def test_ttl_options_are_applied(self, mongo):
+        server.ensure_mongo_indexes()
+        ttl_specs = [spec for spec in server.MONGO_INDEX_SPECS if "expireAfterSeconds" in spec[2]]
+        assert ttl_specs
+        for collection_name, _, options in ttl_specs:
+            index = mongo[collection_name].index_information()[options["name"]]
+            assert index["expireAfterSeconds"] == options["expireAfterSeconds"]
+
+
+class TestQueryPlanCheck:
+    """verify-indexes explains MONGO_HOT_QUERIES and fails on a collection scan"""
+
+    def test_plan_stages_are_collected_recursively(self):
+        plan = {"stage": "SORT_MERGE", "inputStages": [{"stage": "IXSCAN"}, {"stage": "FETCH", "inputStage": {"stage": "COLLSCAN"}}]}
+        assert server.collect_plan_stages(plan) == ["SORT_MERGE", "IXSCAN", "FETCH", "COLLSCAN"]
+
+    def test_indexed_hot_queries_pass(self, query_plans, capsys):
+        results = server.verify_mongo_query_plans()
+        assert len(results) == len(server.MONGO_HOT_QUERIES)
+        assert all(entry["ok"] and "IXSCAN" in entry["stages"] for entry in results)
+        assert server.run_cli(["verify-indexes"]) == 0
+
+    def test_collection_scan_fails_the_cli(self, query_plans, capsys):
+        query_plans["licenses"] = "COLLSCAN"
+        failed = [entry for entry in server.verify_mongo_query_plans() if not entry["ok"]]
+        assert failed and {entry["collection"] for entry in failed} == {"licenses"}
+        assert server.run_cli(["verify-indexes"]) == 1
+        assert "[FAIL] licenses" in capsys.readouterr().out
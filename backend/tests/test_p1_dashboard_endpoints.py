@@ -3,6 +3,7 @@ P1 Dashboard Endpoint Tests
 Tests all new dashboard endpoints added in iteration 8:
 - GET /api/dashboard/stats/detail
 - DELETE /api/dashboard/stats/reset  
+- GET /api/dashboard/stats/reset/status
 - GET /api/dashboard/settings
 - PUT /api/dashboard/settings
 - GET /api/dashboard/channels
@@ -76,6 +77,14 @@ class TestDashboardEndpointsAuth:
         assert "error" in data or "Nicht eingeloggt" in str(data)
         print(f"✓ DELETE /api/dashboard/stats/reset returns 401")
     
+    def test_stats_reset_status_returns_401_unauthenticated(self):
+        """GET /api/dashboard/stats/reset/status returns 401 without auth"""
+        response = requests.get(f"{BASE_URL}/api/dashboard/stats/reset/status?serverId=123456789012345678")
+        assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+        data = response.json()
+        assert "error" in data or "Nicht eingeloggt" in str(data)
+        print(f"✓ GET /api/dashboard/stats/reset/status returns 401")
+    
     def test_settings_get_returns_401_unauthenticated(self):
         """GET /api/dashboard/settings returns 401 without auth"""
         response = requests.get(f"{BASE_URL}/api/dashboard/settings?serverId=123456789012345678")
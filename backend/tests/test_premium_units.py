@@ -0,0 +1,660 @@
+"""
+Premium persistence unit tests (no running server required)
+Covers the legacy backend's premium storage helpers:
+- save_premium / mutate_premium: diff-based writes, version conflicts, retry, rollback and scoped loads (mongomock)
+- redeem_offer: maxUses enforcement in MongoDB and, across threads and processes, in the file backend
+- premium.journal: append, replay after a restart, torn last lines and compaction into premium.json
+- license keys: case-insensitive lookups and the unique-index fallback for legacy duplicates
+- email indexes: licenses by contact email and one trial claim per address
+- list_licenses_by_expiry: expired and expiring-soon windows over the expiry index
+- admin listings: list cursors and keyset pages over the sorted offer index
+- license reads: point lookups and the license ETag version without loading the whole state
+- get_tiers_for_servers: tiers for a whole guild list from one lookup per collection
+- processed Stripe sessions: TTL field in MongoDB, bounded ring in the file backend
+"""
+
+import copy
+import json
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+# Import without MongoDB; tests that need one swap in mongomock.
+os.environ["MONGO_URL"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def offer_payload(code, **overrides):
+    return {"code": code, "label": code.title(), "discountPercent": 10, **overrides}
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().omnifm_test
+    monkeypatch.setattr(server, "db", database)
+    # mongomock kennt weder hello noch Sessions: Rollback-Pfad ohne Transaktion.
+    monkeypatch.setitem(server.PREMIUM_TRANSACTIONS, "supported", None)
+    monkeypatch.setitem(server.PREMIUM_PERSISTENCE_METRICS, "conflicts", 0)
+    monkeypatch.setattr(server.time, "sleep", lambda seconds: None)
+    return database
+
+
+@pytest.fixture
+def premium_files(monkeypatch, tmp_path):
+    """File backend in tmp_path; compaction only runs when a test calls it"""
+    monkeypatch.setattr(server, "db", None)
+    monkeypatch.setattr(server, "PREMIUM_FILE", tmp_path / "premium.json")
+    monkeypatch.setattr(server, "PREMIUM_JOURNAL_FILE", tmp_path / "premium.journal")
+    monkeypatch.setattr(server, "PREMIUM_FILE_LOCK", server.PremiumFileLock(tmp_path / "premium.json.lock"))
+    monkeypatch.setattr(server, "PREMIUM_FILE_CACHE", {"signature": None, "data": None, "indexes": {}, "generation": 0})
+    monkeypatch.setattr(server, "PREMIUM_JOURNAL_STATE", {
+        **server.PREMIUM_JOURNAL_STATE,
+        "records": 0, "fsyncTimer": None, "compactTimer": None, "pendingSince": None,
+        "compacting": False, "compactions": 0, "tornTail": False,
+    })
+    monkeypatch.setattr(server, "PREMIUM_JOURNAL_FSYNC_MS", 0)
+    monkeypatch.setattr(server, "schedule_premium_compaction", lambda force=False: False)
+    monkeypatch.setattr(server, "schedule_premium_idle_compaction", lambda: None)
+    return tmp_path
+
+
+@pytest.fixture(params=["mongo", "files"])
+def premium_backend(request):
+    """Runs a test once against mongomock and once against the file backend"""
+    return request.getfixturevalue("mongo" if request.param == "mongo" else "premium_files")
+
+
+def put_licenses(**licenses):
+    server.mutate_premium(lambda data: data["licenses"].update(licenses))
+
+
+def journal_records(path):
+    return [json.loads(line) for line in (path / "premium.journal").read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def bump_offer(database, code, **fields):
+    """Simulates another worker writing the offer in between"""
+    database.offers.update_one({"_code": code}, {"$set": fields, "$inc": {"_version": 1}})
+
+
+class TestPremiumDiffSave:
+    """save_premium writes only the documents and meta fields that changed since load_premium"""
+
+    @pytest.fixture
+    def metrics(self, monkeypatch):
+        monkeypatch.setattr(server, "PREMIUM_PERSISTENCE_METRICS", {**server.PREMIUM_PERSISTENCE_METRICS, "saves": 0, "skippedSaves": 0})
+        return server.PREMIUM_PERSISTENCE_METRICS
+
+    def test_only_changed_documents_are_written(self, mongo, metrics):
+        put_licenses(**{f"KEY-{index}": {"plan": "pro", "seats": 1} for index in range(5)})
+        data = server.load_premium()
+        data["licenses"]["KEY-2"]["seats"] = 3
+        data["licenses"].pop("KEY-4")
+        assert server.save_premium(data) is True
+        assert metrics["lastDocumentsWritten"] == 2
+        assert mongo.licenses.find_one({"_licenseId": "KEY-2"})["seats"] == 3
+        assert mongo.licenses.find_one({"_licenseId": "KEY-4"}) is None
+        assert [doc["_version"] for doc in mongo.licenses.find({"_licenseId": {"$in": ["KEY-0", "KEY-1", "KEY-3"]}})] == [1, 1, 1]
+
+    def test_unchanged_state_skips_the_save(self, premium_backend, metrics):
+        put_licenses(**{"KEY-A": {"plan": "pro"}})
+        data = server.load_premium()
+        assert server.save_premium(data) is True
+        assert metrics["lastDocumentsWritten"] == 0
+        assert metrics["skippedSaves"] == 1
+
+    def test_meta_fields_are_written_only_when_changed(self, mongo):
+        data = server.load_premium()
+        data["recentRedemptions"] = [{"code": "AAA"}]
+        server.save_premium(data)
+        assert mongo.premium_state.find_one({"_id": "meta"})["recentRedemptions"] == [{"code": "AAA"}]
+        data = server.load_premium()
+        data["licenses"]["KEY-A"] = {"plan": "pro"}
+        server.save_premium(data)
+        assert mongo.premium_state.find_one({"_id": "meta"})["_version"] == 1
+
+
+class TestPremiumMongoConcurrency:
+    """Conditional writes against the loaded _version, retried by mutate_premium"""
+
+    def test_conflicting_mutation_is_retried_on_fresh_state(self, mongo):
+        server.upsert_offer(offer_payload("SPRING"))
+        calls = []
+
+        def apply(data):
+            calls.append(dict(data["offers"]["SPRING"]))
+            if len(calls) == 1:
+                bump_offer(mongo, "SPRING", description="from another worker")
+            data["offers"]["SPRING"]["label"] = "Spring Sale"
+            return len(calls)
+
+        assert server.mutate_premium(apply, scope={"offers": ["SPRING"]}) == 2
+        assert calls[1]["description"] == "from another worker"
+        doc = mongo.offers.find_one({"_code": "SPRING"})
+        assert doc["label"] == "Spring Sale"
+        assert doc["description"] == "from another worker"
+        assert doc["_version"] == 3
+        assert server.PREMIUM_PERSISTENCE_METRICS["conflicts"] == 1
+
+    def test_mutation_gives_up_after_the_last_attempt(self, mongo):
+        server.upsert_offer(offer_payload("SPRING"))
+
+        def apply(data):
+            bump_offer(mongo, "SPRING")
+            data["offers"]["SPRING"]["label"] = "never saved"
+
+        with pytest.raises(RuntimeError):
+            server.mutate_premium(apply, attempts=3, scope={"offers": ["SPRING"]})
+        assert mongo.offers.find_one({"_code": "SPRING"})["label"] == "Spring"
+
+    def test_conflict_rolls_back_other_documents_of_the_save(self, mongo):
+        server.upsert_offer(offer_payload("AAA"))
+        server.upsert_offer(offer_payload("BBB"))
+        server.upsert_offer(offer_payload("CCC"))
+        data = server.load_premium()
+        data["offers"]["AAA"]["label"] = "changed"
+        data["offers"]["NEW"] = {"label": "new", "discountPercent": 5}
+        data["offers"].pop("CCC")
+        data["offers"]["BBB"]["label"] = "changed"
+        bump_offer(mongo, "BBB", label="other worker")
+
+        assert server.save_premium(data) is False
+        aaa = mongo.offers.find_one({"_code": "AAA"})
+        assert aaa["label"] == "Aaa"
+        assert "_writeId" not in aaa
+        assert mongo.offers.find_one({"_code": "NEW"}) is None
+        assert mongo.offers.find_one({"_code": "BBB"})["label"] == "other worker"
+        assert mongo.offers.count_documents({"_deleteId": {"$exists": True}}) == 0
+
+    def test_conflicting_delete_rolls_back_the_marked_deletes(self, mongo):
+        server.upsert_offer(offer_payload("AAA"))
+        server.upsert_offer(offer_payload("BBB"))
+        data = server.load_premium()
+        data["offers"].pop("AAA")
+        data["offers"].pop("BBB")
+        bump_offer(mongo, "BBB")
+
+        assert server.save_premium(data) is False
+        remaining = sorted(doc["_code"] for doc in mongo.offers.find({"_deleteId": {"$exists": False}}))
+        assert remaining == ["AAA", "BBB"]
+
+    def test_single_document_save_writes_no_rollback_markers(self, mongo):
+        server.upsert_offer(offer_payload("SPRING"))
+        server.set_offer_active("SPRING", False)
+        doc = mongo.offers.find_one({"_code": "SPRING"})
+        assert doc["active"] is False
+        assert "_writeId" not in doc and "_deleteId" not in doc
+        assert server.delete_offer("SPRING") is True
+        assert mongo.offers.count_documents({}) == 0
+
+
+class TestScopedPremiumLoads:
+    """mutate_premium(scope=...) loads and writes only the documents it names"""
+
+    def test_scoped_load_skips_other_documents_and_meta(self, mongo):
+        server.upsert_offer(offer_payload("AAA"))
+        server.upsert_offer(offer_payload("BBB"))
+        mongo.premium_state.insert_one({"_id": "meta", "recentRedemptions": [{"code": "AAA"}], "_version": 4})
+
+        data = server.load_premium({"offers": ["BBB"]})
+        assert list(data["offers"]) == ["BBB"]
+        assert data["licenses"] == {}
+        assert data["recentRedemptions"] == []
+        assert data.versions == {"offers": {"BBB": 1}}
+
+    def test_scoped_save_leaves_unloaded_documents_untouched(self, mongo):
+        server.upsert_offer(offer_payload("AAA"))
+        server.upsert_offer(offer_payload("BBB"))
+        mongo.premium_state.insert_one({"_id": "meta", "recentRedemptions": [{"code": "AAA"}], "_version": 4})
+
+        server.set_offer_active("BBB", False)
+        assert mongo.offers.find_one({"_code": "AAA"})["_version"] == 1
+        assert mongo.offers.find_one({"_code": "BBB"})["_version"] == 2
+        meta = mongo.premium_state.find_one({"_id": "meta"})
+        assert meta["recentRedemptions"] == [{"code": "AAA"}]
+        assert meta["_version"] == 4
+
+
+class TestOfferRedemption:
+    """redeem_offer never lets uses exceed maxUses"""
+
+    def test_mongo_counter_stops_at_max_uses(self, mongo):
+        server.upsert_offer(offer_payload("LAUNCH", maxUses=2))
+        assert [server.redeem_offer("launch")["ok"] for _ in range(3)] == [True, True, False]
+        assert server.redeem_offer("LAUNCH")["reason"] == "exhausted"
+        assert mongo.offers.find_one({"_code": "LAUNCH"})["uses"] == 2
+        server.set_offer_active("LAUNCH", False)
+        assert server.redeem_offer("LAUNCH") == {"ok": False, "reason": "inactive"}
+        assert server.redeem_offer("MISSING") == {"ok": False, "reason": "not_found"}
+
+    def test_file_counter_journals_an_increment(self, premium_files):
+        server.upsert_offer(offer_payload("LAUNCH", maxUses=2))
+        results = [server.redeem_offer("LAUNCH") for _ in range(3)]
+        assert [result["ok"] for result in results] == [True, True, False]
+        incs = [record for record in journal_records(premium_files) if record["op"] == "inc"]
+        assert [(record["id"], record["field"], record["value"]) for record in incs] == [("LAUNCH", "uses", 1), ("LAUNCH", "uses", 2)]
+
+    def test_file_counter_keeps_edits_from_another_worker(self, premium_files):
+        server.upsert_offer(offer_payload("LAUNCH", maxUses=5))
+        edited = {**server.get_offer("LAUNCH"), "label": "Edited elsewhere"}
+        edited.pop("code", None)
+        with open(premium_files / "premium.journal", "a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"op": "put", "section": "offers", "id": "LAUNCH", "doc": edited}) + "\n")
+
+        assert server.redeem_offer("LAUNCH")["offer"]["label"] == "Edited elsewhere"
+        data = server.empty_premium_state()
+        server.replay_premium_journal(data)
+        assert data["offers"]["LAUNCH"]["label"] == "Edited elsewhere"
+        assert data["offers"]["LAUNCH"]["uses"] == 1
+
+    def test_file_counter_replay_is_idempotent(self, premium_files):
+        server.upsert_offer(offer_payload("LAUNCH"))
+        server.redeem_offer("LAUNCH")
+        server.redeem_offer("LAUNCH")
+        data = server.empty_premium_state()
+        server.replay_premium_journal(data)
+        server.replay_premium_journal(data)
+        assert data["offers"]["LAUNCH"]["uses"] == 2
+
+    def test_file_counter_is_safe_across_threads(self, premium_files):
+        server.upsert_offer(offer_payload("LAUNCH", maxUses=5))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(server.redeem_offer("LAUNCH")["ok"])) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results.count(True) == 5
+        assert server.get_offer("LAUNCH")["uses"] == 5
+
+    def test_file_counter_is_safe_across_processes(self, premium_files):
+        server.upsert_offer(offer_payload("LAUNCH", maxUses=60))
+        script = (
+            "import os, sys\n"
+            "from pathlib import Path\n"
+            "os.environ['MONGO_URL'] = ''\n"
+            f"sys.path.insert(0, {str(BACKEND_DIR)!r})\n"
+            "import server\n"
+            "root = Path(sys.argv[1])\n"
+            "server.PREMIUM_FILE = root / 'premium.json'\n"
+            "server.PREMIUM_JOURNAL_FILE = root / 'premium.journal'\n"
+            "server.PREMIUM_FILE_LOCK = server.PremiumFileLock(root / 'premium.json.lock')\n"
+            "print(sum(server.redeem_offer('LAUNCH')['ok'] for _ in range(40)))\n"
+        )
+        workers = [
+            subprocess.Popen([sys.executable, "-c", script, str(premium_files)], stdout=subprocess.PIPE, text=True)
+            for _ in range(4)
+        ]
+        counted = sum(int(worker.communicate(timeout=120)[0].strip().splitlines()[-1]) for worker in workers)
+        assert counted == 60
+        assert server.get_offer("LAUNCH")["uses"] == 60
+
+
+def reload_from_disk():
+    """Drops the in-memory state, like a freshly started worker"""
+    server.PREMIUM_FILE_CACHE.update({"signature": None, "data": None, "indexes": {}})
+    return server.load_premium_file_cached()
+
+
+class TestPremiumJournal:
+    """File backend: writes are appended to premium.journal and folded into premium.json by compaction"""
+
+    def test_writes_are_journaled_and_replayed_after_restart(self, premium_files):
+        server.upsert_offer(offer_payload("AAA"))
+        server.upsert_offer(offer_payload("BBB"))
+        server.delete_offer("AAA")
+        assert not (premium_files / "premium.json").exists()
+        assert [(record["op"], record["id"]) for record in journal_records(premium_files)] == [
+            ("put", "AAA"), ("put", "BBB"), ("del", "AAA"),
+        ]
+
+        data = reload_from_disk()
+        assert list(data["offers"]) == ["BBB"]
+        assert server.PREMIUM_JOURNAL_STATE["records"] == 3
+
+    def test_torn_last_line_is_ignored_and_not_continued(self, premium_files):
+        server.upsert_offer(offer_payload("AAA"))
+        with open(premium_files / "premium.journal", "a", encoding="utf-8") as handle:
+            handle.write('{"op":"put","section":"offers","id":"TORN","doc":{"lab')
+
+        assert list(reload_from_disk()["offers"]) == ["AAA"]
+        assert server.PREMIUM_JOURNAL_STATE["tornTail"] is True
+        server.upsert_offer(offer_payload("BBB"))
+        assert sorted(reload_from_disk()["offers"]) == ["AAA", "BBB"]
+
+    def test_unknown_and_malformed_records_are_skipped(self, premium_files):
+        server.upsert_offer(offer_payload("AAA"))
+        with open(premium_files / "premium.journal", "a", encoding="utf-8") as handle:
+            handle.write("not json\n")
+            handle.write(json.dumps({"op": "put", "section": "nope", "id": "X", "doc": {}}) + "\n")
+            handle.write(json.dumps({"op": "inc", "section": "offers", "id": "MISSING", "field": "uses", "value": 1}) + "\n")
+            handle.write(json.dumps({"op": "meta", "field": "unknownField", "value": 1}) + "\n")
+        server.upsert_offer(offer_payload("BBB"))
+
+        data = reload_from_disk()
+        assert sorted(data["offers"]) == ["AAA", "BBB"]
+        assert "nope" not in data and "unknownField" not in data
+        assert server.PREMIUM_JOURNAL_STATE["records"] == 2
+
+    def test_compaction_writes_the_snapshot_and_empties_the_journal(self, premium_files):
+        server.upsert_offer(offer_payload("AAA"))
+        server.upsert_offer(offer_payload("BBB", maxUses=3))
+        server.redeem_offer("BBB")
+        server.delete_offer("AAA")
+        before = copy.deepcopy(server.load_premium_file_cached())
+
+        server.compact_premium_journal()
+        assert not (premium_files / "premium.journal").exists()
+        snapshot = json.loads((premium_files / "premium.json").read_text(encoding="utf-8"))
+        assert list(snapshot["offers"]) == ["BBB"]
+        assert snapshot["offers"]["BBB"]["uses"] == 1
+        assert reload_from_disk() == before
+        assert server.PREMIUM_JOURNAL_STATE["records"] == 0
+
+    def test_writes_after_compaction_start_a_new_journal(self, premium_files):
+        server.upsert_offer(offer_payload("AAA"))
+        server.compact_premium_journal()
+        server.set_offer_active("AAA", False)
+        assert [record["op"] for record in journal_records(premium_files)] == ["put"]
+        assert reload_from_disk()["offers"]["AAA"]["active"] is False
+
+    def test_journal_written_by_another_worker_is_picked_up(self, premium_files):
+        server.upsert_offer(offer_payload("AAA"))
+        server.load_premium_file_cached()
+        with open(premium_files / "premium.journal", "a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"op": "put", "section": "offers", "id": "OTHER", "doc": {"label": "Other"}}) + "\n")
+        assert server.get_offer("OTHER")["label"] == "Other"
+
+
+class TestLicenseKeyLookup:
+    """premium_repo_resolve_license_key finds a license whatever the key's case"""
+
+    def test_any_case_resolves_to_the_stored_key(self, premium_backend):
+        put_licenses(**{"OmniFM-Ab12-Cd34": {"plan": "pro", "email": "a@example.com"}})
+        for candidate in ("OmniFM-Ab12-Cd34", "omnifm-ab12-cd34", "  OMNIFM-AB12-CD34 "):
+            key, lic = server.premium_repo_resolve_license_key(candidate)
+            assert key == "OmniFM-Ab12-Cd34"
+            assert lic["plan"] == "pro"
+        assert server.premium_repo_resolve_license_key("OMNIFM-0000-0000") == (None, None)
+        assert server.premium_repo_resolve_license_key("") == (None, None)
+
+    def test_file_index_follows_new_and_deleted_licenses(self, premium_files):
+        put_licenses(**{"Key-One": {"plan": "pro"}})
+        assert server.premium_repo_resolve_license_key("KEY-ONE")[0] == "Key-One"
+        server.mutate_premium(lambda data: data["licenses"].pop("Key-One"))
+        put_licenses(**{"Key-Two": {"plan": "ultimate"}})
+        assert server.premium_repo_resolve_license_key("KEY-ONE") == (None, None)
+        assert server.premium_repo_resolve_license_key("key-two")[0] == "Key-Two"
+
+    def test_mongo_documents_store_the_normalized_key(self, mongo):
+        put_licenses(**{"Key-One": {"plan": "pro"}})
+        assert mongo.licenses.find_one({"_licenseId": "Key-One"})["_licenseKeyNorm"] == "KEY-ONE"
+
+    def test_legacy_duplicates_get_a_non_unique_index(self, monkeypatch, mongo):
+        spec = next(entry for entry in server.MONGO_INDEX_SPECS if entry[2].get("name") == "licenseKeyNorm_unique")
+        monkeypatch.setattr(server, "MONGO_INDEX_SPECS", [spec])
+        mongo.licenses.insert_many([
+            {"_licenseId": "abc-1", "_licenseKeyNorm": "ABC-1"},
+            {"_licenseId": "ABC-1", "_licenseKeyNorm": "ABC-1"},
+            {"_licenseId": "XYZ-9", "_licenseKeyNorm": "XYZ-9"},
+        ])
+
+        [entry] = server.ensure_mongo_indexes()
+        assert entry["ok"] is False
+        assert "ABC-1" in entry["error"]
+        indexes = mongo.licenses.index_information()
+        assert "licenseKeyNorm_nonunique" in indexes
+        assert "licenseKeyNorm_unique" not in indexes
+
+    def test_unique_index_is_built_without_duplicates(self, monkeypatch, mongo):
+        spec = next(entry for entry in server.MONGO_INDEX_SPECS if entry[2].get("name") == "licenseKeyNorm_unique")
+        monkeypatch.setattr(server, "MONGO_INDEX_SPECS", [spec])
+        mongo.licenses.insert_many([{"_licenseId": "ABC-1", "_licenseKeyNorm": "ABC-1"}, {"_licenseId": "legacy"}])
+
+        assert server.ensure_mongo_indexes() == [{"collection": "licenses", "index": "licenseKeyNorm_unique", "ok": True}]
+        assert mongo.licenses.index_information()["licenseKeyNorm_unique"]["unique"] is True
+
+
+class TestEmailLookups:
+    """Licenses and trial claims are found by normalized email without scanning all licenses"""
+
+    def test_licenses_by_contact_email(self, premium_backend):
+        put_licenses(**{
+            "KEY-A": {"plan": "pro", "email": "Owner@Example.com"},
+            "KEY-B": {"plan": "ultimate", "contactEmail": "owner@example.com"},
+            "KEY-C": {"plan": "pro", "email": "other@example.com"},
+        })
+        found = server.list_licenses_by_contact_email(" OWNER@example.COM ")
+        assert sorted(row["licenseKey"] for row in found) == ["KEY-A", "KEY-B"]
+        assert server.list_licenses_by_contact_email("") == []
+        assert server.list_licenses_by_contact_email("nobody@example.com") == []
+
+    def test_changed_email_moves_the_license(self, premium_backend):
+        put_licenses(**{"KEY-A": {"plan": "pro", "email": "old@example.com"}})
+        server.mutate_premium(lambda data: data["licenses"]["KEY-A"].update(email="new@example.com"))
+        assert server.list_licenses_by_contact_email("old@example.com") == []
+        assert [row["licenseKey"] for row in server.list_licenses_by_contact_email("new@example.com")] == ["KEY-A"]
+
+    def test_one_trial_claim_per_address(self, premium_backend):
+        assert server.reserve_trial_claim("Trial@Example.com", {"serverId": "1"})["ok"] is True
+        assert server.reserve_trial_claim("trial@example.com", {"serverId": "2"})["ok"] is False
+        claim = server.premium_repo_get_trial_claim("TRIAL@EXAMPLE.COM")
+        assert claim["email"] == "trial@example.com"
+        assert claim["serverId"] == "1"
+        assert server.premium_repo_get_trial_claim("other@example.com") is None
+
+
+def expires_in(days):
+    return (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+
+
+class TestLicenseExpiryListing:
+    """list_licenses_by_expiry reads a sorted window instead of checking every license"""
+
+    @pytest.fixture
+    def licenses(self, premium_backend):
+        put_licenses(**{
+            "LONG-AGO": {"plan": "pro", "expiresAt": expires_in(-30)},
+            "YESTERDAY": {"plan": "pro", "expiresAt": expires_in(-1)},
+            "NO-EXPIRY": {"plan": "pro"},
+            "SOON": {"plan": "ultimate", "expiresAt": expires_in(2)},
+            "NEXT-WEEK": {"plan": "pro", "expiresAt": expires_in(6.5)},
+            "LATER": {"plan": "pro", "expiresAt": expires_in(40)},
+        })
+
+    def test_expiring_soon_is_sorted_by_expiry(self, licenses):
+        rows = server.list_licenses_by_expiry(within_days=7)
+        assert [row["licenseKey"] for row in rows] == ["SOON", "NEXT-WEEK"]
+        assert all(row["expired"] is False for row in rows)
+        assert rows[0]["remainingDays"] == 3
+        assert [row["licenseKey"] for row in server.list_licenses_by_expiry(within_days=1)] == []
+
+    def test_expired_lists_latest_first_and_counts_missing_dates(self, licenses):
+        rows = server.list_licenses_by_expiry(expired=True)
+        assert [row["licenseKey"] for row in rows] == ["YESTERDAY", "LONG-AGO", "NO-EXPIRY"]
+        assert all(row["expired"] is True for row in rows)
+        assert [row["licenseKey"] for row in server.list_licenses_by_expiry(expired=True, limit=1)] == ["YESTERDAY"]
+
+    def test_extended_license_leaves_the_window(self, licenses):
+        server.mutate_premium(lambda data: data["licenses"]["SOON"].update(expiresAt=expires_in(60)))
+        assert [row["licenseKey"] for row in server.list_licenses_by_expiry(within_days=7)] == ["NEXT-WEEK"]
+
+
+def put_offers(**offers):
+    server.mutate_premium(lambda data: data["offers"].update(offers))
+
+
+def walk_offer_pages(limit, **filters):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = server.list_offers(cursor=cursor, limit=limit, **filters)
+        pages.append([row["code"] for row in rows])
+        if not cursor:
+            return pages
+
+
+class TestAdminListPagination:
+    """Cursor pages are stable across ties in the sort field and identical in both backends"""
+
+    def test_cursor_round_trip(self):
+        cursor = server.encode_list_cursor("2026-10-18T12:00:00+00:00", "Köln,=/+")
+        assert "=" not in cursor
+        assert server.decode_list_cursor(cursor) == ("2026-10-18T12:00:00+00:00", "Köln,=/+")
+        assert server.decode_list_cursor("") is None
+        assert server.decode_list_cursor(None) is None
+
+    @pytest.mark.parametrize("cursor", ["not-base64!", "bm9wZQ", server.encode_list_cursor("only", "two")[:-2] + "xx"])
+    def test_invalid_cursor_raises_value_error(self, cursor):
+        with pytest.raises(ValueError):
+            server.decode_list_cursor(cursor)
+
+    def test_sorted_index_pages_descending_with_ties(self):
+        rows = {doc_id: {"at": at} for doc_id, at in [("a", "1"), ("b", "2"), ("c", "2"), ("d", "2"), ("e", "3")]}
+        entries = server.build_sorted_list_index(rows, "at")
+        first = server.page_sorted_list_index(entries, rows, lambda row: True, None, 2)
+        assert [key for key, _ in first] == [("3", "e"), ("2", "d"), ("2", "c")]
+        second = server.page_sorted_list_index(entries, rows, lambda row: True, first[1][0], 2)
+        assert [key for key, _ in second] == [("2", "c"), ("2", "b"), ("1", "a")]
+        ranged = server.page_sorted_list_index(entries, rows, lambda row: True, None, 10, date_from="2", date_to="2")
+        assert [key[1] for key, _ in ranged] == ["d", "c", "b"]
+
+    def test_offer_pages_cover_every_offer_once(self, premium_backend):
+        put_offers(**{
+            f"CODE{index}": {"label": str(index), "updatedAt": f"2026-10-{10 + index // 3:02d}T00:00:00+00:00", "active": index % 2 == 0}
+            for index in range(9)
+        })
+        pages = walk_offer_pages(2)
+        assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+        codes = [code for page in pages for code in page]
+        assert codes == ["CODE8", "CODE7", "CODE6", "CODE5", "CODE4", "CODE3", "CODE2", "CODE1", "CODE0"]
+
+    def test_filters_and_dates_apply_before_paging(self, premium_backend):
+        put_offers(**{
+            f"CODE{index}": {"label": str(index), "updatedAt": f"2026-10-{10 + index // 3:02d}T00:00:00+00:00", "active": index % 2 == 0}
+            for index in range(9)
+        })
+        assert walk_offer_pages(2, active=True) == [["CODE8", "CODE6"], ["CODE4", "CODE2"], ["CODE0"]]
+        window = walk_offer_pages(5, updated_from="2026-10-11T00:00:00+00:00", updated_to="2026-10-11T23:59:59+00:00")
+        assert window == [["CODE5", "CODE4", "CODE3"]]
+
+
+SERVER_ID = "123456789012345678"
+
+
+def forbid_full_load(monkeypatch):
+    """From here on, reads must not fall back to load_premium()"""
+    def fail(scope=None):
+        raise AssertionError("load_premium() called for a point lookup")
+
+    monkeypatch.setattr(server, "load_premium", fail)
+
+
+def put_entitlement(server_id, license_id):
+    server.mutate_premium(lambda data: data["serverEntitlements"].update({server_id: {"licenseId": license_id}}))
+
+
+class TestLicensePointLookups:
+    """get_server_license and its ETag version read single documents"""
+
+    def test_entitlement_and_legacy_license(self, monkeypatch, premium_backend):
+        put_licenses(**{
+            "KEY-A": {"plan": "ultimate", "expiresAt": expires_in(10)},
+            "223456789012345678": {"tier": "pro", "expiresAt": expires_in(-1)},
+        })
+        put_entitlement(SERVER_ID, "KEY-A")
+        forbid_full_load(monkeypatch)
+
+        current = server.get_server_license(SERVER_ID)
+        assert (current["activeTier"], current["expired"], current["remainingDays"]) == ("ultimate", False, 11)
+        legacy = server.get_server_license("223456789012345678")
+        assert (legacy["activeTier"], legacy["tier"], legacy["expired"]) == ("free", "pro", True)
+        assert server.get_server_license("323456789012345678") is None
+
+    def test_license_version_changes_with_the_license(self, monkeypatch, premium_backend):
+        put_licenses(**{"KEY-A": {"plan": "pro", "expiresAt": expires_in(10)}})
+        put_entitlement(SERVER_ID, "KEY-A")
+        before = server.get_server_license_version(SERVER_ID)
+        assert before == server.get_server_license_version(SERVER_ID)
+
+        server.mutate_premium(lambda data: data["licenses"]["KEY-A"].update(seats=2))
+        forbid_full_load(monkeypatch)
+        after_write = server.get_server_license_version(SERVER_ID)
+        assert after_write != before
+        assert after_write.endswith("-11")
+        assert server.get_server_license_version("323456789012345678").endswith("-none")
+
+
+class TestBatchedTiers:
+    """Dashboard guild lists resolve every tier with one lookup per collection"""
+
+    def test_tiers_for_mixed_guilds(self, monkeypatch, premium_backend):
+        put_licenses(**{
+            "KEY-ULT": {"plan": "ultimate", "expiresAt": expires_in(30)},
+            "KEY-OLD": {"plan": "pro", "expiresAt": expires_in(-2)},
+            "223456789012345678": {"tier": "pro", "expiresAt": expires_in(5)},
+            "KEY-ODD": {"plan": "gold", "expiresAt": expires_in(5)},
+        })
+        put_entitlement(SERVER_ID, "KEY-ULT")
+        put_entitlement("323456789012345678", "KEY-OLD")
+        put_entitlement("423456789012345678", "KEY-ODD")
+        put_entitlement("523456789012345678", "KEY-GONE")
+        forbid_full_load(monkeypatch)
+        lookups = []
+        original = server.premium_repo_find_documents
+        monkeypatch.setattr(server, "premium_repo_find_documents", lambda *args: lookups.append(args[0]) or original(*args))
+
+        tiers = server.get_tiers_for_servers([
+            SERVER_ID, "223456789012345678", "323456789012345678", "423456789012345678",
+            "523456789012345678", "623456789012345678", SERVER_ID, "", None,
+        ])
+        assert tiers == {
+            SERVER_ID: "ultimate",
+            "223456789012345678": "pro",
+            "323456789012345678": "free",
+            "423456789012345678": "free",
+            "523456789012345678": "free",
+            "623456789012345678": "free",
+        }
+        assert lookups == ["serverEntitlements", "licenses"]
+        assert server.get_tiers_for_servers([]) == {}
+
+
+class TestProcessedSessions:
+    """Processed checkout sessions expire by TTL in MongoDB and are capped in the file backend"""
+
+    def test_mongo_entry_is_inserted_once_with_a_ttl_date(self, mongo):
+        server.mark_processed_session("cs_1", {"serverId": SERVER_ID})
+        server.mark_processed_session("cs_1", {"serverId": "other"})
+        doc = mongo.processed_sessions.find_one({"_sessionId": "cs_1"})
+        assert isinstance(doc["_processedAt"], datetime)
+        assert server.get_processed_session("cs_1")["serverId"] == SERVER_ID
+        assert "_processedAt" not in server.get_processed_session("cs_1")
+        assert server.get_processed_session("") is None
+
+    def test_file_backend_evicts_the_oldest_by_processed_at(self, monkeypatch, premium_files):
+        monkeypatch.setattr(server, "PROCESSED_SESSION_MAX_ENTRIES", 3)
+        # Altbestand absteigend gespeichert: die Dict-Reihenfolge sagt nichts ueber das Alter.
+        server.mutate_premium(lambda data: data["processedSessions"].update({
+            "cs_new": {"processedAt": "2026-10-03T00:00:00+00:00"},
+            "cs_mid": {"processedAt": "2026-10-02T00:00:00+00:00"},
+            "cs_old": {"processedAt": "2026-10-01T00:00:00+00:00"},
+        }))
+        server.mark_processed_session("cs_a", {})
+        assert sorted(reload_from_disk()["processedSessions"]) == ["cs_a", "cs_mid", "cs_new"]
+        server.mark_processed_session("cs_b", {})
+        assert sorted(reload_from_disk()["processedSessions"]) == ["cs_a", "cs_b", "cs_new"]
+
+        server.mark_processed_session("cs_b", {"again": True})
+        assert sorted(reload_from_disk()["processedSessions"]) == ["cs_a", "cs_b", "cs_new"]
+        deletes = [record["id"] for record in journal_records(premium_files) if record["op"] == "del"]
+        assert deletes == ["cs_old", "cs_mid"]
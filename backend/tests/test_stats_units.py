@@ -0,0 +1,454 @@
+"""
+Stats pipeline unit tests (no running server required)
+Covers the pure helpers behind the legacy backend's stats endpoints:
+- aggregate_stats_ingest_events: time buckets and map-key sanitising
+- run_stats_reset_job: job state transitions (file mode)
+- parse_tier_days / stats_retention_cutoff_filter: retention settings and cutoff queries
+- compute_listener_analytics / compute_session_analytics: NumPy results and local-time buckets
+- load_stats_detail_sections: the one-pipeline read, its section layout and the per-query fallback
+- telemetry series: binary file records, partial MongoDB writes and per-tier trimming
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pymongo.errors import OperationFailure
+
+# Import without MongoDB: these tests only exercise pure functions.
+os.environ["MONGO_URL"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+
+GUILD_ID = "123456789012345678"
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def berlin_time(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset not available on this platform")
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+class TestStatsIngestAggregation:
+    """aggregate_stats_ingest_events builds one counter update per guild and per guild/day"""
+
+    def test_buckets_use_local_time_like_node(self, berlin_time):
+        """hours, daysOfWeek and date follow getHours()/getDay() of the server's local time"""
+        events = [{"type": "sessionStart", "serverId": GUILD_ID, "stationKey": "rock", "timestamp": "2026-10-17T22:30:00Z"}]
+        guild_updates, daily_updates, _, _, results = server.aggregate_stats_ingest_events(events, now=NOW)
+        assert results == []
+        inc = guild_updates[GUILD_ID]["inc"]
+        # 22:30 UTC on Saturday is 00:30 on Sunday in Berlin (CEST).
+        assert inc["hours.0"] == 1
+        assert inc["daysOfWeek.0"] == 1
+        assert list(daily_updates) == [(GUILD_ID, "2026-10-18")]
+
+    def test_bucket_keys_are_sanitised(self):
+        """Dots become underscores and leading $ are stripped so keys are never read as paths or operators"""
+        events = [
+            {"type": "sessionStart", "serverId": GUILD_ID, "stationKey": "rock.fm", "stationName": "Rock FM 1.0", "channelId": "$99", "timestamp": 1792300000000},
+            {"type": "sessionEnd", "serverId": GUILD_ID, "stationKey": "$jazz.fm", "startedAt": "2026-10-17T10:00:00Z", "endedAt": "2026-10-17T10:00:02Z"},
+            {"type": "command", "serverId": GUILD_ID, "command": "$Play.Now"},
+        ]
+        guild_updates, _, sessions, _, results = server.aggregate_stats_ingest_events(events, now=NOW)
+        assert results == []
+        update = guild_updates[GUILD_ID]
+        assert update["inc"]["stationStarts.Rock FM 1_0"] == 1
+        assert update["inc"]["voiceChannels.99"] == 1
+        assert update["inc"]["stationListeningMs.jazz_fm"] == 2000
+        assert update["inc"]["commands.play_now"] == 1
+        assert update["set"]["stationNames.rock_fm"] == "Rock FM 1.0"
+        assert sessions[0]["stationKey"] == "$jazz.fm"
+
+    def test_counters_are_merged_per_guild_and_day(self):
+        events = [
+            {"type": "sessionStart", "serverId": GUILD_ID, "listeners": 3, "timestamp": "2026-10-17T10:00:00Z"},
+            {"type": "sessionStart", "serverId": GUILD_ID, "listeners": 5, "timestamp": "2026-10-17T11:00:00Z"},
+            {"type": "snapshot", "serverId": GUILD_ID, "listeners": 9, "timestamp": "2026-10-17T11:30:00Z"},
+        ]
+        guild_updates, daily_updates, _, snapshots, _ = server.aggregate_stats_ingest_events(events, now=NOW)
+        assert guild_updates[GUILD_ID]["inc"]["totalStarts"] == 2
+        assert guild_updates[GUILD_ID]["max"]["peakListeners"] == 9
+        assert len(daily_updates) == 1
+        day = next(iter(daily_updates.values()))
+        assert day["inc"]["totalStarts"] == 2
+        assert day["max"]["peakListeners"] == 9
+        assert len(snapshots) == 1
+
+    def test_batch_id_gives_raw_documents_stable_ids(self):
+        """Retrying a batch re-inserts the same _id values, which the write path ignores as duplicates"""
+        events = [
+            {"type": "command", "serverId": GUILD_ID, "command": "play"},
+            {"type": "snapshot", "serverId": GUILD_ID, "listeners": 1},
+            {"type": "sessionEnd", "serverId": GUILD_ID, "durationMs": 10},
+        ]
+        _, _, sessions, snapshots, _ = server.aggregate_stats_ingest_events(events, now=NOW, batch_id="b-1")
+        assert snapshots[0]["_id"] == "b-1:1"
+        assert sessions[0]["_id"] == "b-1:2"
+        _, _, sessions, snapshots, _ = server.aggregate_stats_ingest_events(events, now=NOW)
+        assert "_id" not in snapshots[0] and "_id" not in sessions[0]
+
+    def test_invalid_events_are_reported_by_index(self):
+        events = [
+            5,
+            {"type": "bogus", "serverId": GUILD_ID},
+            {"type": "snapshot", "serverId": "x"},
+            {"type": "command", "serverId": GUILD_ID},
+            {"type": "snapshot", "serverId": GUILD_ID, "listeners": 2},
+        ]
+        guild_updates, _, _, snapshots, results = server.aggregate_stats_ingest_events(events, now=NOW)
+        assert [entry["index"] for entry in results] == [0, 1, 2, 3]
+        assert list(guild_updates) == [GUILD_ID]
+        assert len(snapshots) == 1
+
+    def test_guilds_with_running_reset_are_skipped(self):
+        other = "223456789012345678"
+        events = [
+            {"type": "snapshot", "serverId": GUILD_ID, "listeners": 2},
+            {"type": "snapshot", "serverId": other, "listeners": 4},
+        ]
+        guild_updates, _, _, snapshots, results = server.aggregate_stats_ingest_events(events, now=NOW, skip_guilds={GUILD_ID})
+        assert [entry["index"] for entry in results] == [0]
+        assert list(guild_updates) == [other]
+        assert [snapshot["guildId"] for snapshot in snapshots] == [other]
+
+
+class TestStatsResetJob:
+    """run_stats_reset_job walks queued -> running -> done/failed and releases the guild"""
+
+    @pytest.fixture
+    def reset_job(self, monkeypatch):
+        monkeypatch.setattr(server, "db", None)
+        monkeypatch.setattr(server, "STATS_RESET_JOBS", {})
+        monkeypatch.setattr(server, "STATS_RESET_ACTIVE", {})
+        job = {
+            "jobId": "job-1",
+            "serverId": GUILD_ID,
+            "status": "queued",
+            "collection": None,
+            "deleted": {},
+            "deletedTotal": 0,
+            "chunks": 0,
+            "createdAt": NOW.isoformat(),
+            "startedAt": None,
+            "finishedAt": None,
+            "error": None,
+        }
+        server.STATS_RESET_JOBS[job["jobId"]] = job
+        server.STATS_RESET_ACTIVE[GUILD_ID] = job["jobId"]
+        return job
+
+    def test_successful_job_ends_done(self, monkeypatch, reset_job):
+        seen = []
+
+        def delete_series(guild_id):
+            seen.append((reset_job["status"], server.active_stats_reset_guilds({guild_id})))
+            return {"telemetry_series": 3}
+
+        monkeypatch.setattr(server, "delete_telemetry_series", delete_series)
+        server.run_stats_reset_job(reset_job)
+        assert seen == [("running", {GUILD_ID})]
+        assert reset_job["status"] == "done"
+        assert reset_job["startedAt"] and reset_job["finishedAt"]
+        assert reset_job["deleted"] == {"telemetry_series": 3}
+        assert reset_job["deletedTotal"] == 3
+        assert reset_job["error"] is None
+        assert server.STATS_RESET_ACTIVE == {}
+        assert server.active_stats_reset_guilds({GUILD_ID}) == set()
+        assert server.get_stats_reset_job(GUILD_ID)["status"] == "done"
+
+    def test_failing_job_ends_failed(self, monkeypatch, reset_job):
+        def delete_series(guild_id):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(server, "delete_telemetry_series", delete_series)
+        server.run_stats_reset_job(reset_job)
+        assert reset_job["status"] == "failed"
+        assert "disk full" in reset_job["error"]
+        assert reset_job["finishedAt"]
+        assert server.STATS_RESET_ACTIVE == {}
+
+
+class TestStatsRetentionHelpers:
+    """Retention settings parsing and the cutoff filter used by the rollup query"""
+
+    DEFAULTS = {"free": 7, "pro": 30, "ultimate": 90}
+
+    def test_parse_tier_days_overrides_known_tiers(self):
+        result = server.parse_tier_days(" Free=3, ultimate = 400 ", self.DEFAULTS)
+        assert result == {"free": 3, "pro": 30, "ultimate": 400}
+
+    @pytest.mark.parametrize("raw", [None, "", "pro", "pro=abc", "gold=5", "pro=", ",,,"])
+    def test_parse_tier_days_keeps_defaults_for_invalid_input(self, raw):
+        assert server.parse_tier_days(raw, self.DEFAULTS) == self.DEFAULTS
+
+    def test_parse_tier_days_clamps_to_one_day(self):
+        assert server.parse_tier_days("free=0,pro=-5", self.DEFAULTS) == {"free": 1, "pro": 1, "ultimate": 90}
+
+    def test_parse_tier_days_does_not_mutate_defaults(self):
+        defaults = dict(self.DEFAULTS)
+        server.parse_tier_days("free=1", defaults)
+        assert defaults == self.DEFAULTS
+
+    def test_cutoff_filter_matches_date_and_iso_string_values(self):
+        """MongoDB compares only values of the same BSON type, so both forms need their own branch"""
+        cutoff = datetime(2026, 10, 1, 8, 30, 15, 250000, tzinfo=timezone.utc)
+        query = server.stats_retention_cutoff_filter("timestamp", cutoff)
+        date_branch, string_branch = query["$or"]
+        assert date_branch == {"timestamp": {"$lt": cutoff}}
+        assert string_branch == {"timestamp": {"$lt": "2026-10-01T08:30:15.250Z"}}
+
+    def test_cutoff_string_orders_like_stored_iso_strings(self):
+        """Node stores Date.toISOString(), so a plain string comparison gives the time order"""
+        cutoff = datetime(2026, 10, 1, 10, 30, tzinfo=timezone(timedelta(hours=2)))
+        bound = server.stats_retention_cutoff_filter("startedAt", cutoff)["$or"][1]["startedAt"]["$lt"]
+        assert bound == "2026-10-01T08:30:00.000Z"
+        assert "2026-10-01T08:29:59.999Z" < bound
+        assert not "2026-10-01T08:30:00.000Z" < bound
+        assert not "2026-10-01T09:00:00.000Z" < bound
+
+
+def analytics_epochs(*isos):
+    return server.np.array([int(datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()) for iso in isos], dtype=server.np.int64)
+
+
+class TestStatsAnalytics:
+    """NumPy analytics for /api/dashboard/stats/detail against plain-Python reference values"""
+
+    def test_listener_summary_and_moving_average_match_plain_python(self):
+        timestamps = analytics_epochs(
+            "2026-10-10T08:00:00Z", "2026-10-10T09:00:00Z", "2026-10-11T08:00:00Z", "2026-10-13T08:00:00Z", "2026-10-13T20:00:00Z",
+        )
+        values = [4.0, 8.0, 2.0, 10.0, 6.0]
+        result = server.compute_listener_analytics(timestamps, server.np.array(values), moving_average_days=2)
+        assert result["samples"] == 5
+        assert result["summary"]["mean"] == 6.0
+        assert result["summary"]["max"] == 10.0
+        assert result["summary"]["p50"] == 6.0
+        assert [day["date"] for day in result["daily"]] == ["2026-10-10", "2026-10-11", "2026-10-13"]
+        assert [day["avgListeners"] for day in result["daily"]] == [6.0, 2.0, 8.0]
+        assert [day["maxListeners"] for day in result["daily"]] == [8.0, 2.0, 10.0]
+        # 2-Tage-Fenster: 10./11. zusammen, der 12. ist leer, also am 13. nur dessen Samples.
+        assert [day["movingAvg"] for day in result["daily"]] == [6.0, round(14 / 3, 2), 8.0]
+
+    def test_heatmap_and_days_use_local_time_like_ingest(self, berlin_time):
+        """22:30 UTC on Saturday counts as Sunday 00:30, the same bucket the ingest writes"""
+        timestamps = analytics_epochs("2026-10-17T22:30:00Z")
+        result = server.compute_listener_analytics(timestamps, server.np.array([5.0]))
+        assert result["heatmap"][6][0] == 5.0
+        assert sum(map(sum, result["heatmap"])) == 5.0
+        assert [day["date"] for day in result["daily"]] == ["2026-10-18"]
+        events = [{"type": "snapshot", "serverId": GUILD_ID, "listeners": 5, "timestamp": "2026-10-17T22:30:00Z"}]
+        _, daily_updates, _, _, _ = server.aggregate_stats_ingest_events(events, now=NOW)
+        assert list(daily_updates) == [(GUILD_ID, "2026-10-18")]
+
+    def test_local_epochs_follow_the_dst_switch(self, berlin_time):
+        before, after = analytics_epochs("2026-10-25T00:30:00Z", "2026-10-25T01:30:00Z")
+        assert server.stats_local_epochs(server.np.array([before, after])).tolist() == [before + 7200, after + 3600]
+
+    def test_station_shares_are_sorted_and_sum_to_one(self):
+        sessions = {
+            "stationKeys": server.np.array(["rock", "jazz", "rock", "pop"], dtype=object),
+            "stationNames": server.np.array(["Rock FM", "Jazz", "Rock FM", "Pop"], dtype=object),
+            "listeningMs": server.np.array([3000.0, 5000.0, 3000.0, 2000.0]),
+            "durationMs": server.np.array([1000.0, 2000.0, 3000.0, 4000.0]),
+        }
+        result = server.compute_session_analytics(sessions)
+        shares = result["stationShares"]
+        assert [(row["stationKey"], row["listeningMs"], row["sessions"]) for row in shares] == [
+            ("rock", 6000, 2), ("jazz", 5000, 1), ("pop", 2000, 1),
+        ]
+        assert shares[0]["stationName"] == "Rock FM"
+        assert round(sum(row["share"] for row in shares), 3) == 1.0
+        assert result["durationPercentilesMs"]["p50"] == 2500
+
+    def test_empty_sources_give_empty_sections(self):
+        empty = server.np.array([], dtype=server.np.int64)
+        assert server.compute_listener_analytics(empty, server.np.array([]))["heatmap"] == []
+        no_sessions = {key: server.np.array([]) for key in ("stationKeys", "stationNames", "listeningMs", "durationMs")}
+        assert server.compute_session_analytics(no_sessions)["stationShares"] == []
+
+
+@pytest.fixture
+def detail_mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().omnifm_test
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setitem(server.STATS_DETAIL_PIPELINE, "supported", True)
+    database.guild_stats.insert_one({"guildId": GUILD_ID, "totalSessions": 3, "_ingestBatches": ["b1"]})
+    database.daily_stats.insert_many([
+        {"guildId": GUILD_ID, "date": f"2026-10-{day:02d}", "totalStarts": day, "_ingestBatches": ["b1"]} for day in range(10, 18)
+    ])
+    database.listening_sessions.insert_many([
+        {"guildId": GUILD_ID, "stationKey": "rock", "startedAt": datetime(2026, 10, 17, 8, 0, 0, 250000), "durationMs": 9000, "humanListeningMs": 6000},
+        {"guildId": GUILD_ID, "stationKey": "jazz", "startedAt": datetime(2026, 10, 16, 8, 0), "durationMs": 4000},
+        {"guildId": "other", "stationKey": "pop", "startedAt": datetime(2026, 10, 17, 9, 0), "durationMs": 1},
+    ])
+    database.listener_snapshots.insert_many([
+        {"guildId": GUILD_ID, "timestamp": datetime(2026, 10, 17, 8, minute), "listeners": minute} for minute in (10, 0, 5)
+    ])
+    return database
+
+
+class TestStatsDetailSections:
+    """Stats detail sections from one aggregation, or per collection on servers without $unionWith"""
+
+    def test_pipeline_unions_every_section_into_one_facet(self):
+        pipeline = server.build_stats_detail_pipeline(GUILD_ID, "2026-10-01", 7, ("5m", NOW))
+        facets = pipeline[-1]["$facet"]
+        unions = [stage["$unionWith"]["coll"] for stage in pipeline if "$unionWith" in stage]
+        assert unions == ["daily_stats", "listening_sessions", "listener_snapshots", "telemetry_series_5m"]
+        assert sorted(facets) == ["daily", "guild", "sessions", "snapshots", "telemetry"]
+
+    def test_sequential_sections(self, detail_mongo):
+        """mongomock has no $unionWith, like MongoDB < 4.4"""
+        sections = server.load_stats_detail_sections(GUILD_ID, "2026-10-12", 3)
+        assert sections["guild"] == [{"guildId": GUILD_ID, "totalSessions": 3}]
+        assert [row["date"] for row in sections["daily"]] == ["2026-10-17", "2026-10-16", "2026-10-15"]
+        assert all("_ingestBatches" not in row for row in sections["daily"])
+        assert [(row["stationKey"], row["startedAt"], row["durationMs"]) for row in sections["sessions"]] == [
+            ("rock", "2026-10-17T08:00:00.250Z", 6000),
+            ("jazz", "2026-10-16T08:00:00.000Z", 4000),
+        ]
+        assert [row["listeners"] for row in sections["snapshots"]] == [0, 5, 10]
+        assert sections["telemetry"] == []
+        assert server.STATS_DETAIL_PIPELINE["supported"] is True
+
+    def test_unknown_stage_switches_to_single_queries(self, monkeypatch, detail_mongo):
+        calls = []
+
+        def aggregate(pipeline):
+            calls.append(pipeline)
+            raise OperationFailure("Unrecognized pipeline stage name: '$unionWith'", code=40324)
+
+        monkeypatch.setattr(detail_mongo.guild_stats, "aggregate", aggregate)
+        assert server.load_stats_detail_sections(GUILD_ID, "2026-10-12", 3)["guild"][0]["totalSessions"] == 3
+        assert server.STATS_DETAIL_PIPELINE["supported"] is False
+        server.load_stats_detail_sections(GUILD_ID, "2026-10-12", 3)
+        assert len(calls) == 1
+
+    def test_analytics_signature_follows_the_newest_rows(self):
+        sections = {"sessions": [{"startedAt": "b"}, {"startedAt": "a"}], "snapshots": [{"timestamp": "1"}, {"timestamp": "2"}]}
+        assert server.stats_analytics_signature_from_sections(sections, 4) == ("sections", "2", "b", 4)
+        assert server.stats_analytics_signature_from_sections({}, 0) == ("sections", None, None, 0)
+
+
+PRO_GUILD = "323456789012345678"
+ULTIMATE_GUILD = "423456789012345678"
+FREE_GUILD = "523456789012345678"
+SERIES_NOW = int(NOW.timestamp())
+
+
+@pytest.fixture
+def series_tiers(monkeypatch):
+    tiers = {PRO_GUILD: "pro", ULTIMATE_GUILD: "ultimate", FREE_GUILD: "free"}
+    monkeypatch.setattr(server, "get_tiers_for_servers", lambda ids: {guild_id: tiers.get(guild_id, "free") for guild_id in ids})
+    return tiers
+
+
+@pytest.fixture
+def series_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "db", None)
+    monkeypatch.setattr(server, "TELEMETRY_SERIES_DIR", tmp_path / "telemetry-series")
+    return tmp_path / "telemetry-series"
+
+
+@pytest.fixture
+def series_mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().omnifm_test
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+class TestTelemetrySeriesFiles:
+    """Fixed-size binary records per guild and resolution (file backend)"""
+
+    def test_points_in_one_bucket_are_merged(self, series_dir, series_tiers):
+        start = SERIES_NOW - SERIES_NOW % 300
+        server.record_telemetry_points({ULTIMATE_GUILD: {"listenersNow": 4, "activeStreams": 1}}, now_epoch=start + 10)
+        server.record_telemetry_points({ULTIMATE_GUILD: {"listenersNow": 8, "activeStreams": 3}}, now_epoch=start + 70)
+        server.record_telemetry_points({ULTIMATE_GUILD: {"listenersNow": 2, "activeStreams": 0}}, now_epoch=start + 310)
+
+        assert server.read_telemetry_series(ULTIMATE_GUILD, "5m", 0) == [
+            (start, 2, 12, 8, 4, 3),
+            (start + 300, 1, 2, 2, 0, 0),
+        ]
+        raw = server.read_telemetry_series(ULTIMATE_GUILD, "raw", start + 60)
+        assert [record[0] for record in raw] == [start + 70, start + 310]
+        assert (series_dir / f"{ULTIMATE_GUILD}.raw.bin").stat().st_size == 3 * server.TELEMETRY_SERIES_RECORD.size
+
+    def test_torn_record_is_ignored_and_overwritten(self, series_dir, series_tiers):
+        server.record_telemetry_points({PRO_GUILD: {"listenersNow": 1}}, now_epoch=SERIES_NOW)
+        path = series_dir / f"{PRO_GUILD}.raw.bin"
+        with open(path, "ab") as handle:
+            handle.write(b"\x01\x02\x03")
+        assert len(server.read_telemetry_series(PRO_GUILD, "raw", 0)) == 1
+        server.record_telemetry_points({PRO_GUILD: {"listenersNow": 2}}, now_epoch=SERIES_NOW + 60)
+        assert [record[2] for record in server.read_telemetry_series(PRO_GUILD, "raw", 0)] == [1, 2]
+
+    def test_free_guilds_store_no_series(self, series_dir, series_tiers):
+        assert server.record_telemetry_points({FREE_GUILD: {"listenersNow": 3}}, now_epoch=SERIES_NOW) == 0
+        assert not series_dir.exists()
+
+
+class TestTelemetrySeriesMongo:
+    """MongoDB writes fall back to files only if nothing reached MongoDB; trimming follows the tier"""
+
+    def test_failed_rollup_does_not_fall_back_to_files(self, monkeypatch, series_mongo, series_tiers, tmp_path):
+        monkeypatch.setattr(server, "TELEMETRY_SERIES_DIR", tmp_path / "telemetry-series")
+        collection_type = type(series_mongo.telemetry_series_5m)
+
+        def fail(self, *args, **kwargs):
+            raise RuntimeError("rollup failed")
+
+        monkeypatch.setattr(collection_type, "bulk_write", fail)
+        assert server.record_telemetry_points({PRO_GUILD: {"listenersNow": 5}}, now_epoch=SERIES_NOW) == 1
+        assert series_mongo.telemetry_series_raw.count_documents({"guildId": PRO_GUILD}) == 1
+        assert not (tmp_path / "telemetry-series").exists()
+
+    def test_failed_first_write_falls_back_to_files(self, monkeypatch, series_mongo, series_tiers, tmp_path):
+        monkeypatch.setattr(server, "TELEMETRY_SERIES_DIR", tmp_path / "telemetry-series")
+        collection_type = type(series_mongo.telemetry_series_raw)
+
+        def fail(self, *args, **kwargs):
+            raise RuntimeError("mongo down")
+
+        monkeypatch.setattr(collection_type, "insert_many", fail)
+        monkeypatch.setattr(collection_type, "bulk_write", fail)
+        assert server.record_telemetry_points({PRO_GUILD: {"listenersNow": 5}}, now_epoch=SERIES_NOW) == 1
+        assert (tmp_path / "telemetry-series" / f"{PRO_GUILD}.raw.bin").exists()
+
+    def test_trim_applies_each_guilds_current_retention(self, series_mongo, series_tiers):
+        def raw_point(guild_id, hours_ago):
+            return {"guildId": guild_id, "ts": NOW - timedelta(hours=hours_ago), "listeners": 1, "activeStreams": 0}
+
+        series_mongo.telemetry_series_raw.insert_many([
+            raw_point(PRO_GUILD, 36), raw_point(PRO_GUILD, 12),
+            raw_point(ULTIMATE_GUILD, 36), raw_point(ULTIMATE_GUILD, 12),
+            raw_point(FREE_GUILD, 1),
+        ])
+        series_mongo.telemetry_series_1h.insert_many([
+            {"_id": f"{PRO_GUILD}:old", "guildId": PRO_GUILD, "bucket": NOW - timedelta(days=40)},
+            {"_id": f"{ULTIMATE_GUILD}:old", "guildId": ULTIMATE_GUILD, "bucket": NOW - timedelta(days=40)},
+        ])
+
+        trimmed = server.trim_telemetry_series(now_epoch=SERIES_NOW)
+        assert trimmed["telemetry_series_raw"] == 2
+        assert trimmed["telemetry_series_1h"] == 1
+        remaining = sorted(
+            (doc["guildId"], int((NOW - doc["ts"].replace(tzinfo=timezone.utc)).total_seconds() // 3600))
+            for doc in series_mongo.telemetry_series_raw.find()
+        )
+        assert remaining == [(PRO_GUILD, 12), (ULTIMATE_GUILD, 12), (ULTIMATE_GUILD, 36)]
+        assert [doc["guildId"] for doc in series_mongo.telemetry_series_1h.find()] == [ULTIMATE_GUILD]
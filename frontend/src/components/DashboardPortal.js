@@ -484,8 +484,22 @@ export default function DashboardPortal() {
   const resetStatsForSelectedGuild = useCallback(async () => {
     if (!selectedGuildId) return;
     setError('');
-    await apiRequest(`/api/dashboard/stats/reset?serverId=${encodeURIComponent(selectedGuildId)}`, { method: 'DELETE' });
+    const guildParam = encodeURIComponent(selectedGuildId);
+    let job = await apiRequest(`/api/dashboard/stats/reset?serverId=${guildParam}`, { method: 'DELETE' });
+    // Das Python-Backend loescht im Hintergrund; bis zum Ende des Jobs den Status abfragen.
+    for (let attempt = 0; job?.jobId && ['queued', 'running'].includes(job.status) && attempt < 120; attempt += 1) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      job = await apiRequest(`/api/dashboard/stats/reset/status?serverId=${guildParam}&jobId=${encodeURIComponent(job.jobId)}`);
+    }
+    if (job?.status === 'failed') throw new Error(job.error || t('Zurücksetzen fehlgeschlagen.', 'Reset failed.'));
     await refreshDashboardData({ silent: true });
+    if (['queued', 'running'].includes(job?.status)) {
+      setMessage(t(
+        'Zurücksetzen läuft noch im Hintergrund. Die Statistiken sind erst danach vollständig gelöscht.',
+        'Reset is still running in the background. Statistics are fully cleared once it finishes.',
+      ));
+      return;
+    }
     setMessage(t('Statistiken wurden zurückgesetzt.', 'Statistics have been reset.'));
   }, [apiRequest, refreshDashboardData, selectedGuildId, t]);
 